@@ -0,0 +1,165 @@
+# analytics.py
+# -*- coding: utf-8 -*-
+"""Demand counters for the admin dashboard, maintained incrementally on each write.
+
+The counters describe the master (latest submission per ID): when a
+submission replaces an earlier one, the earlier row's contribution is
+subtracted. ``per_day`` counts every submission, like the log.
+"""
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from schema import DATE_COLUMN, DATE_FORMAT, DOMAINS, RANK_COLUMNS, RANK_COUNT, SITES
+
+STATS_VERSION = 1
+OTHER_DOMAIN = "אחר"
+
+
+def _empty() -> dict:
+    return {
+        "version": STATS_VERSION,
+        "students": 0,
+        "site_ranks": {s: [0] * RANK_COUNT for s in SITES},
+        "domains": {},
+        "top_domain": {},
+        "tracks": {},
+        "per_day": {},
+    }
+
+
+def _domain_key(d: str) -> str:
+    d = d.strip()
+    return d if d in DOMAINS else OTHER_DOMAIN
+
+
+def _grade(v) -> float | None:
+    try:
+        g = float(v)
+    except (TypeError, ValueError):
+        return None
+    return g if g == g else None
+
+
+def _day(v) -> str:
+    try:
+        return datetime.strptime(str(v), DATE_FORMAT).strftime("%Y-%m-%d")
+    except ValueError:
+        return str(v)[:10]
+
+
+class DemandStats:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._mtime_ns = None
+        self.data = self._load()
+
+    def _load(self) -> dict | None:
+        if not self.path.exists():
+            return None
+        self._mtime_ns = self.path.stat().st_mtime_ns
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if data.get("version") == STATS_VERSION else None
+
+    def _reload_if_changed(self) -> None:
+        """Pick up counters saved by another process since our last read/write."""
+        try:
+            if self.path.stat().st_mtime_ns != self._mtime_ns:
+                self.data = self._load()
+        except FileNotFoundError:
+            pass
+
+    @property
+    def ready(self) -> bool:
+        return self.data is not None
+
+    def save(self) -> None:
+        tmp = self.path.with_name("." + self.path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self._mtime_ns = self.path.stat().st_mtime_ns
+
+    # --- עדכון מצטבר ---
+    def _add(self, row: dict, sign: int) -> None:
+        d = self.data
+        d["students"] += sign
+        for i, col in enumerate(RANK_COLUMNS):
+            site = row.get(col)
+            if site in d["site_ranks"]:
+                d["site_ranks"][site][i] += sign
+        for dom in str(row.get("תחומים מועדפים") or "").split(";"):
+            if dom.strip():
+                key = _domain_key(dom)
+                d["domains"][key] = d["domains"].get(key, 0) + sign
+        top = str(row.get("תחום מוביל") or "").strip()
+        if top:
+            key = _domain_key(top)
+            d["top_domain"][key] = d["top_domain"].get(key, 0) + sign
+        track = str(row.get("מסלול לימודים") or "").strip()
+        grade = _grade(row.get("ממוצע"))
+        if track:
+            t = d["tracks"].setdefault(track, {"n": 0, "grade_sum": 0.0, "graded": 0})
+            t["n"] += sign
+            if grade is not None:
+                t["grade_sum"] += sign * grade
+                t["graded"] += sign
+
+    def apply(self, rows: list[dict], previous: list[dict | None]) -> None:
+        """Count new rows, subtracting any submissions they replaced, and persist."""
+        with self._lock:
+            self._reload_if_changed()
+            if self.data is None:
+                return
+            for row, prev in zip(rows, previous):
+                if prev:
+                    self._add(prev, -1)
+                self._add(row, +1)
+                day = _day(row.get(DATE_COLUMN, ""))
+                self.data["per_day"][day] = self.data["per_day"].get(day, 0) + 1
+            self.save()
+
+    def rebuild(self, df_master: pd.DataFrame, df_log: pd.DataFrame) -> None:
+        """Recompute all counters from scratch (only when the stats file is missing)."""
+        with self._lock:
+            self.data = _empty()
+            for row in df_master.astype(object).where(df_master.notna(), None).to_dict("records"):
+                self._add(row, +1)
+            if not df_log.empty and DATE_COLUMN in df_log.columns:
+                days = pd.to_datetime(df_log[DATE_COLUMN], format=DATE_FORMAT, errors="coerce")
+                counts = days.dt.strftime("%Y-%m-%d").value_counts()
+                self.data["per_day"] = {k: int(v) for k, v in counts.items()}
+            self.save()
+
+    # --- תצוגה ---
+    def site_table(self) -> pd.DataFrame:
+        rows = [[s] + c + [sum(c)] for s, c in self.data["site_ranks"].items()]
+        cols = ["מוסד"] + [f"עדיפות {i}" for i in range(1, RANK_COUNT + 1)] + ["סה״כ"]
+        return pd.DataFrame(rows, columns=cols).set_index("מוסד")
+
+    def domain_table(self) -> pd.DataFrame:
+        keys = sorted(set(self.data["domains"]) | set(self.data["top_domain"]))
+        return pd.DataFrame({
+            "נבחר": [self.data["domains"].get(k, 0) for k in keys],
+            "תחום מוביל": [self.data["top_domain"].get(k, 0) for k in keys],
+        }, index=keys).sort_values("נבחר", ascending=False)
+
+    def track_table(self) -> pd.DataFrame:
+        rows = {t: {"סטודנטים": v["n"],
+                    "ממוצע ציונים": round(v["grade_sum"] / v["graded"], 2) if v["graded"] else None}
+                for t, v in self.data["tracks"].items() if v["n"]}
+        return pd.DataFrame.from_dict(rows, orient="index")
+
+    def per_day_series(self) -> pd.Series:
+        s = pd.Series(self.data["per_day"], dtype="int64")
+        if s.empty:
+            return s
+        return s[s.index.str.match(r"^\d{4}-\d{2}-\d{2}$")].sort_index()
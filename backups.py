@@ -0,0 +1,195 @@
+# backups.py
+# -*- coding: utf-8 -*-
+"""Incremental backups: periodic full snapshots of the master plus delta segments.
+
+Layout under the backup directory::
+
+    manifest.json
+    delta_000000.csv      rows written before the first snapshot
+    snapshot_000001.csv   full copy of the master
+    delta_000001.csv      rows written after snapshot 1
+    ...
+
+Restoring to a point in time takes the latest snapshot created at or before
+that time and replays the rows of its delta segment up to that time.
+
+Usage::
+
+    python backups.py list    [--dir data/backups]
+    python backups.py restore [--dir data/backups] [--at "2025-09-01 12:00"] --out restored.csv
+"""
+import argparse
+import json
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Union
+
+import pandas as pd
+
+from schema import ID_COLUMN
+from storage import BOM, append_csv_rows
+from timing import timings
+
+TS_COLUMN = "_backup_ts"
+MasterSource = Union[Path, Callable[[Path], None]]
+
+
+class BackupStore:
+    def __init__(self, backup_dir: Path, snapshot_every: int = 500, keep_snapshots: int = 5):
+        self.dir = Path(backup_dir)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.snapshot_every = snapshot_every
+        self.keep_snapshots = keep_snapshots
+        self.manifest_path = self.dir / "manifest.json"
+        self.manifest = self._load_manifest()
+
+    # --- manifest ---
+    def _load_manifest(self) -> dict:
+        if self.manifest_path.exists():
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return {"snapshots": [], "current_seq": 0, "delta_rows": 0}
+
+    def _save_manifest(self) -> None:
+        tmp = self.manifest_path.with_name(".manifest.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.manifest_path)
+
+    def _snapshot_path(self, seq: int) -> Path:
+        return self.dir / f"snapshot_{seq:06d}.csv"
+
+    def _delta_path(self, seq: int) -> Path:
+        return self.dir / f"delta_{seq:06d}.csv"
+
+    # --- כתיבה ---
+    # ``master`` הוא נתיב לקובץ הראשי, או פונקציה שכותבת את כל המאסטר כ-CSV לנתיב נתון
+    def ensure_initialized(self, master: MasterSource) -> None:
+        """Take a first snapshot of an existing master that predates the manifest."""
+        if self.manifest_path.exists():
+            return
+        if callable(master) or (master.exists() and master.stat().st_size):
+            self.snapshot(master)
+        else:
+            self._save_manifest()
+
+    def record(self, rows: list[dict], columns: list[str], master: MasterSource) -> None:
+        """Append rows to the current delta segment; snapshot when it is full."""
+        if not rows:
+            return
+        # מניפסט טרי — ייתכן שתהליך אחר כתב מאז (הקריאה נעשית תחת נעילת הכותב)
+        self.manifest = self._load_manifest()
+        stamp = datetime.now().isoformat(timespec="microseconds")
+        seq = self.manifest["current_seq"]
+        append_csv_rows(self._delta_path(seq), [{**r, TS_COLUMN: stamp} for r in rows],
+                        [TS_COLUMN] + columns)
+        self.manifest["delta_rows"] += len(rows)
+        if self.manifest["delta_rows"] >= self.snapshot_every:
+            self.snapshot(master)
+        else:
+            self._save_manifest()
+
+    def snapshot(self, master: MasterSource) -> Path:
+        """Copy the master as a new full snapshot and start a new delta segment."""
+        seq = self.manifest["current_seq"] + 1
+        path = self._snapshot_path(seq)
+        with timings.span("backup.snapshot"):
+            if callable(master):
+                master(path)
+            else:
+                shutil.copyfile(master, path)
+        self.manifest["snapshots"].append({
+            "seq": seq,
+            "file": path.name,
+            "created": datetime.now().isoformat(timespec="microseconds"),
+            "bytes": path.stat().st_size,
+        })
+        self.manifest["current_seq"] = seq
+        self.manifest["delta_rows"] = 0
+        self._apply_retention()
+        self._save_manifest()
+        return path
+
+    def _apply_retention(self) -> None:
+        snaps = self.manifest["snapshots"]
+        if len(snaps) <= self.keep_snapshots:
+            return
+        dropped, self.manifest["snapshots"] = snaps[:-self.keep_snapshots], snaps[-self.keep_snapshots:]
+        oldest_kept = self.manifest["snapshots"][0]["seq"]
+        for s in dropped:
+            self._snapshot_path(s["seq"]).unlink(missing_ok=True)
+        for seq in range(0, oldest_kept):
+            self._delta_path(seq).unlink(missing_ok=True)
+
+    # --- שחזור ---
+    def restore(self, at: datetime | None = None, key: str | None = None) -> pd.DataFrame:
+        """Rebuild the master as it was at ``at`` (default: now).
+
+        With ``key``, replayed rows replace earlier rows with the same key value.
+        """
+        at_iso = (at or datetime.now()).isoformat(timespec="microseconds")
+        base = [s for s in self.manifest["snapshots"] if s["created"] <= at_iso]
+        if base:
+            seq = base[-1]["seq"]
+            df = _read_backup_csv(self._snapshot_path(seq))
+        elif self._delta_path(0).exists() or not self.manifest["snapshots"]:
+            seq = 0
+            df = pd.DataFrame()
+        else:
+            raise ValueError(f"אין גיבוי שמכסה את הזמן {at_iso} (נמחק לפי מדיניות השמירה).")
+
+        delta_path = self._delta_path(seq)
+        if delta_path.exists():
+            delta = _read_backup_csv(delta_path)
+            delta = delta[delta[TS_COLUMN] <= at_iso].drop(columns=[TS_COLUMN])
+            df = pd.concat([df, delta], ignore_index=True) if not df.empty else delta
+        if key and key in df.columns:
+            df = df[~df[key].str.strip().duplicated(keep="last")]
+        return df.reset_index(drop=True)
+
+    def restore_to(self, out_path: Path, at: datetime | None = None, key: str | None = None) -> int:
+        df = self.restore(at, key)
+        df.to_csv(out_path, index=False, encoding="utf-8-sig", lineterminator="\n")
+        return len(df)
+
+    def describe(self) -> list[dict]:
+        return list(self.manifest["snapshots"])
+
+
+def _read_backup_csv(path: Path) -> pd.DataFrame:
+    df = pd.read_csv(path, encoding="utf-8-sig", dtype=str, keep_default_na=False)
+    df.columns = [c.replace(BOM, "").strip() for c in df.columns]
+    return df
+
+
+# =========================
+# CLI
+# =========================
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Incremental backups of the master CSV")
+    parser.add_argument("command", choices=["list", "restore"])
+    parser.add_argument("--dir", default="data/backups", type=Path)
+    parser.add_argument("--at", help="point in time, e.g. '2025-09-01 12:00' (default: now)")
+    parser.add_argument("--out", type=Path, help="output CSV for restore")
+    parser.add_argument("--key", default=ID_COLUMN, help="keep only the latest row per this column ('' to keep all)")
+    args = parser.parse_args(argv)
+
+    store = BackupStore(args.dir)
+    if args.command == "list":
+        for s in store.describe():
+            print(f"{s['seq']:>6}  {s['created']}  {s['file']}  {s['bytes']} bytes")
+        print(f"current delta: {store.manifest['delta_rows']} rows")
+    else:
+        if not args.out:
+            parser.error("restore requires --out")
+        at = datetime.fromisoformat(args.at) if args.at else None
+        n = store.restore_to(args.out, at, key=args.key or None)
+        print(f"restored {n} rows to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
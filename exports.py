@@ -0,0 +1,282 @@
+# exports.py
+# -*- coding: utf-8 -*-
+"""On-demand admin exports (Excel / CSV / Parquet), cached per data version."""
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+
+import pandas as pd
+
+from schema import ID_COLUMN, RANK_COLUMNS, SITES
+
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+EXPORT_FORMATS = {
+    "Excel": (".xlsx", XLSX_MIME),
+    "CSV": (".csv", "text/csv"),
+    "Parquet": (".parquet", "application/octet-stream"),
+}
+WIDTH_SAMPLE = 2_000
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        try:
+            import fastparquet  # noqa: F401
+            return True
+        except ImportError:
+            return False
+
+
+def available_formats() -> list[str]:
+    return [f for f in EXPORT_FORMATS if f != "Parquet" or parquet_available()]
+
+
+# =========================
+# רוחב עמודות — מדגם + חישוב וקטורי
+# =========================
+def column_widths(df: pd.DataFrame, sample: int = WIDTH_SAMPLE) -> list[int]:
+    if df.empty:
+        return [max(12, min(60, len(str(c)) + 4)) for c in df.columns]
+    part = df.sample(n=sample, random_state=0) if len(df) > sample else df
+    lengths = part.astype(str).apply(lambda s: s.str.len()).max().fillna(0)
+    return [max(12, min(60, int(max(lengths[c], len(str(c)))) + 4)) for c in df.columns]
+
+
+# =========================
+# כותבים
+# =========================
+def df_to_excel_bytes(df: pd.DataFrame, sheet: str = "Sheet1") -> bytes:
+    bio = BytesIO()
+    with pd.ExcelWriter(bio, engine="xlsxwriter") as w:
+        df.to_excel(w, sheet_name=sheet, index=False)
+        ws = w.sheets[sheet]
+        for i, width in enumerate(column_widths(df)):
+            ws.set_column(i, i, width)
+    bio.seek(0)
+    return bio.read()
+
+
+def _chain(first: pd.DataFrame | None, rest: Iterator[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+    if first is not None:
+        yield first
+        yield from rest
+
+
+def write_excel_streaming(chunks: Iterator[pd.DataFrame], columns: list[str], path: Path,
+                          sheet: str = "Sheet1") -> None:
+    """Write row chunks with xlsxwriter's constant_memory mode (rows flushed as written).
+
+    Column widths are sampled from the first chunk.
+    """
+    import xlsxwriter
+
+    wb = xlsxwriter.Workbook(str(path), {"constant_memory": True, "nan_inf_to_errors": True})
+    ws = wb.add_worksheet(sheet)
+    first = next(chunks, None)
+    widths = column_widths(first.reindex(columns=columns) if first is not None else pd.DataFrame(columns=columns))
+    for i, width in enumerate(widths):
+        ws.set_column(i, i, width)
+    ws.write_row(0, 0, columns, wb.add_format({"bold": True}))
+    r = 1
+    for chunk in _chain(first, chunks):
+        chunk = chunk.reindex(columns=columns).astype(object)
+        for values in chunk.where(chunk.notna(), None).itertuples(index=False, name=None):
+            ws.write_row(r, 0, values)
+            r += 1
+    wb.close()
+
+
+def write_csv_streaming(chunks: Iterable[pd.DataFrame], columns: list[str], path: Path) -> None:
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        f.write(pd.DataFrame(columns=columns).to_csv(index=False, lineterminator="\n"))
+        for chunk in chunks:
+            chunk.reindex(columns=columns).to_csv(f, index=False, header=False, lineterminator="\n")
+
+
+def write_parquet_streaming(chunks: Iterable[pd.DataFrame], columns: list[str], path: Path) -> None:
+    """One row group per chunk; all columns as text so every chunk shares one schema."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:   # fastparquet — אין כתיבה בנתחים, מאחדים
+        frames = [c.reindex(columns=columns) for c in chunks]
+        df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+        df.astype("string").to_parquet(path, index=False)
+        return
+    schema = pa.schema([(c, pa.string()) for c in columns])
+    with pq.ParquetWriter(path, schema) as w:
+        for chunk in chunks:
+            chunk = chunk.reindex(columns=columns).astype("string")
+            w.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+def export_file(chunks: Iterable[pd.DataFrame], columns: list[str], fmt: str,
+                sheet: str = "Sheet1") -> Path:
+    """Stream ``chunks`` into a temporary export file and return its path.
+
+    Only one chunk is held in memory at a time; the caller (``ExportCache``)
+    owns the file and deletes it on eviction.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    fd, tmp = tempfile.mkstemp(prefix="export-", suffix=EXPORT_FORMATS[fmt][0])
+    os.close(fd)
+    path = Path(tmp)
+    try:
+        if fmt == "Excel":
+            write_excel_streaming(iter(chunks), columns, path, sheet)
+        elif fmt == "CSV":
+            write_csv_streaming(chunks, columns, path)
+        else:
+            write_parquet_streaming(chunks, columns, path)
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
+    return path
+
+
+def df_to_csv_bytes(df: pd.DataFrame) -> bytes:
+    return df.to_csv(index=False, lineterminator="\n").encode("utf-8-sig")
+
+
+def df_to_parquet_bytes(df: pd.DataFrame) -> bytes:
+    bio = BytesIO()
+    df.to_parquet(bio, index=False)
+    return bio.getvalue()
+
+
+def export_bytes(df: pd.DataFrame, fmt: str, sheet: str = "Sheet1") -> bytes:
+    if fmt == "Excel":
+        return df_to_excel_bytes(df, sheet=sheet)
+    if fmt == "CSV":
+        return df_to_csv_bytes(df)
+    if fmt == "Parquet":
+        return df_to_parquet_bytes(df)
+    raise ValueError(f"Unknown export format: {fmt}")
+
+
+# =========================
+# רשימות לפי מוסד — גיליון לכל מוסד
+# =========================
+ROSTER_COLUMNS = ["שם פרטי", "שם משפחה", ID_COLUMN, "טלפון", "אימייל", "התאמות", "התאמות פרטים"]
+RANK_LABEL = "מקום בדירוג"
+SITE_LABEL = "מוסד"
+SUMMARY_SHEET = "סיכום"
+_SHEET_BAD_CHARS = re.compile(r"[\[\]:*?/\\]")
+
+
+def site_rosters(df: pd.DataFrame, sites: list[str] = SITES,
+                 rank_columns: list[str] = RANK_COLUMNS) -> dict[str, pd.DataFrame]:
+    """Per site, the students who ranked it (rank, then name), from one melt + groupby over the master."""
+    keep = [c for c in ROSTER_COLUMNS if c in df.columns]
+    long = df.reindex(columns=keep + rank_columns).melt(
+        id_vars=keep, value_vars=rank_columns, var_name=RANK_LABEL, value_name=SITE_LABEL)
+    long[RANK_LABEL] = long[RANK_LABEL].map({c: i for i, c in enumerate(rank_columns, start=1)})
+    long = long[long[SITE_LABEL].isin(sites)]
+    order = [SITE_LABEL, RANK_LABEL] + [c for c in ("שם משפחה", "שם פרטי") if c in keep]
+    long = long.sort_values(order, kind="stable")
+    out_columns = [RANK_LABEL] + keep
+    groups = {site: g[out_columns].reset_index(drop=True) for site, g in long.groupby(SITE_LABEL, sort=False)}
+    empty = pd.DataFrame(columns=out_columns)
+    return {site: groups.get(site, empty) for site in sites}
+
+
+def roster_summary(rosters: dict[str, pd.DataFrame], rank_count: int = len(RANK_COLUMNS)) -> pd.DataFrame:
+    """Students per site and rank (the workbook's first sheet)."""
+    rows = []
+    for site, roster in rosters.items():
+        counts = roster[RANK_LABEL].value_counts()
+        rows.append({SITE_LABEL: site,
+                     **{f"{RANK_LABEL} {r}": int(counts.get(r, 0)) for r in range(1, rank_count + 1)},
+                     "סה״כ": len(roster)})
+    return pd.DataFrame(rows)
+
+
+def _sheet_names(titles: list[str]) -> list[str]:
+    """Excel-safe, unique sheet names (at most 31 characters, no []:*?/\\)."""
+    names, used = [], set()
+    for title in titles:
+        base = _SHEET_BAD_CHARS.sub(" ", title).strip()[:31] or "Sheet"
+        name, n = base, 2
+        while name.casefold() in used:
+            suffix = f" ({n})"
+            name, n = base[:31 - len(suffix)] + suffix, n + 1
+        used.add(name.casefold())
+        names.append(name)
+    return names
+
+
+def rosters_excel_bytes(rosters: dict[str, pd.DataFrame]) -> bytes:
+    """Workbook with a summary sheet and one right-to-left sheet per site."""
+    import xlsxwriter
+
+    frames = {SUMMARY_SHEET: roster_summary(rosters), **rosters}
+    bio = BytesIO()
+    # כתיבה ישירה בשורות (pandas.to_excel איטי פי כמה בעשרות אלפי שורות)
+    wb = xlsxwriter.Workbook(bio, {"in_memory": True, "nan_inf_to_errors": True})
+    bold = wb.add_format({"bold": True})
+    for name, df in zip(_sheet_names(list(frames)), frames.values()):
+        ws = wb.add_worksheet(name)
+        ws.right_to_left()
+        ws.freeze_panes(1, 0)
+        for i, width in enumerate(column_widths(df)):
+            ws.set_column(i, i, width)
+        ws.write_row(0, 0, list(df.columns), bold)
+        values = df.astype(object).where(df.notna(), None)
+        for r, row in enumerate(values.itertuples(index=False, name=None), start=1):
+            ws.write_row(r, 0, row)
+    wb.close()
+    return bio.getvalue()
+
+
+# =========================
+# מטמון לפי גרסת נתונים
+# =========================
+class ExportCache:
+    """Small LRU of generated exports keyed on (name, format, data version).
+
+    Values are bytes or a temporary file from ``export_file``; evicted files
+    are deleted.
+    """
+
+    def __init__(self, max_items: int = 8):
+        self.max_items = max_items
+        self._items: OrderedDict[tuple, bytes | Path] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> bytes | Path | None:
+        with self._lock:
+            if key not in self._items:
+                return None
+            value = self._items[key]
+            if isinstance(value, Path) and not value.exists():   # נוקה מתיקיית tmp
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def get_or_build(self, key: tuple, build: Callable[[], bytes | Path]) -> bytes | Path:
+        data = self.get(key)
+        if data is None:
+            data = build()
+            with self._lock:
+                old = self._items.pop(key, None)
+                self._items[key] = data
+                evicted = [old] if old is not None else []
+                while len(self._items) > self.max_items:
+                    evicted.append(self._items.popitem(last=False)[1])
+            for value in evicted:
+                if isinstance(value, Path):
+                    value.unlink(missing_ok=True)
+        return data
+
+
+export_cache = ExportCache()
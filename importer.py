@@ -0,0 +1,176 @@
+# importer.py
+# -*- coding: utf-8 -*-
+"""Bulk import of submissions collected elsewhere (paper forms, a separate Google Form).
+
+An uploaded CSV / Excel file is mapped onto ``COLUMNS_ORDER`` (``suggest_mapping``
+proposes a mapping from the header names, the admin can correct it), validated
+in one vectorised pass with ``validation.validate_frame`` and deduplicated by
+ID, both inside the file and against the master. ``ImportPlan.records`` is then
+written in one batch by ``SubmissionStore.save_many``.
+"""
+import difflib
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from io import BytesIO
+from pathlib import Path
+
+import pandas as pd
+
+from schema import COLUMNS_ORDER, DATE_COLUMN, DATE_FORMAT, ID_COLUMN, SITE_RANK_COLUMNS
+from storage import BOM, SNIFF_BYTES, read_csv_sniffed, sniff_csv
+from validation import invalid_rows, validate_frame
+
+IMPORT_FORMATS = {".csv": "CSV", ".xlsx": "Excel", ".xls": "Excel"}
+MATCH_CUTOFF = 0.8
+# כותרות נפוצות בייצוא של Google Forms / טפסים ידניים
+ALIASES = {
+    "timestamp": DATE_COLUMN,
+    "חותמת זמן": DATE_COLUMN,
+    "ת.ז": ID_COLUMN,
+    "תז": ID_COLUMN,
+    "מספר זהות": ID_COLUMN,
+    "email address": "אימייל",
+    "כתובת אימייל": "אימייל",
+    "דואל": "אימייל",
+    "מספר טלפון": "טלפון",
+}
+_NORM_RE = re.compile(r"[\s\"'׳״.:\-_/()]+")
+
+
+def excel_import_available() -> bool:
+    try:
+        import openpyxl  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def accepted_types() -> list[str]:
+    return [ext.lstrip(".") for ext, kind in IMPORT_FORMATS.items()
+            if kind != "Excel" or excel_import_available()]
+
+
+# =========================
+# קריאה ומיפוי עמודות
+# =========================
+def _text_frame(df: pd.DataFrame) -> pd.DataFrame:
+    df.columns = [str(c).replace(BOM, "").strip() for c in df.columns]
+    return df
+
+
+def read_upload(name: str, data: bytes) -> pd.DataFrame:
+    """Parse an uploaded CSV / Excel file as text columns (raises ValueError if unreadable)."""
+    kind = IMPORT_FORMATS.get(Path(name).suffix.lower())
+    if kind == "Excel":
+        if not excel_import_available():
+            raise ValueError("קריאת Excel דורשת את החבילה openpyxl.")
+        return _text_frame(pd.read_excel(BytesIO(data), dtype=str, keep_default_na=False))
+    if kind == "CSV":
+        try:
+            df, _ = read_csv_sniffed(BytesIO(data), sniff_csv(data[:SNIFF_BYTES]), dtype=str, keep_default_na=False)
+            return _text_frame(df)
+        except pd.errors.ParserError:
+            pass
+    raise ValueError(f"לא ניתן לקרוא את הקובץ {name}.")
+
+
+def _norm(name: str) -> str:
+    return _NORM_RE.sub("", str(name)).casefold()
+
+
+def suggest_mapping(source_columns: list[str], columns: list[str] = COLUMNS_ORDER) -> dict[str, str | None]:
+    """Target column -> source column: exact/normalised name, known alias, then close match."""
+    by_norm = {_norm(c): c for c in source_columns}
+    aliases = {_norm(k): v for k, v in ALIASES.items()}
+    mapping: dict[str, str | None] = {c: None for c in columns}
+    used: set[str] = set()
+
+    for target in columns:
+        src = by_norm.get(_norm(target))
+        if src is not None:
+            mapping[target] = src
+            used.add(src)
+    for n, src in by_norm.items():
+        target = aliases.get(n)
+        if target in mapping and mapping[target] is None and src not in used:
+            mapping[target] = src
+            used.add(src)
+    for target in columns:
+        if mapping[target] is not None:
+            continue
+        free = {_norm(c): c for c in source_columns if c not in used}
+        close = difflib.get_close_matches(_norm(target), list(free), n=1, cutoff=MATCH_CUTOFF)
+        if close:
+            mapping[target] = free[close[0]]
+            used.add(free[close[0]])
+    return mapping
+
+
+def apply_mapping(src: pd.DataFrame, mapping: dict[str, str | None],
+                  columns: list[str] = COLUMNS_ORDER, now: datetime | None = None) -> pd.DataFrame:
+    """Frame in ``columns`` order; unmapped columns are empty, dates normalised to ``DATE_FORMAT``."""
+    out = pd.DataFrame(index=src.index)
+    for c in columns:
+        s = mapping.get(c)
+        out[c] = src[s].fillna("").astype(str).str.strip() if s in src.columns else ""
+
+    ids = out[ID_COLUMN].str.replace(r"\.0$", "", regex=True)
+    # Excel משמיט אפסים מובילים בת"ז מספרית
+    out[ID_COLUMN] = ids.mask(ids.str.fullmatch(r"\d{1,7}"), ids.str.zfill(9))
+    # דירוג נשמר כמספר שלם ("2" ולא "2.0"), כמו בטופס — ראו MASTER_DTYPES
+    for c in SITE_RANK_COLUMNS:
+        if c in out.columns:
+            out[c] = out[c].str.replace(r"\.0$", "", regex=True)
+
+    stamp = (now or datetime.now()).strftime(DATE_FORMAT)
+    raw = out[DATE_COLUMN]
+    exact = pd.to_datetime(raw, format=DATE_FORMAT, errors="coerce")
+    loose = pd.to_datetime(raw.where(exact.isna(), None), dayfirst=True, errors="coerce", format="mixed")
+    when = exact.fillna(loose)
+    out[DATE_COLUMN] = when.dt.strftime(DATE_FORMAT).where(when.notna(), stamp)
+    return out.reset_index(drop=True)
+
+
+# =========================
+# תוכנית ייבוא: תקינות + כפילויות
+# =========================
+def id_keys(ids: pd.Series) -> pd.Series:
+    """Comparable ID keys (no leading zeros / Excel ".0")."""
+    return ids.fillna("").astype(str).str.strip().str.replace(r"\.0$", "", regex=True).str.lstrip("0")
+
+
+@dataclass
+class ImportPlan:
+    accepted: pd.DataFrame    # שורות לכתיבה (COLUMNS_ORDER)
+    rejected: pd.DataFrame    # שורות שנכשלו בבדיקה, עם עמודת "הפרות"
+    duplicates: int           # ת"ז שחזרה בקובץ (נשמרה ההופעה האחרונה)
+    existing: int             # ת"ז שכבר קיימת במאסטר
+    replace_existing: bool
+
+    @property
+    def records(self) -> list[dict]:
+        return self.accepted.to_dict("records")
+
+
+def plan_import(df: pd.DataFrame, existing_ids: pd.Series, replace_existing: bool = False) -> ImportPlan:
+    """Validate the mapped frame and drop duplicate / already-submitted IDs."""
+    violations = validate_frame(df)
+    bad = violations.any(axis=1)
+    rejected = invalid_rows(df, violations)
+    valid = df[~bad.to_numpy()]
+
+    keys = id_keys(valid[ID_COLUMN])
+    repeated = keys.duplicated(keep="last")
+    valid, keys = valid[~repeated.to_numpy()], keys[~repeated]
+
+    spelling = dict(zip(id_keys(existing_ids), existing_ids.astype(str).str.strip()))
+    known = keys.isin(spelling.keys())
+    if replace_existing:
+        # החלפה נשמרת תחת הכתיב הקיים של הת"ז (למשל עם אפס מוביל)
+        valid = valid.assign(**{ID_COLUMN: keys.map(spelling).fillna(valid[ID_COLUMN]).to_numpy()})
+    else:
+        valid = valid[~known.to_numpy()]
+    return ImportPlan(accepted=valid.reset_index(drop=True), rejected=rejected,
+                      duplicates=int(repeated.sum()), existing=int(known.sum()),
+                      replace_existing=replace_existing)
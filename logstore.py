@@ -0,0 +1,308 @@
+# logstore.py
+# -*- coding: utf-8 -*-
+"""Segmented append-only submission log: plain active segment, gzip-closed history.
+
+Layout under the log directory::
+
+    manifest.json
+    log_000000.csv.gz     closed segment (compressed)
+    log_000001.csv.gz
+    log_000002.csv        active segment (append-only, plain CSV)
+
+The active segment is rotated when it passes ``max_bytes`` or is older than
+``max_age_days``. The manifest records per segment its row count and the
+first/last submission time, so a date-range read only opens the segments
+that overlap it. ``iter_chunks`` streams segment by segment in bounded
+chunks, so paging and filtered exports never hold the whole history.
+
+Usage::
+
+    python logstore.py list   [--dir data/log]
+    python logstore.py export [--dir data/log] [--from 2025-09-01] [--to 2025-09-30] --out log.csv
+"""
+import argparse
+import gzip
+import json
+import os
+import shutil
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterator
+
+import pandas as pd
+
+from schema import COLUMNS_ORDER, DATE_COLUMN, DATE_FORMAT
+from storage import BOM, CHUNK_ROWS, append_csv_rows, filter_dates
+from timing import timings
+
+MAX_SEGMENT_BYTES = 8 * 1024 * 1024
+
+
+def _ts(v) -> str | None:
+    """Submission time as a sortable ISO string (None if unparsable)."""
+    try:
+        return datetime.strptime(str(v).strip(), DATE_FORMAT).isoformat()
+    except ValueError:
+        return None
+
+
+class SegmentedLog:
+    def __init__(self, log_dir: Path, columns: list[str] = COLUMNS_ORDER,
+                 max_bytes: int = MAX_SEGMENT_BYTES, max_age_days: float | None = None,
+                 date_column: str = DATE_COLUMN):
+        self.dir = Path(log_dir)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.columns = columns
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.date_column = date_column
+        self.manifest_path = self.dir / "manifest.json"
+        self._cached: tuple | None = None   # (חותמת הקובץ, מניפסט) — לקריאות בלבד
+        self.manifest = self._load_manifest()
+
+    # --- manifest ---
+    def _stamp(self) -> tuple | None:
+        try:
+            st = self.manifest_path.stat()
+        except FileNotFoundError:
+            return None
+        # os.replace מחליף inode — גם כשרזולוציית ה-mtime גסה
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def _load_manifest(self, fresh: bool = False) -> dict:
+        """The manifest, re-parsed only when the file changed.
+
+        Writers pass ``fresh=True`` and get a private copy to mutate; the cached
+        dict is shared by readers and replaced only after a successful save.
+        """
+        stamp = self._stamp()
+        if stamp is None:
+            return {"segments": [self._new_segment(0)]}
+        if not fresh and self._cached and self._cached[0] == stamp:
+            return self._cached[1]
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if not fresh:
+            self._cached = (stamp, manifest)
+        return manifest
+
+    def _save_manifest(self) -> None:
+        tmp = self.manifest_path.with_name(".manifest.json.tmp")
+        text = json.dumps(self.manifest, ensure_ascii=False, indent=2)
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+            st = os.fstat(f.fileno())
+        os.replace(tmp, self.manifest_path)
+        # הקוראים מקבלים עותק משלהם — הכותב ממשיך לשנות את self.manifest (append אחרי _rotate)
+        self._cached = ((st.st_mtime_ns, st.st_size, st.st_ino), json.loads(text))
+
+    @staticmethod
+    def _new_segment(seq: int) -> dict:
+        return {"seq": seq, "file": f"log_{seq:06d}.csv", "closed": False, "rows": 0,
+                "first_ts": None, "last_ts": None, "opened": datetime.now().isoformat(timespec="seconds"),
+                "bytes": 0}
+
+    @property
+    def active(self) -> dict:
+        """The writer's active segment (``self.manifest`` belongs to the writer thread)."""
+        return self.manifest["segments"][-1]
+
+    def _path(self, seg: dict) -> Path:
+        return self.dir / seg["file"]
+
+    # --- כתיבה (תחת נעילת הכותב) ---
+    def _rotation_due(self) -> bool:
+        seg = self.active
+        if not seg["rows"]:
+            return False
+        if self._path(seg).stat().st_size >= self.max_bytes:
+            return True
+        if self.max_age_days is not None:
+            opened = datetime.fromisoformat(seg["opened"])
+            return datetime.now() - opened >= timedelta(days=self.max_age_days)
+        return False
+
+    def append(self, rows: list[dict]) -> None:
+        if not rows:
+            return
+        # מניפסט טרי — ייתכן שתהליך אחר כתב/סובב מאז
+        self.manifest = self._load_manifest(fresh=True)
+        if self._rotation_due():
+            self._rotate()
+        seg = self.active
+        append_csv_rows(self._path(seg), rows, self.columns)
+        stamps = [t for t in (_ts(r.get(self.date_column, "")) for r in rows) if t]
+        if stamps:
+            seg["first_ts"] = min(filter(None, [seg["first_ts"], *stamps]))
+            seg["last_ts"] = max(filter(None, [seg["last_ts"], *stamps]))
+        seg["rows"] += len(rows)
+        seg["bytes"] = self._path(seg).stat().st_size
+        self._save_manifest()
+
+    def _compress(self, seg: dict) -> None:
+        src = self._path(seg)
+        dst = src.with_name(src.name + ".gz")
+        tmp = dst.with_name("." + dst.name + ".tmp")
+        with timings.span("log.compress"):
+            with open(src, "rb") as fin, gzip.open(tmp, "wb", compresslevel=6) as fout:
+                shutil.copyfileobj(fin, fout, 1024 * 1024)
+            os.replace(tmp, dst)
+        seg["file"] = dst.name
+        seg["closed"] = True
+        seg["bytes"] = dst.stat().st_size
+
+    def _rotate(self) -> None:
+        """Close the active segment (gzip) and open the next one."""
+        seg = self.active
+        old = self._path(seg)
+        self._compress(seg)
+        self.manifest["segments"].append(self._new_segment(seg["seq"] + 1))
+        self._save_manifest()
+        old.unlink(missing_ok=True)
+
+    def rotate(self) -> None:
+        self.manifest = self._load_manifest(fresh=True)
+        if self.active["rows"]:
+            self._rotate()
+
+    def adopt(self, legacy_csv: Path) -> int:
+        """Take over a pre-existing single-file log as the first closed segment (once)."""
+        legacy_csv = Path(legacy_csv)
+        if self.manifest_path.exists() or not legacy_csv.exists():
+            return 0
+        seg = self._new_segment(0)
+        plain = self._path(seg)
+        shutil.copyfile(legacy_csv, plain)
+        for chunk in self._read_segment(seg, CHUNK_ROWS):
+            seg["rows"] += len(chunk)
+            if self.date_column in chunk.columns:
+                stamps = chunk[self.date_column].map(_ts).dropna().tolist()
+                seg["first_ts"] = min(filter(None, [seg["first_ts"], *stamps]), default=None)
+                seg["last_ts"] = max(filter(None, [seg["last_ts"], *stamps]), default=None)
+        self._compress(seg)
+        plain.unlink()
+        self.manifest = {"segments": [seg, self._new_segment(1)]}
+        self._save_manifest()
+        legacy_csv.rename(legacy_csv.with_name(legacy_csv.name + ".migrated"))
+        return seg["rows"]
+
+    # --- קריאה בזרימה ---
+    def _read_segment(self, seg: dict, chunksize: int) -> Iterator[pd.DataFrame]:
+        path = self._path(seg)
+        if not path.exists():
+            # המקטע נדחס בינתיים על ידי תהליך אחר
+            gz = path.with_name(path.name + ".gz")
+            if not gz.exists():
+                return
+            path = gz
+        if path.stat().st_size == 0:
+            return
+        # נמדדת רק קריאת הנתח — לא הזמן שהצרכן מחזיק את המחולל (עימוד שעוצר מוקדם וכו')
+        with pd.read_csv(path, encoding="utf-8-sig", dtype=str, keep_default_na=False,
+                         chunksize=chunksize, compression="infer") as reader:
+            while True:
+                with timings.span("log.read_segment"):
+                    chunk = next(reader, None)
+                if chunk is None:
+                    return
+                chunk.columns = [c.replace(BOM, "").strip() for c in chunk.columns]
+                yield chunk
+
+    def segments(self, start: datetime | None = None, end: datetime | None = None) -> list[dict]:
+        """Segments that may hold rows in [start, end] (from the manifest only)."""
+        manifest = self._load_manifest()
+        lo = start.isoformat() if start else None
+        hi = end.isoformat() if end else None
+        out = []
+        for seg in manifest["segments"]:
+            if seg["first_ts"] and seg["last_ts"]:
+                if (hi and seg["first_ts"] > hi) or (lo and seg["last_ts"] < lo):
+                    continue
+            out.append(seg)
+        return out
+
+    def iter_chunks(self, start: datetime | None = None, end: datetime | None = None,
+                    chunksize: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+        """Yield the log in order, in chunks, keeping only rows submitted in [start, end]."""
+        for seg in self.segments(start, end):
+            for chunk in self._read_segment(seg, chunksize):
+                chunk = filter_dates(chunk, self.date_column, DATE_FORMAT, start, end)
+                if not chunk.empty:
+                    yield chunk.reindex(columns=self.columns, fill_value="")
+
+    def read_all(self) -> pd.DataFrame:
+        chunks = list(self.iter_chunks())
+        if not chunks:
+            return pd.DataFrame(columns=self.columns)
+        return pd.concat(chunks, ignore_index=True)
+
+    def row_count(self) -> int:
+        return sum(s["rows"] for s in self._load_manifest()["segments"])
+
+    def version(self) -> tuple:
+        segments = self._load_manifest()["segments"]
+        seg = segments[-1]
+        try:
+            size = self._path(seg).stat().st_size
+        except FileNotFoundError:   # טרם נכתב, או נדחס ונמחק בסיבוב שקרה מאז קריאת המניפסט
+            size = 0
+        return seg["seq"], size, sum(s["rows"] for s in segments)
+
+
+# =========================
+# עימוד מעל זרם מקטעים
+# =========================
+def page(chunks: Iterator[pd.DataFrame], offset: int, limit: int) -> pd.DataFrame:
+    """Rows ``offset .. offset+limit`` of a chunk stream, reading no further than needed."""
+    out, seen, taken = [], 0, 0
+    for chunk in chunks:
+        if seen + len(chunk) > offset:
+            lo = max(0, offset - seen)
+            part = chunk.iloc[lo:lo + limit - taken]
+            out.append(part)
+            taken += len(part)
+            if taken >= limit:
+                break
+        seen += len(chunk)
+    return pd.concat(out, ignore_index=True) if out else pd.DataFrame()
+
+
+# =========================
+# CLI
+# =========================
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Segmented submission log")
+    parser.add_argument("command", choices=["list", "export", "rotate"])
+    parser.add_argument("--dir", default="data/log", type=Path)
+    parser.add_argument("--from", dest="start", help="first day, e.g. 2025-09-01")
+    parser.add_argument("--to", dest="end", help="last day (inclusive)")
+    parser.add_argument("--out", type=Path, help="output CSV for export")
+    args = parser.parse_args(argv)
+
+    log = SegmentedLog(args.dir)
+    if args.command == "list":
+        for s in log.manifest["segments"]:
+            print(f"{s['seq']:>6}  {s['file']:<22} {s['rows']:>8} rows  {s['bytes']:>10} bytes  "
+                  f"{s['first_ts'] or '-'} .. {s['last_ts'] or '-'}")
+    elif args.command == "rotate":
+        log.rotate()
+        print(f"active segment: {log.active['file']}")
+    else:
+        if not args.out:
+            parser.error("export requires --out")
+        start = datetime.fromisoformat(args.start) if args.start else None
+        end = datetime.fromisoformat(args.end) + timedelta(days=1, microseconds=-1) if args.end else None
+        n = 0
+        with open(args.out, "w", encoding="utf-8-sig", newline="") as f:
+            for chunk in log.iter_chunks(start, end):
+                chunk.to_csv(f, index=False, header=(n == 0), lineterminator="\n")
+                n += len(chunk)
+            if n == 0:
+                pd.DataFrame(columns=log.columns).to_csv(f, index=False, lineterminator="\n")
+        print(f"exported {n} rows to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
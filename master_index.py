@@ -0,0 +1,164 @@
+# master_index.py
+# -*- coding: utf-8 -*-
+"""In-memory search index over the master for the admin tables.
+
+Built once per master version (``IndexCache``) and then queried without
+scanning the frame: name / ID prefixes by binary search over sorted keys,
+site / rank / domain (``DOMAINS``) through precomputed row-position lists, and date ranges
+by binary search over the sorted submission times. A query returns matching
+row positions; ``page`` slices out only the rows that are actually shown.
+"""
+import re
+import threading
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from schema import DATE_COLUMN, DOMAINS, ID_COLUMN, RANK_COLUMNS
+from timing import timings
+
+NAME_COLUMNS = ("שם פרטי", "שם משפחה")
+DOMAINS_COLUMN = "תחומים מועדפים"
+PAGE_SIZE = 100
+_MAX_CHAR = "\U0010ffff"
+
+
+def _text(df: pd.DataFrame, col: str) -> pd.Series:
+    if col not in df.columns:
+        return pd.Series("", index=df.index, dtype=object)
+    return df[col].fillna("").astype(str).str.strip()
+
+
+def _key(s: str) -> str:
+    return " ".join(str(s).split()).casefold()
+
+
+def _keys(s: pd.Series) -> pd.Series:
+    """Vectorised ``_key`` over an already stripped text column."""
+    return s.str.replace(r"\s+", " ", regex=True).str.casefold()
+
+
+def _sortable_time(s: pd.Series) -> pd.Series:
+    """``DATE_FORMAT`` (dd/mm/YYYY HH:MM:SS) as a sortable "YYYYmmdd HH:MM:SS" string ("" if malformed)."""
+    ok = s.str.fullmatch(r"\d{2}/\d{2}/\d{4} \d{2}:\d{2}:\d{2}")
+    return (s.str[6:10] + s.str[3:5] + s.str[0:2] + s.str[10:]).where(ok, "")
+
+
+def _sortable(when) -> str:
+    return when.strftime("%Y%m%d %H:%M:%S")
+
+
+def _positions(df: pd.DataFrame, col: str) -> dict[str, np.ndarray]:
+    """Value -> row positions; from the category codes when the column is categorical."""
+    s = df[col] if col in df.columns else None
+    if s is None or not isinstance(s.dtype, pd.CategoricalDtype):
+        return pd.Series(np.arange(len(df))).groupby(_text(df, col).to_numpy()).indices
+    codes = s.cat.codes.to_numpy()
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(len(s.cat.categories) + 1))
+    return {str(c).strip(): order[lo:hi] for c, lo, hi in zip(s.cat.categories, bounds[:-1], bounds[1:]) if hi > lo}
+
+
+class _PrefixIndex:
+    """Sorted keys with their row positions; prefix lookup by binary search."""
+
+    def __init__(self, values: pd.Series):
+        keys = _keys(values).to_numpy(dtype=str)
+        self.order = np.argsort(keys, kind="stable")
+        self.keys = keys[self.order]
+
+    def lookup(self, prefix: str) -> np.ndarray:
+        lo = np.searchsorted(self.keys, prefix, side="left")
+        hi = np.searchsorted(self.keys, prefix + _MAX_CHAR, side="left")
+        return self.order[lo:hi]
+
+
+class MasterIndex:
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.n = len(df)
+        first, last = (_text(df, c) for c in NAME_COLUMNS)
+        ids = _text(df, ID_COLUMN)
+        self._text = [_PrefixIndex(first), _PrefixIndex(last), _PrefixIndex(first + " " + last),
+                      _PrefixIndex(ids), _PrefixIndex(ids.str.lstrip("0"))]
+
+        # מוסד → מיקומי שורות, לכל מקום בדירוג
+        self._by_rank = [_positions(df, c) for c in RANK_COLUMNS]
+        # תחום → מיקומי שורות (איבר שלם ברשימה המופרדת ב-";")
+        domains = _text(df, DOMAINS_COLUMN)
+        self._by_domain = {d: np.flatnonzero(domains.str.contains(rf"(?:^|;)\s*{re.escape(d)}\s*(?:;|$)"))
+                           for d in DOMAINS}
+
+        # זמן שליחה כמחרוזת ממוינת — חיפוש בינארי בלי לפרסר תאריכים
+        when = _sortable_time(_text(df, DATE_COLUMN)).to_numpy(dtype=str)
+        valid = np.flatnonzero(when != "")
+        order = valid[np.argsort(when[valid], kind="stable")]
+        self._when_order = order
+        self._when_sorted = when[order]
+
+    # --- מסננים בודדים (מיקומי שורות) ---
+    def _text_positions(self, query: str) -> np.ndarray:
+        q = _key(query)
+        return np.concatenate([idx.lookup(q) for idx in self._text])
+
+    def _site_positions(self, site: str, rank: int | None) -> np.ndarray:
+        maps = self._by_rank if rank is None else [self._by_rank[rank - 1]]
+        found = [m[site] for m in maps if site in m]
+        return np.concatenate(found) if found else np.array([], dtype=np.intp)
+
+    def _date_positions(self, start, end) -> np.ndarray:
+        lo = np.searchsorted(self._when_sorted, _sortable(start), side="left") if start else 0
+        hi = (np.searchsorted(self._when_sorted, _sortable(end), side="right") if end
+              else len(self._when_sorted))
+        return self._when_order[lo:hi]
+
+    def query(self, text: str = "", site: str | None = None, rank: int | None = None,
+              domain: str | None = None, start=None, end=None) -> np.ndarray:
+        """Sorted positions of the rows matching every given filter."""
+        with timings.span("admin.query", rows=self.n):
+            mask = np.ones(self.n, dtype=bool)
+            parts = []
+            if text.strip():
+                parts.append(self._text_positions(text))
+            if site:
+                parts.append(self._site_positions(site, rank))
+            if domain:
+                parts.append(self._by_domain.get(domain, np.array([], dtype=np.intp)))
+            if start or end:
+                parts.append(self._date_positions(start, end))
+            for pos in parts:
+                hit = np.zeros(self.n, dtype=bool)
+                hit[pos] = True
+                mask &= hit
+            return np.flatnonzero(mask)
+
+    def page(self, positions: np.ndarray, page: int, page_size: int = PAGE_SIZE) -> pd.DataFrame:
+        """Rows of the 1-based ``page`` of ``positions`` (only these rows are materialised)."""
+        lo = (max(page, 1) - 1) * page_size
+        return self.df.iloc[positions[lo:lo + page_size]]
+
+
+class IndexCache:
+    """Keeps one ``MasterIndex`` per process, rebuilt when the master version changes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entry: tuple | None = None
+
+    def get(self, version, load: Callable[[], pd.DataFrame]) -> MasterIndex:
+        with self._lock:
+            if self._entry is None or self._entry[0] != version:
+                df = load()
+                with timings.span("admin.index_build", rows=len(df)):
+                    self._entry = (version, MasterIndex(df))
+            return self._entry[1]
+
+
+def text_mask(df: pd.DataFrame, query: str) -> pd.Series:
+    """Name / ID prefix filter for a streamed chunk (the log is not indexed)."""
+    q = _key(query)
+    first, last = (_keys(_text(df, c)) for c in NAME_COLUMNS)
+    ids = _text(df, ID_COLUMN)
+    return (first.str.startswith(q) | last.str.startswith(q) | (first + " " + last).str.startswith(q)
+            | ids.str.startswith(q) | ids.str.lstrip("0").str.startswith(q))
@@ -0,0 +1,186 @@
+# matching.py
+# -*- coding: utf-8 -*-
+"""Assign students to training sites from their rankings (min-cost assignment).
+
+The student×site cost matrix is built in one vectorised pass over the master.
+Assignment uses successive shortest paths: each student is added along the
+cheapest augmenting path, which may move already-placed students between
+sites. Because there are only a handful of sites, the residual graph is
+collapsed to a site×site graph whose edge a→b is the cheapest move of a
+student currently at ``a`` to ``b`` (kept in lazy heaps), so each student
+costs one Bellman-Ford pass over ~10 nodes. Several thousand students finish
+in seconds.
+"""
+import heapq
+import math
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from schema import ID_COLUMN, RANK_COLUMNS, SITE_RANK_COLUMNS, SITES
+
+RANK_COSTS = {1: 0.0, 2: 1.0, 3: 4.0}
+UNRANKED_COST = 16.0
+
+# כללי הטופס: תחום רווחה רק לשנה ג׳; "לא לשיבוץ בבית חולים" מוציא בתי חולים
+WELFARE_SITES = [s for s in SITES if "רווחה" in s]
+HOSPITAL_SITES = [s for s in SITES if "בית חולים" in s]
+THIRD_YEAR_MARK = "שנה ג'"
+NO_HOSPITAL_MARK = "לא לשיבוץ בבית חולים"
+
+
+# =========================
+# מטריצת עלויות (וקטורית)
+# =========================
+def rank_matrix(df: pd.DataFrame, sites: list[str] = SITES) -> np.ndarray:
+    """n×k matrix of the rank each student gave each site (NaN if unranked)."""
+    ranks = np.full((len(df), len(sites)), np.nan)
+    site_arr = np.array(sites, dtype=object)
+    for r, col in enumerate(RANK_COLUMNS, start=1):
+        if col in df.columns:
+            hit = df[col].astype(object).to_numpy()[:, None] == site_arr[None, :]
+            ranks = np.where(hit & np.isnan(ranks), r, ranks)
+    # השלמה מעמודות דירוג_{site} אם עמודות המקום חסרות
+    by_site = [c for c in SITE_RANK_COLUMNS if c in df.columns]
+    if len(by_site) == len(sites):
+        alt = df[by_site].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+        ranks = np.where(np.isnan(ranks), alt, ranks)
+    return ranks
+
+
+def allowed_matrix(df: pd.DataFrame, sites: list[str] = SITES) -> np.ndarray:
+    """n×k boolean matrix of hard constraints from the form rules."""
+    allowed = np.ones((len(df), len(sites)), dtype=bool)
+    year = df.get("שנת לימודים", pd.Series("", index=df.index)).astype(str)
+    adjustments = df.get("התאמות", pd.Series("", index=df.index)).astype(str)
+    not_third_year = ~year.str.contains(THIRD_YEAR_MARK, regex=False).to_numpy()
+    no_hospital = adjustments.str.contains(NO_HOSPITAL_MARK, regex=False).to_numpy()
+    for j, s in enumerate(sites):
+        if s in WELFARE_SITES:
+            allowed[not_third_year, j] = False
+        if s in HOSPITAL_SITES:
+            allowed[no_hospital, j] = False
+    return allowed
+
+
+def cost_matrix(df: pd.DataFrame, sites: list[str] = SITES) -> tuple[np.ndarray, np.ndarray]:
+    ranks = rank_matrix(df, sites)
+    cost = np.full(ranks.shape, UNRANKED_COST)
+    for r, c in RANK_COSTS.items():
+        cost[ranks == r] = c
+    cost[~allowed_matrix(df, sites)] = np.inf
+    return cost, ranks
+
+
+# =========================
+# פותר
+# =========================
+def solve_assignment(cost: np.ndarray, capacities: list[int]) -> np.ndarray:
+    """Min-cost assignment of rows to columns with column capacities.
+
+    Returns an array with the column of each row, or -1 if it was left
+    unplaced. The number of placed rows is maximal and, among maximal
+    assignments, total cost is minimal.
+    """
+    n, real = cost.shape
+    # עמודת "לא שובץ" עם עלות גבוהה וקיבולת בלתי מוגבלת: כל שיבוץ אמיתי חוסך
+    # אותה, ולכן המינימום הוא גם בעל מספר שיבוצים מרבי (ותלמיד מאוחר יכול לדחוק
+    # תלמיד מוקדם יקר ממנו כשהמקומות מלאים)
+    unplaced_cost = (np.nanmax(cost[np.isfinite(cost)], initial=0.0) + 1.0) * (n + 1)
+    cost = np.hstack([cost, np.full((n, 1), unplaced_cost)])
+    k = real + 1
+    assign = np.full(n, -1, dtype=int)
+    load = [0] * k
+    cap = list(capacities) + [n]
+    heaps = [[[] for _ in range(k)] for _ in range(k)]   # heaps[a][b]: (c[t,b]-c[t,a], t)
+    finite = np.isfinite(cost)
+
+    def place(t: int, site: int) -> None:
+        assign[t] = site
+        row = cost[t]
+        for b in range(k):
+            if b != site and finite[t, b]:
+                heapq.heappush(heaps[site][b], (row[b] - row[site], t))
+
+    def top(a: int, b: int):
+        h = heaps[a][b]
+        while h and assign[h[0][1]] != a:
+            heapq.heappop(h)
+        return h[0] if h else None
+
+    for s in range(n):
+        dist = [cost[s, j] if finite[s, j] else math.inf for j in range(k)]
+        pred = [-1] * k
+        via = [-1] * k
+        for _ in range(k):
+            changed = False
+            for a in range(k):
+                if dist[a] == math.inf or load[a] == 0:
+                    continue
+                for b in range(k):
+                    if b == a:
+                        continue
+                    edge = top(a, b)
+                    if edge is not None and dist[a] + edge[0] < dist[b] - 1e-12:
+                        dist[b], pred[b], via[b] = dist[a] + edge[0], a, edge[1]
+                        changed = True
+            if not changed:
+                break
+
+        free = [j for j in range(k) if load[j] < cap[j] and dist[j] < math.inf]
+        end = min(free, key=lambda j: (dist[j], j))
+        load[end] += 1
+        j = end
+        while pred[j] != -1:
+            a, t = pred[j], via[j]
+            place(t, j)
+            j = a
+        place(s, j)
+    assign[assign == real] = -1
+    return assign
+
+
+# =========================
+# תוצאה: רשימות לפי מוסד + סטטיסטיקה
+# =========================
+@dataclass
+class MatchResult:
+    assignments: pd.DataFrame
+    rosters: dict = field(default_factory=dict)
+    stats: dict = field(default_factory=dict)
+
+
+def match_students(df: pd.DataFrame, capacities: dict[str, int], sites: list[str] = SITES) -> MatchResult:
+    cost, ranks = cost_matrix(df, sites)
+    assign = solve_assignment(cost, [int(capacities.get(s, 0)) for s in sites])
+
+    placed = assign >= 0
+    got_rank = np.full(len(df), np.nan)
+    got_rank[placed] = ranks[np.flatnonzero(placed), assign[placed]]
+    site_arr = np.array(sites, dtype=object)
+
+    cols = [c for c in ["שם פרטי", "שם משפחה", ID_COLUMN, "טלפון", "אימייל", "שנת לימודים", "התאמות"]
+            if c in df.columns]
+    out = df[cols].copy()
+    out["שיבוץ"] = np.where(placed, site_arr[np.clip(assign, 0, None)], "")
+    out["דירוג שקיבל/ה"] = pd.array(got_rank, dtype="Int8")
+
+    rosters = {s: out[out["שיבוץ"] == s].reset_index(drop=True) for s in sites}
+    n = len(df)
+    stats = {
+        "students": n,
+        "placed": int(placed.sum()),
+        "unplaced": int((~placed).sum()),
+        **{f"rank_{r}": int((got_rank == r).sum()) for r in RANK_COSTS},
+        "unranked_site": int((placed & np.isnan(got_rank)).sum()),
+        "mean_rank": float(np.nanmean(got_rank)) if np.isfinite(got_rank).any() else None,
+        "total_cost": float(cost[np.flatnonzero(placed), assign[placed]].sum()) if placed.any() else 0.0,
+        "fill": {s: (len(rosters[s]), int(capacities.get(s, 0))) for s in sites},
+    }
+    return MatchResult(out, rosters, stats)
+
+
+def default_capacities(n_students: int, sites: list[str] = SITES, slack: float = 1.1) -> dict[str, int]:
+    per_site = math.ceil(n_students * slack / max(1, len(sites)))
+    return {s: per_site for s in sites}
@@ -0,0 +1,168 @@
+# partitions.py
+# -*- coding: utf-8 -*-
+"""Data partitioned by cohort and form (schema) version.
+
+Each partition is a directory with its own master, log, backups, counters
+and Sheets outbox. Data adopted from before partitioning keeps syncing to
+the first worksheet; every new partition gets a worksheet named after it.
+``partitions.json`` in the data directory lists the partitions with their
+column set; exactly one is active::
+
+    data/
+      partitions.json
+      partitions/תשפו-v1/שאלון_שיבוץ.csv, log/, backups/, stats.json, ...
+      partitions/תשפו-v2/...
+
+A new cohort, or a change of ``COLUMNS_ORDER`` within a cohort, opens a new
+partition instead of rewriting the existing files (or clearing the Sheet).
+On a schema change within a cohort the latest master rows are carried over
+to the new column set; the log stays with the partition it was written to.
+Data written before partitioning is adopted in place as the first partition.
+
+Usage::
+
+    python partitions.py list [--data data]
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+
+from storage import compact_csv, read_header
+
+MANIFEST_NAME = "partitions.json"
+PARTITIONS_DIR = "partitions"
+MASTER_NAME = "שאלון_שיבוץ.csv"
+
+
+def columns_digest(columns: list[str]) -> str:
+    return hashlib.blake2b("\x1f".join(columns).encode("utf-8"), digest_size=8).hexdigest()
+
+
+def _slug(cohort: str) -> str:
+    return "".join(ch for ch in cohort if ch.isalnum())
+
+
+@dataclass
+class Partition:
+    name: str
+    cohort: str
+    schema_version: int
+    columns: list[str]
+    dir: str                        # יחסית לתיקיית הנתונים ("." — נתונים מלפני החלוקה)
+    worksheet: str | None = None    # None — הגיליון הראשון בקובץ ה-Sheets
+    created: str = field(default_factory=lambda: datetime.now().isoformat(timespec="seconds"))
+    digest: str = ""
+
+    def __post_init__(self):
+        self.digest = self.digest or columns_digest(self.columns)
+
+    def path(self, data_dir: Path) -> Path:
+        return Path(data_dir) / self.dir
+
+
+class PartitionManifest:
+    def __init__(self, data_dir: Path, legacy_files: tuple[str, ...] = (MASTER_NAME,)):
+        self.data_dir = Path(data_dir)
+        self.path = self.data_dir / MANIFEST_NAME
+        self.legacy_files = legacy_files
+        self.partitions: list[Partition] = []
+        self.active_name: str | None = None
+        self._load()
+
+    # --- מניפסט ---
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        self.partitions = [Partition(**p) for p in data["partitions"]]
+        self.active_name = data["active"]
+
+    def _save(self) -> None:
+        tmp = self.path.with_name(f".{MANIFEST_NAME}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"active": self.active_name, "partitions": [asdict(p) for p in self.partitions]},
+                      f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    @property
+    def active(self) -> Partition | None:
+        return self.get(self.active_name) if self.active_name else None
+
+    def get(self, name: str) -> Partition:
+        for p in self.partitions:
+            if p.name == name:
+                return p
+        raise KeyError(name)
+
+    def dir_of(self, partition: Partition) -> Path:
+        return partition.path(self.data_dir)
+
+    # --- פתיחת מחיצה (תחת נעילת הכותב) ---
+    def ensure_active(self, cohort: str, columns: list[str], id_column: str) -> Partition:
+        """Return the partition for ``cohort`` + ``columns``, opening a new one if needed."""
+        self._load()
+        current = self.active
+        digest = columns_digest(columns)
+        if current and current.cohort == cohort and current.digest == digest:
+            return current
+
+        if current is None and any((self.data_dir / f).exists() for f in self.legacy_files):
+            # נתונים מלפני החלוקה — נשארים במקומם כמחיצה הראשונה
+            legacy_columns = read_header(self.data_dir / MASTER_NAME) or columns
+            current = Partition(f"{_slug(cohort)}-v1", cohort, 1, legacy_columns, ".")
+            self.partitions.append(current)
+            self.active_name = current.name
+            if current.digest == digest:
+                self._save()
+                return current
+
+        same_cohort = [p for p in self.partitions if p.cohort == cohort]
+        version = max((p.schema_version for p in same_cohort), default=0) + 1
+        name = f"{_slug(cohort)}-v{version}"
+        # לשונית בשם המחיצה — שם קבוע, כך שגם אחרי איפוס מערכת הקבצים (Streamlit Cloud)
+        # אותה מחיצה חוזרת לאותה לשונית; הגיליון הראשון נשאר למחיצה שאומצה מלפני החלוקה
+        new = Partition(name, cohort, version, list(columns), f"{PARTITIONS_DIR}/{name}", worksheet=name)
+        self.dir_of(new).mkdir(parents=True, exist_ok=True)
+        if current and current.cohort == cohort:
+            self._carry_master(current, new, id_column)
+        self.partitions.append(new)
+        self.active_name = new.name
+        self._save()
+        return new
+
+    def _carry_master(self, old: Partition, new: Partition, id_column: str) -> None:
+        """Copy the latest row per ID of ``old``'s master into ``new``'s column set."""
+        src = self.dir_of(old) / MASTER_NAME
+        if not src.exists():
+            return
+        dst = self.dir_of(new) / MASTER_NAME
+        shutil.copyfile(src, dst)
+        compact_csv(dst, new.columns, key=id_column)
+
+
+# =========================
+# CLI
+# =========================
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Data partitions per cohort / form version")
+    parser.add_argument("command", choices=["list"])
+    parser.add_argument("--data", default="data", type=Path)
+    args = parser.parse_args(argv)
+
+    manifest = PartitionManifest(args.data)
+    for p in manifest.partitions:
+        mark = "*" if p.name == manifest.active_name else " "
+        print(f"{mark} {p.name:<14} {p.cohort:<8} v{p.schema_version:<3} {len(p.columns):>3} columns  "
+              f"{p.dir:<28} sheet={p.worksheet or '(first)'}  {p.created}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# schema.py
+# -*- coding: utf-8 -*-
+# =========================
+# עמודות קבועות — משותף לאפליקציה, לאחסון ולכלי הניהול
+# =========================
+SITES = [
+    "כפר הילדים חורפיש",
+    "אנוש כרמיאל",
+    "הפוך על הפוך צפת",
+    "שירות מבחן לנוער עכו",
+    "כלא חרמון",
+    "בית חולים זיו",
+    "שירותי רווחה קריית שמונה",
+    "מרכז יום לגיל השלישי",
+    "מועדונית נוער בצפת",
+    "מרפאת בריאות הנפש צפת",
+]
+RANK_COUNT = 3
+
+# =========================
+# אוצר מילים סגור (אפשרויות הטופס)
+# =========================
+OTHER = "אחר..."
+GENDERS = ["זכר","נקבה"]
+SOCIAL_AFFILIATIONS = ["יהודי/ה","מוסלמי/ת","נוצרי/ה","דרוזי/ת"]
+MOTHER_TONGUES = ["עברית","ערבית","רוסית"]
+EXTRA_LANGUAGES = ["עברית","ערבית","רוסית","אמהרית","אנגלית","ספרדית"]
+STUDY_YEARS = [
+    "תואר ראשון - שנה א", "תואר ראשון - שנה ב", "תואר ראשון - שנה ג'",
+    "תואר שני - שנה א'", "תואר שני - שנה ב"
+]
+TRACKS = [
+    "תואר ראשון – תוכנית רגילה",
+    "תואר ראשון – הסבה",
+    "תואר שני"
+]
+PREV_TRAINING = ["כן","לא",OTHER]
+DOMAINS = ["רווחה","מוגבלות","זקנה","ילדים ונוער","בריאות הנפש",
+           "שיקום","משפחה","נשים","בריאות","קהילה"]
+ADJUSTMENTS = ["אין","הריון","מגבלה רפואית (למשל: מחלה כרונית, אוטואימונית)",
+               "רגישות למרחב רפואי (למשל: לא לשיבוץ בבית חולים)",
+               "אלרגיה חמורה","נכות",
+               "רקע משפחתי רגיש (למשל: בן משפחה עם פגיעה נפשית)"]
+LIKERT = ["בכלל לא מסכים/ה","1","2","3","4","מסכים/ה מאוד"]
+MOTIVATION_COLUMNS = ["מוטיבציה 1", "מוטיבציה 2", "מוטיבציה 3"]
+
+ID_COLUMN = "תעודת זהות"
+DATE_COLUMN = "תאריך שליחה"
+DATE_FORMAT = "%d/%m/%Y %H:%M:%S"
+RANK_COLUMNS = [f"מקום הכשרה {i}" for i in range(1, RANK_COUNT+1)]
+SITE_RANK_COLUMNS = [f"דירוג_{s}" for s in SITES]
+
+COLUMNS_ORDER = [
+    "תאריך שליחה", "שם פרטי", "שם משפחה", "תעודת זהות", "מין", "שיוך חברתי",
+    "שפת אם", "שפות נוספות", "טלפון", "כתובת", "אימייל",
+    "שנת לימודים", "מסלול לימודים",
+    "הכשרה קודמת", "הכשרה קודמת מקום ותחום",
+    "הכשרה קודמת מדריך ומיקום", "הכשרה קודמת בן זוג",
+    "תחומים מועדפים", "תחום מוביל", "בקשה מיוחדת",
+    "ממוצע", "התאמות", "התאמות פרטים",
+    "מוטיבציה 1", "מוטיבציה 2", "מוטיבציה 3",
+] + RANK_COLUMNS + SITE_RANK_COLUMNS + [
+    "אישור הגעה להכשרה"
+]
+
+# =========================
+# טיפוסי עמודות בזיכרון (storage.apply_dtypes) — בקובץ הכול נשאר טקסט
+# =========================
+# רשימה = קטגוריה עם אוצר המילים של הטופס (ערכים אחרים שנמצאו בנתונים מתווספים
+# כקטגוריות נוספות, לא נמחקים); מחרוזת = dtype מספרי. ת"ז ושאר הטקסט החופשי — מחרוזת.
+MASTER_DTYPES = {
+    "מין": GENDERS,
+    "שיוך חברתי": SOCIAL_AFFILIATIONS,
+    "שפת אם": MOTHER_TONGUES,
+    "שנת לימודים": STUDY_YEARS,
+    "מסלול לימודים": TRACKS,
+    "הכשרה קודמת": PREV_TRAINING,
+    "תחום מוביל": DOMAINS,
+    **{c: LIKERT for c in MOTIVATION_COLUMNS},
+    **{c: SITES for c in RANK_COLUMNS},
+    **{c: "Int8" for c in SITE_RANK_COLUMNS},
+    "אישור הגעה להכשרה": ["כן", "לא"],
+}
+
+# =========================
+# מחזור נוכחי — יחד עם COLUMNS_ORDER קובע את המחיצה הפעילה (ראו partitions.py)
+# =========================
+COHORT = "תשפ״ו"
@@ -0,0 +1,515 @@
+# sheets_sync.py
+# -*- coding: utf-8 -*-
+"""Durable outbox + background worker that mirrors submissions to Google Sheets.
+
+Submits only append a JSON line to a local outbox file. A single worker
+thread drains it with one ``append_rows`` call per interval and retries with
+exponential backoff, so Sheets latency, quota and errors never reach the
+student. Delivery is at-least-once: the acknowledged position is stored only
+after a batch has been accepted by the Sheet.
+
+``SheetsWriter.reconcile`` repairs a Sheet that missed rows (e.g. from before
+the outbox existed): one ``get_all_values`` read, a diff by ID + timestamp
+against the local master, and one ``append_rows`` with everything missing.
+"""
+import json
+import os
+import random
+import threading
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable
+
+from schema import DATE_FORMAT
+from storage import FileLock
+from timing import is_quota_error, timings
+
+
+# =========================
+# Outbox מקומי עמיד
+# =========================
+class Outbox:
+    """Append-only JSON-lines queue with a separately stored acknowledged offset.
+
+    ``lock`` should be the writer's ``FileLock`` when several processes share
+    the file, so that enqueue and truncate-on-drain never interleave.
+    """
+
+    def __init__(self, path: Path, lock=None):
+        self.path = Path(path)
+        self.offset_path = self.path.with_name(self.path.name + ".offset")
+        self._lock = lock or threading.RLock()
+        self.drain_lock = FileLock(self.path.with_name(self.path.name + ".drain.lock"))
+        self._depth = self._count_pending()
+
+    def _read_offset(self) -> int:
+        try:
+            return int(self.offset_path.read_text().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _write_offset(self, offset: int) -> None:
+        tmp = self.offset_path.with_name("." + self.offset_path.name + ".tmp")
+        tmp.write_text(str(offset))
+        os.replace(tmp, self.offset_path)
+
+    def _count_pending(self) -> int:
+        if not self.path.exists():
+            return 0
+        with open(self.path, "rb") as f:
+            f.seek(self._read_offset())
+            return sum(1 for line in f if line.strip())
+
+    def enqueue(self, rows: list[list]) -> None:
+        if not rows:
+            return
+        payload = "".join(
+            json.dumps(["" if v is None else v for v in r], ensure_ascii=False) + "\n" for r in rows
+        ).encode("utf-8")
+        with self._lock:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, payload)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            self._depth += len(rows)
+
+    def peek(self, max_rows: int) -> tuple[list[list], int]:
+        """Return up to ``max_rows`` pending rows and the offset just after them."""
+        with self._lock:
+            if not self.path.exists():
+                return [], 0
+            offset = self._read_offset()
+            rows = []
+            with open(self.path, "rb") as f:
+                f.seek(offset)
+                while len(rows) < max_rows:
+                    line = f.readline()
+                    if not line.endswith(b"\n"):
+                        break
+                    offset += len(line)
+                    if line.strip():
+                        rows.append(json.loads(line))
+            return rows, offset
+
+    def ack(self, offset: int, count: int) -> None:
+        with self._lock:
+            self._depth = max(0, self._depth - count)
+            if offset >= self.path.stat().st_size:
+                # הכל נשלח — מקצרים את הקובץ במקום לגדול ללא גבול
+                self.path.write_bytes(b"")
+                offset = 0
+            self._write_offset(offset)
+
+    def depth(self) -> int:
+        return self._depth
+
+
+# =========================
+# חיבור עצל ל-Google Sheets
+# =========================
+def counted_call(name: str, fn: Callable, *args, **kwargs):
+    """Call one Sheets API method, timing it and counting it (and any failure)."""
+    with timings.span(f"sheets.api.{name}"):
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            timings.count_api(name, e)
+            raise
+    timings.count_api(name)
+    return result
+
+
+class CountedWorksheet:
+    """Proxy that counts (and times) every API method called on a worksheet."""
+
+    API_METHODS = {"row_values", "get_all_values", "clear", "append_row", "append_rows",
+                   "update", "batch_update", "format"}
+
+    def __init__(self, ws):
+        self._ws = ws
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._ws, name)
+        if name not in self.API_METHODS or not callable(attr):
+            return attr
+        return lambda *args, **kwargs: counted_call(name, attr, *args, **kwargs)
+
+
+class SheetsConnection:
+    """Process-wide, lazily opened worksheet handle with health check and reconnect.
+
+    ``factory`` performs the authorisation and ``open_by_key`` calls; it runs
+    on first use (from the worker thread), never during a form rerun.
+    """
+
+    def __init__(self, factory: Callable, retry_after: float = 30.0):
+        self.factory = factory
+        self.retry_after = retry_after
+        self.last_error = ""
+        self._ws = None
+        self._failed_at = 0.0
+        self._lock = threading.Lock()
+
+    def worksheet(self):
+        with self._lock:
+            if self._ws is None and time.time() - self._failed_at >= self.retry_after:
+                try:
+                    with timings.span("sheets.connect"):
+                        self._ws = CountedWorksheet(self.factory())
+                    self.last_error = ""
+                except Exception as e:
+                    self._failed_at = time.time()
+                    self.last_error = f"{type(e).__name__}: {e}"
+            return self._ws
+
+    def invalidate(self, exc: Exception | None = None) -> None:
+        """Drop the handle so the next call reconnects (quota errors keep it)."""
+        if exc is not None and is_quota_error(exc):
+            return
+        with self._lock:
+            self._ws = None
+            self._failed_at = 0.0
+
+    def health_check(self) -> bool:
+        ws = self.worksheet()
+        if ws is None:
+            return False
+        try:
+            ws.row_values(1)
+            return True
+        except Exception as e:
+            self.last_error = f"{type(e).__name__}: {e}"
+            self.invalidate(e)
+            return False
+
+    @property
+    def connected(self) -> bool:
+        return self._ws is not None
+
+
+# =========================
+# עיצוב הגיליון בבקשת batch_update אחת
+# =========================
+HEADER_BG = {"red": 0.6, "green": 0.4, "blue": 0.8}      # סגול בהיר
+ZEBRA_BG = {"red": 0.95, "green": 0.95, "blue": 0.95}    # אפור בהיר
+ID_BG = {"red": 0.9, "green": 0.9, "blue": 0.9}          # אפור עדין
+WHITE = {"red": 1, "green": 1, "blue": 1}
+
+
+def style_requests(sheet_id: int, n_columns: int, id_index: int, existing_rules: int = 0) -> list[dict]:
+    """batch_update requests: header row, zebra stripes (replacing old rules) and the ID column."""
+    requests = [{"deleteConditionalFormatRule": {"sheetId": sheet_id, "index": 0}}
+                for _ in range(existing_rules)]
+    requests += [
+        # --- עיצוב כותרות (שורה 1) ---
+        {"repeatCell": {
+            "range": {"sheetId": sheet_id, "startRowIndex": 0, "endRowIndex": 1},
+            "cell": {"userEnteredFormat": {
+                "backgroundColor": HEADER_BG,
+                "textFormat": {"bold": True, "foregroundColor": WHITE},
+                "horizontalAlignment": "CENTER",
+            }},
+            "fields": "userEnteredFormat(backgroundColor,textFormat,horizontalAlignment)",
+        }},
+        # --- צבעי רקע מתחלפים (פסי זברה) על כל עמודות הנתונים ---
+        {"addConditionalFormatRule": {"index": 0, "rule": {
+            "ranges": [{"sheetId": sheet_id, "startRowIndex": 1,
+                        "startColumnIndex": 0, "endColumnIndex": n_columns}],
+            "booleanRule": {
+                "condition": {"type": "CUSTOM_FORMULA", "values": [{"userEnteredValue": "=ISEVEN(ROW())"}]},
+                "format": {"backgroundColor": ZEBRA_BG},
+            },
+        }}},
+        # --- עיצוב עמודת ת"ז ---
+        {"repeatCell": {
+            "range": {"sheetId": sheet_id, "startRowIndex": 1,
+                      "startColumnIndex": id_index, "endColumnIndex": id_index + 1},
+            "cell": {"userEnteredFormat": {"horizontalAlignment": "CENTER", "backgroundColor": ID_BG}},
+            "fields": "userEnteredFormat(horizontalAlignment,backgroundColor)",
+        }},
+    ]
+    return requests
+
+
+def apply_style(ws, columns: list[str], id_column: str) -> None:
+    """Style the sheet with one metadata read (to replace old rules) and one batch_update."""
+    spreadsheet = ws.spreadsheet
+    meta = counted_call("fetch_sheet_metadata", spreadsheet.fetch_sheet_metadata,
+                        {"fields": "sheets(properties.sheetId,conditionalFormats)"})
+    existing = next((len(s.get("conditionalFormats", [])) for s in meta.get("sheets", [])
+                     if s.get("properties", {}).get("sheetId") == ws.id), 0)
+    counted_call("batch_update", spreadsheet.batch_update,
+                 {"requests": style_requests(ws.id, len(columns), columns.index(id_column), existing)})
+
+
+# =========================
+# השוואה מול הגיליון
+# =========================
+def _id_key(v) -> str:
+    # Sheets (USER_ENTERED) הופך ת"ז למספר ומוריד אפסים מובילים
+    s = str(v).strip()
+    if s.endswith(".0"):
+        s = s[:-2]
+    return s.lstrip("0")
+
+
+def _ts_key(v) -> str:
+    s = str(v).strip()
+    try:
+        return datetime.strptime(s, DATE_FORMAT).isoformat()
+    except ValueError:
+        return s
+
+
+def row_key(id_value, ts_value) -> tuple[str, str]:
+    return _id_key(id_value), _ts_key(ts_value)
+
+
+def _sheet_value(v):
+    if v is None:
+        return ""
+    try:
+        if v != v:
+            return ""
+    except (TypeError, ValueError):
+        return ""
+    return v.item() if hasattr(v, "item") else v
+
+
+# =========================
+# Worker ברקע
+# =========================
+class SheetsWriter:
+    def __init__(
+        self,
+        outbox: Outbox,
+        get_worksheet: Callable,
+        columns: list[str],
+        on_header_written: Callable | None = None,
+        on_failure: Callable | None = None,
+        interval: float = 2.0,
+        max_batch: int = 500,
+        base_backoff: float = 1.0,
+        max_backoff: float = 120.0,
+    ):
+        self.outbox = outbox
+        self.get_worksheet = get_worksheet
+        self.columns = columns
+        self.on_header_written = on_header_written
+        self.on_failure = on_failure
+        self.interval = interval
+        self.max_batch = max_batch
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        self.failures = 0
+        self.last_error = ""
+        self.last_success: float | None = None
+        self.next_attempt = 0.0
+        self._header_ok = False
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def enqueue(self, rows: list[dict]) -> None:
+        self.outbox.enqueue([[r.get(c, "") for c in self.columns] for r in rows])
+        self._wake.set()
+
+    def depth(self) -> int:
+        return self.outbox.depth()
+
+    def status(self) -> dict:
+        return {
+            "depth": self.depth(),
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "last_success": self.last_success,
+            "next_attempt_in": max(0.0, self.next_attempt - time.time()),
+        }
+
+    def _ensure_header(self, ws) -> None:
+        if self._header_ok:
+            return
+        with timings.span("sheets.header"):
+            headers = ws.row_values(1)
+            if headers != self.columns:
+                # לעולם לא מוחקים גיליון עם נתונים — השורות נשארות בתור עד שהלשונית מתוקנת
+                if headers and ws.row_values(2):
+                    raise ValueError("כותרות הגיליון שונות מסדר העמודות המקומי והגיליון מכיל נתונים; "
+                                     "הוא לא יימחק. יש להגדיר לשונית נפרדת למחיצה.")
+                ws.clear()
+                ws.append_row(self.columns, value_input_option="USER_ENTERED")
+                if self.on_header_written:
+                    with timings.span("sheets.style"):
+                        self.on_header_written(ws)
+        self._header_ok = True
+
+    def drain_once(self) -> int:
+        """Send one batch. Returns the number of rows delivered (raises on API error).
+
+        Only one process drains at a time; others skip the round.
+        """
+        if not self.outbox.drain_lock.acquire(blocking=False):
+            return 0
+        try:
+            rows, offset = self.outbox.peek(self.max_batch)
+            if not rows:
+                return 0
+            ws = self.get_worksheet()
+            if ws is None:
+                raise ConnectionError("Google Sheets worksheet is not available")
+            self._ensure_header(ws)
+            with timings.span("sheets.append_rows", rows=len(rows)):
+                ws.append_rows(rows, value_input_option="USER_ENTERED")
+            self.outbox.ack(offset, len(rows))
+            return len(rows)
+        finally:
+            self.outbox.drain_lock.release()
+
+    def reconcile(self, rows: list[dict], id_column: str, date_column: str) -> dict:
+        """Append every local row the Sheet is missing, keyed by ID + submission time.
+
+        Rows still waiting in the outbox are left to the worker. Holds the
+        drain lock throughout, so the worker cannot deliver the same rows.
+        """
+        with self.outbox.drain_lock:
+            ws = self.get_worksheet()
+            if ws is None:
+                raise ConnectionError("Google Sheets worksheet is not available")
+            values = ws.get_all_values()
+            header = values[0] if values else []
+            if header and header != self.columns:
+                raise ValueError("כותרות הגיליון שונות מסדר העמודות המקומי; לא ניתן להשוות.")
+            i, j = self.columns.index(id_column), self.columns.index(date_column)
+            present = {row_key(r[i], r[j]) for r in values[1:] if len(r) > max(i, j)}
+            pending, _ = self.outbox.peek(sys.maxsize)
+            present |= {row_key(r[i], r[j]) for r in pending if len(r) > max(i, j)}
+
+            missing = [r for r in rows
+                       if row_key(r.get(id_column, ""), r.get(date_column, "")) not in present]
+            payload = [[_sheet_value(r.get(c)) for c in self.columns] for r in missing]
+            if not header:
+                payload.insert(0, list(self.columns))
+            if payload:
+                with timings.span("sheets.reconcile_append", rows=len(payload)):
+                    ws.append_rows(payload, value_input_option="USER_ENTERED")
+            if not header:
+                self._header_ok = True
+                if self.on_header_written:
+                    self.on_header_written(ws)
+            return {
+                "sheet_rows": max(0, len(values) - 1),
+                "local_rows": len(rows),
+                "pending": len(pending),
+                "pushed": len(missing),
+            }
+
+    def _backoff(self) -> float:
+        delay = min(self.max_backoff, self.base_backoff * 2 ** (self.failures - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stop.is_set() or time.time() < self.next_attempt:
+                continue
+            try:
+                while self.drain_once():
+                    pass
+                self.failures = 0
+                self.last_error = ""
+                self.last_success = time.time()
+            except Exception as e:
+                self._header_ok = False
+                self.failures += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+                self.next_attempt = time.time() + self._backoff()
+                if self.on_failure:
+                    self.on_failure(e)
+
+    def start(self) -> "SheetsWriter":
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="sheets-writer", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+
+# =========================
+# גיליון מדומה לבדיקות ללא רשת
+# =========================
+class FakeSpreadsheet:
+    """The ``ws.spreadsheet`` side of ``FakeWorksheet``: metadata and batch_update."""
+
+    def __init__(self, ws: "FakeWorksheet"):
+        self.ws = ws
+        self.requests: list[dict] = []
+        self.conditional_formats: list[dict] = []
+
+    def fetch_sheet_metadata(self, params: dict | None = None) -> dict:
+        self.ws._call()
+        return {"sheets": [{"properties": {"sheetId": self.ws.id},
+                            "conditionalFormats": list(self.conditional_formats)}]}
+
+    def batch_update(self, body: dict) -> dict:
+        self.ws._call()
+        for req in body.get("requests", []):
+            self.requests.append(req)
+            if "deleteConditionalFormatRule" in req:
+                self.conditional_formats.pop(req["deleteConditionalFormatRule"]["index"])
+            elif "addConditionalFormatRule" in req:
+                add = req["addConditionalFormatRule"]
+                self.conditional_formats.insert(add.get("index", 0), add["rule"])
+        return {"replies": [{} for _ in body.get("requests", [])]}
+
+
+class FakeWorksheet:
+    """In-memory stand-in for ``gspread.Worksheet`` with optional latency and failures."""
+
+    def __init__(self, latency: float = 0.0):
+        self.id = 0
+        self.rows: list[list] = []
+        self.latency = latency
+        self.calls = 0
+        self._fail_next: list[Exception] = []
+        self.spreadsheet = FakeSpreadsheet(self)
+
+    def fail_next(self, n: int = 1, exc: Exception | None = None) -> None:
+        self._fail_next.extend([exc or RuntimeError("APIError: [429] Quota exceeded")] * n)
+
+    def _call(self) -> None:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self._fail_next:
+            raise self._fail_next.pop(0)
+
+    def row_values(self, row: int) -> list:
+        self._call()
+        return list(self.rows[row - 1]) if len(self.rows) >= row else []
+
+    def get_all_values(self) -> list[list]:
+        self._call()
+        return [list(r) for r in self.rows]
+
+    def clear(self) -> None:
+        self._call()
+        self.rows = []
+
+    def append_row(self, values: list, value_input_option: str = "RAW") -> None:
+        self._call()
+        self.rows.append([str(v) for v in values])
+
+    def append_rows(self, values: list[list], value_input_option: str = "RAW") -> None:
+        self._call()
+        self.rows.extend([str(v) for v in r] for r in values)
@@ -0,0 +1,303 @@
+# sqlite_store.py
+# -*- coding: utf-8 -*-
+"""Embedded SQLite storage backend (WAL mode, indexed by ID, date and ranks).
+
+The master table is unique on ID (latest submission wins); the log keeps every row.
+
+The log is read from the segmented log directory (``--log-dir``, default
+``log/`` next to the master) when it has a manifest, else from the legacy
+single-file log.
+
+Usage::
+
+    python sqlite_store.py migrate --db data/שאלון_שיבוץ.sqlite3 \
+        --master data/שאלון_שיבוץ.csv --log data/שאלון_שיבוץ_log.csv
+    python sqlite_store.py export  --db data/שאלון_שיבוץ.sqlite3 --table master --out master.csv
+"""
+import argparse
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator
+
+import pandas as pd
+
+from logstore import SegmentedLog
+from schema import COLUMNS_ORDER, DATE_COLUMN, DATE_FORMAT, ID_COLUMN, MASTER_DTYPES, RANK_COLUMNS
+from storage import CHUNK_ROWS, StorageBackend, apply_dtypes, filter_dates, load_csv_safely
+
+TABLES = ("master", "log")
+
+
+def _q(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _cell(v):
+    if v is None or (isinstance(v, float) and v != v):
+        return None
+    return str(v)
+
+
+class SqliteBackend(StorageBackend):
+    def __init__(self, db_path: Path, columns: list[str] = COLUMNS_ORDER,
+                 id_column: str = ID_COLUMN, date_column: str = DATE_COLUMN,
+                 rank_columns: list[str] = RANK_COLUMNS, dtypes: dict | None = MASTER_DTYPES):
+        self.db_path = Path(db_path)
+        self.columns = columns
+        self.id_column = id_column
+        self.date_column = date_column
+        self.rank_columns = rank_columns
+        self.dtypes = dtypes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=10000")
+        self._ensure_schema()
+        self._frames: dict[str, tuple] = {}
+
+    # --- סכמה ---
+    def _ensure_schema(self) -> None:
+        with self._lock:
+            for table in TABLES:
+                cols = ", ".join(f"{_q(c)} TEXT" for c in self.columns)
+                self._conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {table} (_rowid INTEGER PRIMARY KEY AUTOINCREMENT, {cols})"
+                )
+                existing = {r[1] for r in self._conn.execute(f"PRAGMA table_info({table})")}
+                for c in self.columns:
+                    if c not in existing:
+                        self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {_q(c)} TEXT")
+                self._conn.execute(f"CREATE INDEX IF NOT EXISTS ix_{table}_date ON {table}({_q(self.date_column)})")
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS ix_log_id ON log({_q(self.id_column)})")
+            self._ensure_unique_master_id()
+            for i, col in enumerate(self.rank_columns, start=1):
+                self._conn.execute(f"CREATE INDEX IF NOT EXISTS ix_master_rank{i} ON master({_q(col)})")
+
+    def _ensure_unique_master_id(self) -> None:
+        """One row per ID in master: drop superseded rows once, then enforce it."""
+        exists = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='index' AND name='ux_master_id'"
+        ).fetchone()
+        if exists:
+            return
+        id_col = _q(self.id_column)
+        self._conn.execute(
+            f"DELETE FROM master WHERE _rowid NOT IN (SELECT MAX(_rowid) FROM master GROUP BY {id_col})"
+        )
+        self._conn.execute("DROP INDEX IF EXISTS ix_master_id")
+        self._conn.execute(f"CREATE UNIQUE INDEX ux_master_id ON master({id_col})")
+
+    # --- כתיבה ---
+    def _insert_sql(self, table: str) -> str:
+        # ב-master: REPLACE מוחק את השורה הקודמת עם אותה ת"ז ומוסיף חדשה (rowid חדש)
+        verb = "INSERT OR REPLACE" if table == "master" else "INSERT"
+        return (f"{verb} INTO {table} ({', '.join(_q(c) for c in self.columns)}) "
+                f"VALUES ({', '.join('?' * len(self.columns))})")
+
+    def _insert(self, table: str, rows: list[dict]) -> None:
+        if not rows:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(self._insert_sql(table),
+                                       ([_cell(r.get(c)) for c in self.columns] for r in rows))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def append_master(self, rows: list[dict]) -> None:
+        self._insert("master", rows)
+
+    def upsert_master(self, rows: list[dict]) -> list[dict | None]:
+        if not rows:
+            return []
+        select = (f"SELECT {', '.join(_q(c) for c in self.columns)} FROM master "
+                  f"WHERE {_q(self.id_column)} = ?")
+        previous = []
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for r in rows:
+                    values = [_cell(r.get(c)) for c in self.columns]
+                    old = self._conn.execute(select, (values[self.columns.index(self.id_column)],)).fetchone()
+                    previous.append(dict(zip(self.columns, old)) if old else None)
+                    self._conn.execute(self._insert_sql("master"), values)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return previous
+
+    def get_by_id(self, nat_id: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(_q(c) for c in self.columns)} FROM master WHERE {_q(self.id_column)} = ?",
+                (str(nat_id).strip(),)
+            ).fetchone()
+        return dict(zip(self.columns, row)) if row else None
+
+    def append_log(self, rows: list[dict]) -> None:
+        self._insert("log", rows)
+
+    # --- קריאה ---
+    def _version(self, table: str):
+        with self._lock:
+            return tuple(self._conn.execute(f"SELECT COALESCE(MAX(_rowid), 0), COUNT(*) FROM {table}").fetchone())
+
+    def row_count(self, table: str) -> int:
+        return self._version(table)[1]
+
+    def master_version(self):
+        return self._version("master")
+
+    def log_version(self):
+        return self._version("log")
+
+    def log_row_count(self) -> int:
+        return self.row_count("log")
+
+    def _select(self, table: str, where: str = "", params: tuple = ()) -> pd.DataFrame:
+        sql = f"SELECT {', '.join(_q(c) for c in self.columns)} FROM {table} {where} ORDER BY _rowid"
+        with self._lock:
+            return pd.read_sql_query(sql, self._conn, params=params)
+
+    def _load(self, table: str) -> pd.DataFrame:
+        version = self._version(table)
+        cached = self._frames.get(table)
+        if cached and cached[0] == version:
+            return cached[1]
+        df = self._select(table)
+        if table == "master" and self.dtypes is not None:
+            df = apply_dtypes(df, self.dtypes)
+        self._frames[table] = (version, df)
+        return df
+
+    def load_master(self) -> pd.DataFrame:
+        return self._load("master")
+
+    def load_log(self) -> pd.DataFrame:
+        return self._load("log")
+
+    def _iter_rows(self, table: str, chunksize: int) -> Iterator[pd.DataFrame]:
+        # עימוד לפי _rowid — הנעילה לא מוחזקת בין נתחים
+        sql = (f"SELECT _rowid, {', '.join(_q(c) for c in self.columns)} FROM {table} "
+               f"WHERE _rowid > ? ORDER BY _rowid LIMIT ?")
+        last = 0
+        while True:
+            with self._lock:
+                chunk = pd.read_sql_query(sql, self._conn, params=(last, chunksize))
+            if chunk.empty:
+                return
+            last = int(chunk["_rowid"].iloc[-1])
+            yield chunk.drop(columns="_rowid")
+
+    def iter_master(self, chunksize: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+        yield from self._iter_rows("master", chunksize)
+
+    def iter_log(self, start: datetime | None = None, end: datetime | None = None,
+                 chunksize: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+        # התאריך נשמר כטקסט dd/mm/YYYY ולכן מסונן על כל נתח ולא ב-SQL
+        for chunk in self._iter_rows("log", chunksize):
+            chunk = filter_dates(chunk, DATE_COLUMN, DATE_FORMAT, start, end)
+            if not chunk.empty:
+                yield chunk
+
+    def has_id(self, nat_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT 1 FROM master WHERE {_q(self.id_column)} = ? LIMIT 1", (str(nat_id).strip(),)
+            ).fetchone()
+        return row is not None
+
+    def find_by_choice(self, site: str, rank: int) -> pd.DataFrame:
+        return self._select("master", f"WHERE {_q(self.rank_columns[rank - 1])} = ?", (site,))
+
+    # --- ייצוא / תחזוקה ---
+    def export_csv(self, table: str, path: Path, chunksize: int = 50_000) -> int:
+        sql = f"SELECT {', '.join(_q(c) for c in self.columns)} FROM {table} ORDER BY _rowid"
+        n = 0
+        with self._lock, open(path, "w", encoding="utf-8-sig", newline="") as f:
+            for i, chunk in enumerate(pd.read_sql_query(sql, self._conn, chunksize=chunksize)):
+                chunk.to_csv(f, index=False, header=(i == 0), lineterminator="\n")
+                n += len(chunk)
+            if n == 0:
+                pd.DataFrame(columns=self.columns).to_csv(f, index=False, lineterminator="\n")
+        return n
+
+    def write_master_csv(self, path: Path) -> None:
+        self.export_csv("master", path)
+
+    def compact(self) -> int:
+        with self._lock:
+            self._conn.execute("VACUUM")
+        return self.row_count("master")
+
+    def import_frame(self, table: str, df: pd.DataFrame) -> int:
+        """Bulk-insert a frame (columns matched by name) in one transaction."""
+        df = df.reindex(columns=self.columns)
+        self._insert(table, df.astype(object).where(df.notna(), None).to_dict("records"))
+        return len(df)
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+# =========================
+# הגירה מקבצי CSV קיימים
+# =========================
+def _log_chunks(log_csv: Path | None, log_dir: Path | None) -> Iterator[pd.DataFrame] | None:
+    # אחרי adopt היומן הישן שמור במקטעים (והקובץ עצמו שונה ל-.migrated)
+    if log_dir and (Path(log_dir) / "manifest.json").exists():
+        return SegmentedLog(log_dir).iter_chunks()
+    if log_csv and Path(log_csv).exists():
+        return iter([load_csv_safely(Path(log_csv), dtype=str, keep_default_na=False)[0]])
+    return None
+
+
+def migrate_csv(backend: SqliteBackend, master_csv: Path | None, log_csv: Path | None,
+                force: bool = False, log_dir: Path | None = None) -> dict:
+    counts = {}
+    master = None
+    if master_csv and Path(master_csv).exists():
+        master = iter([load_csv_safely(Path(master_csv), dtype=str, keep_default_na=False)[0]])
+    for table, chunks in (("master", master), ("log", _log_chunks(log_csv, log_dir))):
+        if chunks is None:
+            continue
+        if backend.row_count(table) and not force:
+            raise RuntimeError(f"הטבלה {table} אינה ריקה; השתמשו ב- --force כדי להוסיף בכל זאת.")
+        counts[table] = sum(backend.import_frame(table, chunk) for chunk in chunks)
+    return counts
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="SQLite storage backend tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    m = sub.add_parser("migrate", help="bulk-import the existing CSV files")
+    m.add_argument("--db", type=Path, required=True)
+    m.add_argument("--master", type=Path)
+    m.add_argument("--log", type=Path, help="legacy single-file log")
+    m.add_argument("--log-dir", type=Path, help="segmented log directory (default: log/ next to --master)")
+    m.add_argument("--force", action="store_true")
+    e = sub.add_parser("export", help="export a table as CSV")
+    e.add_argument("--db", type=Path, required=True)
+    e.add_argument("--table", choices=TABLES, default="master")
+    e.add_argument("--out", type=Path, required=True)
+    args = parser.parse_args(argv)
+
+    backend = SqliteBackend(args.db)
+    if args.command == "migrate":
+        log_dir = args.log_dir or (args.master.parent / "log" if args.master else None)
+        for table, n in migrate_csv(backend, args.master, args.log, args.force, log_dir).items():
+            print(f"{table}: imported {n} rows")
+    else:
+        print(f"exported {backend.export_csv(args.table, args.out)} rows to {args.out}")
+    backend.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,698 @@
+# storage.py
+# -*- coding: utf-8 -*-
+import abc
+import csv
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import warnings
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from io import StringIO
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+
+from timing import timings
+
+BOM = "\ufeff"
+CHUNK_ROWS = 5000
+
+logger = logging.getLogger("students.storage")
+
+# =========================
+# כתיבה Append-Only לקובץ CSV
+# =========================
+def _format_line(values: list) -> str:
+    buf = StringIO()
+    csv.writer(buf, quoting=csv.QUOTE_MINIMAL, lineterminator="\n").writerow(
+        ["" if v is None else v for v in values]
+    )
+    return buf.getvalue()
+
+
+def read_header(path: Path) -> list[str]:
+    """Return the header row of a CSV file (BOM stripped), or [] if empty/missing."""
+    if not path.exists():
+        return []
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        first = f.readline()
+    if not first.strip():
+        return []
+    return [c.replace(BOM, "").strip() for c in next(csv.reader([first]))]
+
+
+def _ends_with_newline(path: Path) -> bool:
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() == 0:
+            return True
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def append_csv_rows(path: Path, rows: list[dict], columns: list[str]) -> None:
+    """Append rows to a CSV file in one write, without reading the existing data.
+
+    A new (or empty) file gets a UTF-8 BOM and the header. If the file was
+    written with a different column set it is compacted to ``columns`` first,
+    which only happens once after a schema change.
+    """
+    if not rows:
+        return
+    size = path.stat().st_size if path.exists() else 0
+    header = read_header(path) if size else []
+    if size and header != columns:
+        compact_csv(path, columns)
+        size = path.stat().st_size
+
+    payload = "".join(_format_line([r.get(c, "") for c in columns]) for r in rows)
+    if not size:
+        payload = BOM + _format_line(columns) + payload
+    elif not _ends_with_newline(path):
+        payload = "\n" + payload
+
+    # כתיבה אחת עם O_APPEND — שורה לא נחתכת באמצע גם כשיש כותבים נוספים
+    with timings.span("csv.append", rows=len(rows)):
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, payload.encode("utf-8"))
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def append_csv_row(path: Path, row: dict, columns: list[str]) -> None:
+    append_csv_rows(path, [row], columns)
+
+
+# =========================
+# דחיסה (כתיבה מלאה) — רק בצעד מפורש
+# =========================
+def write_csv_atomic(df: pd.DataFrame, path: Path) -> None:
+    """Write ``df`` to a temp file next to ``path`` and atomically replace it."""
+    tmp = path.with_name(f".{path.name}.tmp")
+    with timings.span("csv.rewrite", rows=len(df)):
+        df.to_csv(tmp, index=False, encoding="utf-8-sig", lineterminator="\n")
+        with open(tmp, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+
+def compact_csv(path: Path, columns: list[str], key: str | None = None) -> int:
+    """Rewrite a CSV file with exactly ``columns`` (in order). Returns the row count.
+
+    With ``key``, only the last row per key value is kept (superseded upserts are dropped).
+    """
+    if not path.exists():
+        return 0
+    df = pd.read_csv(path, encoding="utf-8-sig", dtype=str, keep_default_na=False)
+    df.columns = [c.replace(BOM, "").strip() for c in df.columns]
+    df = df.reindex(columns=columns, fill_value="")
+    if key:
+        df = df[~df[key].str.strip().duplicated(keep="last")]
+    write_csv_atomic(df, path)
+    return len(df)
+
+
+# =========================
+# טעינה עם מטמון לפי זהות קובץ + גודל/mtime
+# =========================
+_HEAD_BYTES = 4096
+SNIFF_BYTES = 64 * 1024
+BOM_BYTES = BOM.encode("utf-8")
+ENCODINGS = ("utf-8", "cp1255", "latin-1")   # latin-1 מפענח הכול — מוצא אחרון
+DELIMITERS = ",;\t|"
+
+
+def _clean_columns(df: pd.DataFrame) -> pd.DataFrame:
+    df.columns = [str(c).replace(BOM, "").strip() for c in df.columns]
+    return df
+
+
+def sniff_csv(head: bytes) -> dict:
+    """``read_csv`` options (encoding, sep) detected from the first block of a file, in one pass."""
+    if head.startswith(BOM_BYTES):
+        encoding, body = "utf-8-sig", head[len(BOM_BYTES):]
+    else:
+        # הבלוק עשוי להיחתך באמצע תו רב-בתי — בודקים רק עד סוף השורה השלמה האחרונה
+        cut = head.rfind(b"\n")
+        body = head[:cut + 1] if cut > 0 else head
+        encoding = next(enc for enc in ENCODINGS if _decodes(body, enc))
+    first_line = body.split(b"\n", 1)[0].decode(encoding.replace("-sig", ""), errors="replace")
+    counts = {d: first_line.count(d) for d in DELIMITERS}
+    sep = max(counts, key=counts.get) if any(counts.values()) else ","
+    return {"encoding": encoding, "sep": sep}
+
+
+def _decodes(data: bytes, encoding: str) -> bool:
+    try:
+        data.decode(encoding)
+        return True
+    except UnicodeDecodeError:
+        return False
+
+
+def sniff_csv_file(path: Path) -> dict:
+    with open(path, "rb") as f:
+        return sniff_csv(f.read(SNIFF_BYTES))
+
+
+def read_csv_sniffed(source, kw: dict, **extra) -> tuple[pd.DataFrame, dict]:
+    """One C-engine parse with the sniffed options.
+
+    Undecodable bytes past the sniffed block are replaced and malformed rows
+    are skipped only as a fallback, and both are logged with a count (the
+    rows themselves can be recovered with ``python tools/repair_csv.py``).
+    Returns the frame and the options that parsed it.
+    """
+    kw = dict(kw)
+    for _ in range(3):
+        try:
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter("always", pd.errors.ParserWarning)
+                df = pd.read_csv(source, **kw, **extra)
+            skipped = sum(str(w.message).count("Skipping line") for w in caught
+                          if issubclass(w.category, pd.errors.ParserWarning))
+            if skipped:
+                logger.warning("%s: %d malformed row(s) skipped (see tools/repair_csv.py)",
+                               getattr(source, "name", "upload"), skipped)
+            return _clean_columns(df), kw
+        except pd.errors.EmptyDataError:
+            return pd.DataFrame(), kw
+        except UnicodeDecodeError:
+            logger.warning("%s: bytes not valid %s, replaced", getattr(source, "name", source), kw["encoding"])
+            kw["encoding_errors"] = "replace"
+        except pd.errors.ParserError:
+            kw["on_bad_lines"] = "warn"
+        if hasattr(source, "seek"):
+            source.seek(0)
+    raise pd.errors.ParserError(f"cannot parse {getattr(source, 'name', source)}")
+
+
+def load_csv_safely(path: Path, preferred: dict | None = None, **extra) -> tuple[pd.DataFrame, dict | None]:
+    """Parse ``path`` with ``preferred`` options, or with options sniffed from its first block.
+
+    ``extra`` is passed to ``read_csv`` (e.g. ``dtype=str``). Returns the
+    frame and the read options used (None if the file is missing).
+    """
+    if not path.exists():
+        return pd.DataFrame(), None
+    with timings.span("csv.read"):
+        return read_csv_sniffed(path, preferred or sniff_csv_file(path), **extra)
+
+
+@dataclass
+class _CacheEntry:
+    dev: int
+    ino: int
+    size: int
+    mtime_ns: int
+    head: str
+    df: pd.DataFrame
+    read_kw: dict | None
+
+
+_cache: dict[str, _CacheEntry] = {}
+_cache_lock = threading.Lock()
+
+
+def _head_digest(path: Path, size: int) -> str:
+    with open(path, "rb") as f:
+        return hashlib.blake2b(f.read(min(size, _HEAD_BYTES)), digest_size=16).hexdigest()
+
+
+def _read_tail(path: Path, entry: _CacheEntry, new_size: int, **extra) -> pd.DataFrame | None:
+    """Parse only the bytes appended since ``entry`` was cached, or None if unsafe."""
+    with open(path, "rb") as f:
+        f.seek(entry.size - 1)
+        if f.read(1) != b"\n":
+            return None
+        tail = f.read(new_size - entry.size)
+    kw = dict(entry.read_kw or {"encoding": "utf-8"})
+    encoding = kw.pop("encoding", "utf-8")
+    text = tail.decode(encoding.replace("-sig", ""), errors=kw.pop("encoding_errors", "strict"))
+    return pd.read_csv(StringIO(text), header=None, names=list(entry.df.columns), **kw, **extra)
+
+
+def file_version(path: Path) -> tuple | None:
+    """Identity of the file's current contents, usable as a cache key."""
+    try:
+        st_ = path.stat()
+    except FileNotFoundError:
+        return None
+    return (st_.st_dev, st_.st_ino, st_.st_size, st_.st_mtime_ns)
+
+
+def load_csv_cached(path: Path, dtypes: dict | None = None) -> pd.DataFrame:
+    """Shared, process-wide cached loader.
+
+    Unchanged files are served from memory; files that only grew are
+    extended by parsing the appended tail. The returned frame is shared
+    between sessions and must be treated as read-only. With ``dtypes``
+    every column is read as text and then typed by ``apply_dtypes``.
+    """
+    key = str(Path(path).resolve()) + ("|typed" if dtypes is not None else "")
+    extra = {"dtype": read_dtypes(dtypes), "keep_default_na": False} if dtypes is not None else {}
+    try:
+        st_ = path.stat()
+    except FileNotFoundError:
+        with _cache_lock:
+            _cache.pop(key, None)
+        return pd.DataFrame()
+
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry and (entry.dev, entry.ino, entry.size, entry.mtime_ns) == (
+            st_.st_dev, st_.st_ino, st_.st_size, st_.st_mtime_ns
+        ):
+            return entry.df
+
+        head = _head_digest(path, st_.st_size)
+        df = None
+        if (entry and not entry.df.empty and (entry.dev, entry.ino) == (st_.st_dev, st_.st_ino)
+                and st_.st_size > entry.size and entry.size >= _HEAD_BYTES and head == entry.head):
+            try:
+                with timings.span("csv.read_tail"):
+                    tail = _read_tail(path, entry, st_.st_size, **extra)
+                if tail is not None:
+                    if dtypes is not None:
+                        tail = apply_dtypes(tail, dtypes, like=entry.df)
+                    df = pd.concat([entry.df, tail], ignore_index=True)
+                    if dtypes is not None:
+                        # עמודה שקיבלה ערך חדש (קטגוריה שלא הייתה) חוזרת מ-concat כטקסט
+                        df = apply_dtypes(df, dtypes)
+            except Exception:
+                df = None
+        read_kw = entry.read_kw if entry else None
+        if df is None:
+            df, read_kw = load_csv_safely(path, preferred=read_kw, **extra)
+            if dtypes is not None:
+                with timings.span("csv.dtypes", rows=len(df)):
+                    df = apply_dtypes(df, dtypes)
+
+        _cache[key] = _CacheEntry(st_.st_dev, st_.st_ino, st_.st_size, st_.st_mtime_ns,
+                                  head, df, read_kw)
+        return df
+
+
+def read_dtypes(dtypes: dict) -> defaultdict:
+    """``read_csv`` ``dtype=`` for ``apply_dtypes``: categoricals straight from the parser, text elsewhere."""
+    return defaultdict(lambda: str, {c: "category" for c, spec in dtypes.items() if not isinstance(spec, str)})
+
+
+def apply_dtypes(df: pd.DataFrame, dtypes: dict, like: pd.DataFrame | None = None) -> pd.DataFrame:
+    """Compact in-memory types for a text frame (``schema.MASTER_DTYPES``), in place.
+
+    A list spec makes a categorical whose categories are the list plus any
+    other value present (empty included), so no value is lost; with ``like``
+    its categories come first, so the frames concatenate as categoricals.
+    A string spec is a nullable integer dtype (anything else becomes <NA>).
+    """
+    for col, spec in dtypes.items():
+        if col not in df.columns:
+            continue
+        s = df[col]
+        if isinstance(spec, str):
+            if s.dtype != spec:
+                num, info = pd.to_numeric(s, errors="coerce"), np.iinfo(spec.lower())
+                df[col] = num.where((num == num.round()) & num.between(info.min, info.max)).astype(spec)
+            continue
+        if not isinstance(s.dtype, pd.CategoricalDtype):
+            s = s.astype("category")
+        if s.hasnans:
+            s = (s.cat.add_categories([""]) if "" not in s.cat.categories else s).fillna("")
+        known = list(spec)
+        if like is not None and col in like.columns and isinstance(like[col].dtype, pd.CategoricalDtype):
+            known = list(like[col].cat.categories)
+        seen = set(known)
+        categories = known + sorted(v for v in s.cat.categories if v not in seen)
+        if list(s.cat.categories) != categories:
+            s = s.cat.set_categories(categories)
+        df[col] = s
+    return df
+
+
+def filter_dates(df: pd.DataFrame, column: str, date_format: str,
+                 start: datetime | None = None, end: datetime | None = None) -> pd.DataFrame:
+    """Rows whose ``column`` (parsed with ``date_format``) falls in [start, end]."""
+    if (start is None and end is None) or column not in df.columns:
+        return df
+    when = pd.to_datetime(df[column], format=date_format, errors="coerce")
+    mask = pd.Series(True, index=df.index)
+    if start is not None:
+        mask &= when >= start
+    if end is not None:
+        mask &= when <= end
+    return df[mask]
+
+
+# =========================
+# אינדקס ת"ז → מיקום השורה העדכנית בקובץ
+# =========================
+class IdIndex:
+    """Maps each ID to the byte range of its latest row in an append-only CSV.
+
+    Built once per process by streaming the file, then extended by scanning
+    only the bytes appended since the last refresh. Records are split on
+    newlines outside quoted fields, so multi-line answers are handled.
+    """
+
+    def __init__(self, path: Path, id_column: str):
+        self.path = path
+        self.id_column = id_column
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._entries: dict[str, tuple[int, int]] = {}
+        self._size = 0
+        self._ino = None
+        self._id_pos: int | None = None
+        self.header: list[str] = []
+
+    def refresh(self) -> None:
+        with self._lock:
+            try:
+                st_ = self.path.stat()
+            except FileNotFoundError:
+                self._reset()
+                return
+            if st_.st_ino != self._ino or st_.st_size < self._size:
+                self._reset()
+                self._ino = st_.st_ino
+            if st_.st_size > self._size:
+                self._scan(st_.st_size)
+
+    def _scan(self, end: int) -> None:
+        with open(self.path, "rb") as f:
+            f.seek(self._size)
+            pos = self._size
+            record, start, quotes = b"", pos, 0
+            while pos < end:
+                line = f.readline()
+                if not line.endswith(b"\n") or pos + len(line) > end:
+                    break   # שורה חלקית — תיסרק בפעם הבאה
+                pos += len(line)
+                record += line
+                quotes += line.count(b'"')
+                if quotes % 2:
+                    continue
+                self._index_record(record, start)
+                record, start, quotes = b"", pos, 0
+            self._size = start
+
+    def _index_record(self, record: bytes, offset: int) -> None:
+        text = record.decode("utf-8", errors="replace")
+        values = next(csv.reader([text.lstrip(BOM).rstrip("\r\n")]), [])
+        if self._id_pos is None:
+            self.header = [c.replace(BOM, "").strip() for c in values]
+            self._id_pos = self.header.index(self.id_column) if self.id_column in self.header else -1
+            return
+        if 0 <= self._id_pos < len(values) and values[self._id_pos].strip():
+            self._entries[values[self._id_pos].strip()] = (offset, len(record))
+
+    def __contains__(self, nat_id: str) -> bool:
+        return str(nat_id).strip() in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, nat_id: str) -> dict | None:
+        """Read the latest row for ``nat_id`` straight from its byte range."""
+        loc = self._entries.get(str(nat_id).strip())
+        if loc is None:
+            return None
+        with open(self.path, "rb") as f:
+            f.seek(loc[0])
+            record = f.read(loc[1]).decode("utf-8", errors="replace")
+        values = next(csv.reader(StringIO(record)), [])
+        return dict(zip(self.header, values))
+
+
+# =========================
+# שכבת אחסון — ממשק אחיד ל-CSV / SQLite
+# =========================
+class StorageBackend(abc.ABC):
+    """Interface used by the submit path and the admin page.
+
+    Rows are plain dicts keyed by ``COLUMNS_ORDER``; frames returned by the
+    ``load_*`` methods are shared and must be treated as read-only. The master
+    holds one row per ID (``upsert_master``); the log keeps every submission.
+    """
+
+    @abc.abstractmethod
+    def append_master(self, rows: list[dict]) -> None: ...
+
+    @abc.abstractmethod
+    def upsert_master(self, rows: list[dict]) -> list[dict | None]: ...
+
+    @abc.abstractmethod
+    def get_by_id(self, nat_id: str) -> dict | None: ...
+
+    @abc.abstractmethod
+    def append_log(self, rows: list[dict]) -> None: ...
+
+    @abc.abstractmethod
+    def load_master(self) -> pd.DataFrame: ...
+
+    @abc.abstractmethod
+    def load_log(self) -> pd.DataFrame: ...
+
+    @abc.abstractmethod
+    def iter_master(self, chunksize: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]: ...
+
+    @abc.abstractmethod
+    def master_version(self): ...
+
+    @abc.abstractmethod
+    def log_version(self): ...
+
+    @abc.abstractmethod
+    def log_row_count(self) -> int: ...
+
+    @abc.abstractmethod
+    def iter_log(self, start: datetime | None = None, end: datetime | None = None,
+                 chunksize: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]: ...
+
+    @abc.abstractmethod
+    def has_id(self, nat_id: str) -> bool: ...
+
+    @abc.abstractmethod
+    def find_by_choice(self, site: str, rank: int) -> pd.DataFrame: ...
+
+    @abc.abstractmethod
+    def write_master_csv(self, path: Path) -> None: ...
+
+    @abc.abstractmethod
+    def compact(self) -> int: ...
+
+
+class CsvBackend(StorageBackend):
+    """Master and log as CSV files.
+
+    With ``log_store`` (a ``logstore.SegmentedLog``) the log goes to rotated,
+    gzip-compressed segments instead of the single ``log_path`` file.
+    """
+
+    def __init__(self, master_path: Path, log_path: Path, columns: list[str],
+                 id_column: str, rank_columns: list[str], log_store=None,
+                 date_column: str = "", date_format: str = "", dtypes: dict | None = None):
+        self.master_path = master_path
+        self.log_path = log_path
+        self.columns = columns
+        self.id_column = id_column
+        self.rank_columns = rank_columns
+        self.log_store = log_store
+        self.date_column = date_column
+        self.date_format = date_format
+        self.dtypes = dtypes
+        self.index = IdIndex(master_path, id_column)
+        self._master_view: tuple | None = None
+        self._log_view: tuple | None = None
+
+    def append_master(self, rows: list[dict]) -> None:
+        append_csv_rows(self.master_path, rows, self.columns)
+
+    def upsert_master(self, rows: list[dict]) -> list[dict | None]:
+        """Append rows and return, per row, the submission it replaced (or None).
+
+        The file stays append-only; superseded rows are hidden by
+        ``load_master`` and physically removed by ``compact``.
+        """
+        self.index.refresh()
+        previous, batch = [], {}
+        for r in rows:
+            key = str(r.get(self.id_column, "")).strip()
+            previous.append(batch.get(key) or self.index.get(key))
+            batch[key] = r
+        append_csv_rows(self.master_path, rows, self.columns)
+        self.index.refresh()
+        return previous
+
+    def get_by_id(self, nat_id: str) -> dict | None:
+        self.index.refresh()
+        return self.index.get(nat_id)
+
+    def append_log(self, rows: list[dict]) -> None:
+        if self.log_store is not None:
+            self.log_store.append(rows)
+        else:
+            append_csv_rows(self.log_path, rows, self.columns)
+
+    def load_master(self) -> pd.DataFrame:
+        version = self.master_version()
+        if self._master_view and self._master_view[0] == version:
+            return self._master_view[1]
+        df = load_csv_cached(self.master_path, self.dtypes)
+        if not df.empty and self.id_column in df.columns:
+            latest = ~df[self.id_column].astype(str).str.strip().duplicated(keep="last")
+            if not latest.all():
+                df = df[latest].reset_index(drop=True)
+        self._master_view = (version, df)
+        return df
+
+    def iter_master(self, chunksize: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+        """The master (latest row per ID) as text chunks, without loading the whole file."""
+        if not self.master_path.exists() or not self.master_path.stat().st_size:
+            return
+        kw = dict(sniff_csv_file(self.master_path), dtype=str, keep_default_na=False)
+        # מעבר ראשון על עמודת הת"ז בלבד — אילו שורות הוחלפו בשליחה מאוחרת יותר
+        try:
+            ids = pd.read_csv(self.master_path, usecols=lambda c: str(c).replace(BOM, "").strip() == self.id_column,
+                              **kw).squeeze("columns")
+        except pd.errors.EmptyDataError:
+            return
+        latest = None if isinstance(ids, pd.DataFrame) else ~ids.str.strip().duplicated(keep="last").to_numpy()
+        start = 0
+        for chunk in pd.read_csv(self.master_path, chunksize=chunksize, **kw):
+            chunk, stop = _clean_columns(chunk), start + len(chunk)
+            if latest is not None:
+                chunk = chunk[latest[start:stop]]
+            start = stop
+            if not chunk.empty:
+                yield chunk.reset_index(drop=True)
+
+    def load_log(self) -> pd.DataFrame:
+        if self.log_store is None:
+            return load_csv_cached(self.log_path)
+        version = self.log_version()
+        if self._log_view and self._log_view[0] == version:
+            return self._log_view[1]
+        df = self.log_store.read_all()
+        self._log_view = (version, df)
+        return df
+
+    def log_row_count(self) -> int:
+        if self.log_store is not None:
+            return self.log_store.row_count()
+        return len(self.load_log())
+
+    def iter_log(self, start: datetime | None = None, end: datetime | None = None,
+                 chunksize: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+        if self.log_store is not None:
+            yield from self.log_store.iter_chunks(start, end, chunksize)
+            return
+        if not self.log_path.exists() or not self.log_path.stat().st_size:
+            return
+        for chunk in pd.read_csv(self.log_path, encoding="utf-8-sig", dtype=str,
+                                 keep_default_na=False, chunksize=chunksize):
+            chunk = filter_dates(_clean_columns(chunk), self.date_column, self.date_format, start, end)
+            if not chunk.empty:
+                yield chunk
+
+    def master_version(self):
+        return file_version(self.master_path)
+
+    def log_version(self):
+        if self.log_store is not None:
+            return self.log_store.version()
+        return file_version(self.log_path)
+
+    def has_id(self, nat_id: str) -> bool:
+        self.index.refresh()
+        return nat_id in self.index
+
+    def find_by_choice(self, site: str, rank: int) -> pd.DataFrame:
+        df = self.load_master()
+        col = self.rank_columns[rank - 1]
+        if df.empty or col not in df.columns:
+            return df
+        return df[df[col] == site]
+
+    def write_master_csv(self, path: Path) -> None:
+        if self.master_path.exists():
+            with timings.span("csv.copy"):
+                shutil.copyfile(self.master_path, path)
+        else:
+            path.write_text(BOM + _format_line(self.columns), encoding="utf-8")
+
+    def compact(self) -> int:
+        return compact_csv(self.master_path, self.columns, key=self.id_column)
+
+
+# =========================
+# נעילת קובץ בין תהליכים
+# =========================
+try:
+    import fcntl
+
+    def _lock_fd(fd: int, blocking: bool) -> None:
+        fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+
+    def _unlock_fd(fd: int) -> None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+except ImportError:  # Windows
+    import msvcrt
+
+    def _lock_fd(fd: int, blocking: bool) -> None:
+        msvcrt.locking(fd, msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+
+    def _unlock_fd(fd: int) -> None:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+class FileLock:
+    """Exclusive OS lock on ``path``, re-entrant within a thread, shared by threads of a process."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._thread_lock = threading.RLock()
+        self._fd: int | None = None
+        self._depth = 0
+
+    def acquire(self, blocking: bool = True) -> bool:
+        if not self._thread_lock.acquire(blocking):
+            return False
+        if self._depth == 0:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                _lock_fd(fd, blocking)
+            except OSError:
+                os.close(fd)
+                self._thread_lock.release()
+                return False
+            self._fd = fd
+        self._depth += 1
+        return True
+
+    def release(self) -> None:
+        self._depth -= 1
+        if self._depth == 0:
+            _unlock_fd(self._fd)
+            os.close(self._fd)
+            self._fd = None
+        self._thread_lock.release()
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
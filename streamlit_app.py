@@ -1,27 +1,41 @@
 # streamlit_app.py
 # -*- coding: utf-8 -*-
-import csv
-import re
-from io import BytesIO
+import os
 from pathlib import Path
 from datetime import datetime
 import pytz
 import streamlit as st
 import pandas as pd
 
-# --- Google Sheets
-import gspread
-from google.oauth2.service_account import Credentials
-from gspread_formatting import (
-    CellFormat, Color, TextFormat,
-    ConditionalFormatRule, BooleanRule, BooleanCondition,
-    GridRange, format_cell_range, get_conditional_format_rules
-)
+from analytics import DemandStats
+from backups import BackupStore
+from exports import (EXPORT_FORMATS, XLSX_MIME, available_formats, export_bytes, export_cache, export_file,
+                     rosters_excel_bytes, site_rosters)
+from importer import accepted_types, apply_mapping, plan_import, read_upload, suggest_mapping
+from logstore import MAX_SEGMENT_BYTES, SegmentedLog, page
+from master_index import PAGE_SIZE, IndexCache, text_mask
+from matching import default_capacities, match_students
+from partitions import Partition, PartitionManifest
+from schema import (ADJUSTMENTS, COHORT, COLUMNS_ORDER, DATE_COLUMN, DATE_FORMAT, DOMAINS, EXTRA_LANGUAGES, GENDERS, ID_COLUMN, LIKERT,
+                    MASTER_DTYPES, MOTHER_TONGUES, OTHER, PREV_TRAINING, RANK_COLUMNS, RANK_COUNT, SITES,
+                    SOCIAL_AFFILIATIONS, STUDY_YEARS, TRACKS)
+from sheets_sync import FakeWorksheet, Outbox, SheetsConnection, SheetsWriter, apply_style
+from storage import CsvBackend, FileLock, StorageBackend
+from timing import timings
+from validation import audit_summary, invalid_rows, validate_frame, validate_row
+from writer import SUBMIT_TOKEN_TTL, SubmissionStore, form_token, lock_for
+
 # =========================
 # הגדרות כלליות
 # =========================
-st.set_page_config(page_title="שאלון לסטודנטים – תשפ״ו", layout="centered")
-st.markdown("""
+st.set_page_config(page_title=f"שאלון לסטודנטים – {COHORT}", layout="centered")
+
+# עיצוב + פונטים בבלוק אחד (מוזרק פעם אחת בכל ריצה מלאה; ריצות fragment לא מזריקות אותו שוב)
+APP_CSS = """
+<link rel="preconnect" href="https://fonts.googleapis.com">
+<link rel="preconnect" href="https://fonts.gstatic.com" crossorigin>
+<link href="https://fonts.googleapis.com/css2?family=Assistant:wght@300;400;600;700&family=Noto+Sans+Hebrew:wght@400;600&display=swap" rel="stylesheet">
+
 <style>
 :root{
   --ink:#0f172a; 
@@ -48,14 +62,7 @@ html, body, [class*="css"] { font-family: system-ui, "Segoe UI", Arial; }
 [data-testid="stWidgetLabel"] p{ text-align:right; margin-bottom:.25rem; color:var(--muted); }
 [data-testid="stWidgetLabel"] p::after{ content: " :"; }
 input, textarea, select{ direction:rtl; text-align:right; }
-</style>
-""", unsafe_allow_html=True)
-st.markdown("""
-<link rel="preconnect" href="https://fonts.googleapis.com">
-<link rel="preconnect" href="https://fonts.gstatic.com" crossorigin>
-<link href="https://fonts.googleapis.com/css2?family=Assistant:wght@300;400;600;700&family=Noto+Sans+Hebrew:wght@400;600&display=swap" rel="stylesheet">
 
-<style>
 :root { --app-font: 'Assistant', 'Noto Sans Hebrew', 'Segoe UI', -apple-system, sans-serif; }
 
 /* בסיס האפליקציה */
@@ -90,18 +97,90 @@ h1, h2, h3, h4, h5, h6 {
   font-family: var(--app-font) !important;
 }
 </style>
-""", unsafe_allow_html=True)
+"""
+st.markdown(APP_CSS, unsafe_allow_html=True)
 # =========================
 # נתיבים/סודות + התמדה ארוכת טווח
 # =========================
-DATA_DIR   = Path("data")
-BACKUP_DIR = DATA_DIR / "backups"
+DATA_DIR   = Path(os.environ.get("STUDENTS_DATA_DIR", "data"))
 DATA_DIR.mkdir(parents=True, exist_ok=True)
-BACKUP_DIR.mkdir(parents=True, exist_ok=True)
 
-CSV_FILE      = DATA_DIR / "שאלון_שיבוץ.csv"
-CSV_LOG_FILE  = DATA_DIR / "שאלון_שיבוץ_log.csv"
+MASTER_NAME   = "שאלון_שיבוץ.csv"
+LOG_NAME      = "שאלון_שיבוץ_log.csv"   # יומן ישן בקובץ יחיד — מאומץ פעם אחת לתיקיית log/
+DB_NAME       = "שאלון_שיבוץ.sqlite3"
+LOG_PAGE_SIZE = 200
+STORAGE_BACKEND = st.secrets.get("STORAGE_BACKEND", "csv")   # "csv" / "sqlite"
 ADMIN_PASSWORD = st.secrets.get("ADMIN_PASSWORD", "rawan_0304")
+COHORT_NAME = st.secrets.get("COHORT", COHORT)
+
+@st.cache_resource
+def get_write_lock() -> FileLock:
+    return lock_for(DATA_DIR)
+
+@st.cache_resource
+def get_partitions() -> PartitionManifest:
+    manifest = PartitionManifest(DATA_DIR, legacy_files=(MASTER_NAME, LOG_NAME, "log", DB_NAME))
+    with get_write_lock():
+        manifest.ensure_active(COHORT_NAME, COLUMNS_ORDER, ID_COLUMN)
+    return manifest
+
+# מחיצת המחזור/גרסת הטופס הנוכחיים — כל הכתיבות והשאילתות השוטפות
+ACTIVE = get_partitions().active
+PART_DIR   = get_partitions().dir_of(ACTIVE)
+BACKUP_DIR = PART_DIR / "backups"
+BACKUP_DIR.mkdir(parents=True, exist_ok=True)
+
+def open_storage(partition: Partition) -> StorageBackend:
+    part_dir = get_partitions().dir_of(partition)
+    if STORAGE_BACKEND == "sqlite":
+        from sqlite_store import SqliteBackend
+        return SqliteBackend(part_dir / DB_NAME, columns=partition.columns)
+    log_store = SegmentedLog(part_dir / "log", partition.columns,
+                             max_bytes=int(st.secrets.get("LOG_SEGMENT_BYTES", MAX_SEGMENT_BYTES)),
+                             max_age_days=st.secrets.get("LOG_SEGMENT_DAYS"))
+    with get_write_lock():
+        log_store.adopt(part_dir / LOG_NAME)
+    return CsvBackend(part_dir / MASTER_NAME, part_dir / LOG_NAME, partition.columns, ID_COLUMN, RANK_COLUMNS,
+                      log_store=log_store, date_column=DATE_COLUMN, date_format=DATE_FORMAT,
+                      dtypes=MASTER_DTYPES)
+
+@st.cache_resource
+def get_storage() -> StorageBackend:
+    return open_storage(ACTIVE)
+
+@st.cache_resource(max_entries=4)
+def get_archived_storage(name: str) -> StorageBackend:
+    """Read-only view of an older partition (opened only when the admin selects it)."""
+    return open_storage(get_partitions().get(name))
+
+@st.cache_resource
+def get_master_index(partition: str) -> IndexCache:
+    return IndexCache()
+
+def open_demand_stats(partition: Partition, storage: StorageBackend) -> DemandStats:
+    stats = DemandStats(get_partitions().dir_of(partition) / "stats.json")
+    if not stats.ready:
+        stats.rebuild(storage.load_master(), storage.load_log())
+    return stats
+
+@st.cache_resource
+def get_demand_stats() -> DemandStats:
+    return open_demand_stats(ACTIVE, get_storage())
+
+@st.cache_resource(max_entries=4)
+def get_archived_demand_stats(name: str) -> DemandStats:
+    """Counters of an older partition (its own stats.json, rebuilt from its files if missing)."""
+    return open_demand_stats(get_partitions().get(name), get_archived_storage(name))
+
+@st.cache_resource
+def get_backup_store() -> BackupStore:
+    store = BackupStore(
+        BACKUP_DIR,
+        snapshot_every=int(st.secrets.get("BACKUP_SNAPSHOT_EVERY", 500)),
+        keep_snapshots=int(st.secrets.get("BACKUP_KEEP_SNAPSHOTS", 5)),
+    )
+    store.ensure_initialized(get_storage().write_master_csv)
+    return store
 
 query_params = st.query_params
 is_admin_mode = query_params.get("admin", ["0"])[0] == "1"
@@ -109,159 +188,120 @@ is_admin_mode = query_params.get("admin", ["0"])[0] == "1"
 # =========================
 # Google Sheets הגדרות
 # =========================
-SHEET_ID = st.secrets["sheets"]["spreadsheet_id"]
-
-scope = [
+SHEETS_SCOPE = [
     "https://www.googleapis.com/auth/spreadsheets",
     "https://www.googleapis.com/auth/drive"
 ]
+SHEETS_BACKEND = st.secrets.get("SHEETS_BACKEND", "google")   # "google" / "fake" (מדידות ובדיקות)
+
+@st.cache_resource
+def get_sheets_connection() -> SheetsConnection:
+    if SHEETS_BACKEND == "fake":
+        ws = FakeWorksheet(latency=float(st.secrets.get("SHEETS_FAKE_LATENCY", 0.0)))
+        return SheetsConnection(lambda: ws)
+
+    # הסודות, ההתחברות והייבוא הכבד של gspread — רק בשימוש הראשון (מה-worker).
+    # סודות חסרים/שגויים רק משביתים את הסנכרון: השורות נשמרות מקומית ונשארות בתור.
+    def open_worksheet():
+        import gspread
+        from google.oauth2.service_account import Credentials
+        creds_dict = dict(st.secrets["gcp_service_account"])
+        sheet_id = st.secrets["sheets"]["spreadsheet_id"]
+        creds = Credentials.from_service_account_info(creds_dict, scopes=SHEETS_SCOPE)
+        sh = gspread.authorize(creds).open_by_key(sheet_id)
+        if ACTIVE.worksheet is None:
+            return sh.sheet1
+        # לכל מחיצה גיליון משלה — שינוי עמודות לא מוחק את הגיליון הקודם
+        try:
+            return sh.worksheet(ACTIVE.worksheet)
+        except gspread.WorksheetNotFound:
+            return sh.add_worksheet(ACTIVE.worksheet, rows=1000, cols=len(COLUMNS_ORDER))
 
-try:
-    creds_dict = st.secrets["gcp_service_account"]
-    creds = Credentials.from_service_account_info(creds_dict, scopes=scope)
-    gclient = gspread.authorize(creds)
-    sheet = gclient.open_by_key(SHEET_ID).sheet1
-except Exception as e:
-    sheet = None
-    st.error(f"⚠ לא ניתן להתחבר ל־Google Sheets: {e}")
-
-# =========================
-# עמודות קבועות
-# =========================
-SITES = [
-    "כפר הילדים חורפיש",
-    "אנוש כרמיאל",
-    "הפוך על הפוך צפת",
-    "שירות מבחן לנוער עכו",
-    "כלא חרמון",
-    "בית חולים זיו",
-    "שירותי רווחה קריית שמונה",
-    "מרכז יום לגיל השלישי",
-    "מועדונית נוער בצפת",
-    "מרפאת בריאות הנפש צפת",
-]
-RANK_COUNT = 3
-
-COLUMNS_ORDER = [
-    "תאריך שליחה", "שם פרטי", "שם משפחה", "תעודת זהות", "מין", "שיוך חברתי",
-    "שפת אם", "שפות נוספות", "טלפון", "כתובת", "אימייל",
-    "שנת לימודים", "מסלול לימודים",
-    "הכשרה קודמת", "הכשרה קודמת מקום ותחום",
-    "הכשרה קודמת מדריך ומיקום", "הכשרה קודמת בן זוג",
-    "תחומים מועדפים", "תחום מוביל", "בקשה מיוחדת",
-    "ממוצע", "התאמות", "התאמות פרטים",
-    "מוטיבציה 1", "מוטיבציה 2", "מוטיבציה 3",
-] + [f"מקום הכשרה {i}" for i in range(1, RANK_COUNT+1)] + [f"דירוג_{s}" for s in SITES] + [
-    "אישור הגעה להכשרה"
-]
+    return SheetsConnection(open_worksheet)
 
 # =========================
 # פונקציה לעיצוב Google Sheets
 # =========================
 
 def style_google_sheet(ws):
-    """Apply styling to the Google Sheet."""
-    
-    # --- עיצוב כותרות (שורה 1) ---
-    header_fmt = CellFormat(
-        backgroundColor=Color(0.6, 0.4, 0.8),   # סגול בהיר
-        textFormat=TextFormat(bold=True, foregroundColor=Color(1, 1, 1)),  # טקסט לבן מודגש
-        horizontalAlignment='CENTER'
-    )
-    format_cell_range(ws, "1:1", header_fmt)
-
-    # --- צבעי רקע מתחלפים (פסי זברה) ---
-    rule = ConditionalFormatRule(
-        ranges=[GridRange.from_a1_range('A2:Z1000', ws)],
-        booleanRule=BooleanRule(
-            condition=BooleanCondition('CUSTOM_FORMULA', ['=ISEVEN(ROW())']),
-            format=CellFormat(backgroundColor=Color(0.95, 0.95, 0.95))  # אפור בהיר
-        )
-    )
-    rules = get_conditional_format_rules(ws)
-    rules.clear()
-    rules.append(rule)
-    rules.save()
-
-    # --- עיצוב עמודת ת"ז (C) ---
-    id_fmt = CellFormat(
-        horizontalAlignment='CENTER',
-        backgroundColor=Color(0.9, 0.9, 0.9)  # אפור עדין
+    """Apply styling to the Google Sheet (one batch_update; ID column located by name)."""
+    apply_style(ws, COLUMNS_ORDER, ID_COLUMN)
+
+# =========================
+# סנכרון Google Sheets ברקע (תור מקומי עמיד)
+# =========================
+@st.cache_resource
+def get_sheets_writer() -> SheetsWriter:
+    connection = get_sheets_connection()
+    writer = SheetsWriter(
+        Outbox(PART_DIR / "sheets_outbox.jsonl", lock=get_write_lock()),
+        get_worksheet=connection.worksheet,
+        columns=COLUMNS_ORDER,
+        on_header_written=style_google_sheet,
+        on_failure=connection.invalidate,
+        interval=float(st.secrets.get("SHEETS_FLUSH_INTERVAL", 2.0)),
     )
-    format_cell_range(ws, "C2:C1000", id_fmt)
+    return writer.start()
+
 # =========================
 # פונקציה לשמירה (כולל עיצוב)
 # =========================
-def save_master_dataframe(new_row: dict) -> None:
-    # --- שמירה מקומית ---
-    df_master = pd.DataFrame([new_row])
-    if CSV_FILE.exists():
-        df_master = pd.concat([pd.read_csv(CSV_FILE), df_master], ignore_index=True)
-    df_master.to_csv(CSV_FILE, index=False, encoding="utf-8-sig")
-
-    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-    backup_path = BACKUP_DIR / f"שאלון_שיבוץ_{ts}.csv"
-    df_master.to_csv(backup_path, index=False, encoding="utf-8-sig")
-
-    # --- שמירה ל־ Google Sheets ---
-    if sheet:
-        try:
-            headers = sheet.row_values(1)
-            if not headers or headers != COLUMNS_ORDER:
-                sheet.clear()
-                sheet.append_row(COLUMNS_ORDER, value_input_option="USER_ENTERED")
-                style_google_sheet(sheet)   # <<< עיצוב אוטומטי אחרי כותרות
+@st.cache_resource
+def get_submission_store() -> SubmissionStore:
+    return SubmissionStore(get_storage(), get_backup_store(), get_demand_stats(),
+                           get_sheets_writer(), COLUMNS_ORDER, get_write_lock(),
+                           submit_ttl=float(st.secrets.get("SUBMIT_TOKEN_TTL", SUBMIT_TOKEN_TTL)))
 
-            row_values = [new_row.get(col, "") for col in COLUMNS_ORDER]
-            sheet.append_row(row_values, value_input_option="USER_ENTERED")
 
-        except Exception as e:
-            st.error(f"❌ לא ניתן לשמור ב־Google Sheets: {e}")
+def save_master_dataframe(new_row: dict) -> dict | None:
+    """Save a submission; returns the earlier submission with the same ID it replaced."""
+    # כל הכתיבות עוברות דרך כותב יחיד (thread + תור) תחת נעילת קובץ
+    return get_submission_store().save_master_dataframe(new_row)
 
 
 def append_to_log(row_df: pd.DataFrame) -> None:
-    file_exists = CSV_LOG_FILE.exists()
-    row_df.to_csv(CSV_LOG_FILE, mode="a", header=not file_exists,
-                  index=False, encoding="utf-8-sig",
-                  quoting=csv.QUOTE_MINIMAL, escapechar="\\", lineterminator="\n")
-  # =========================
+    get_submission_store().append_to_log(row_df)
+
+
+def save_submission(row: dict, token: str) -> tuple[dict | None, bool]:
+    """Master + log, once per (form session token, content); a repeat returns the earlier result."""
+    return get_submission_store().save_submission(row, token)
+
+# =========================
 # פונקציות עזר
 # =========================
-def load_csv_safely(path: Path) -> pd.DataFrame:
-    if not path.exists():
-        return pd.DataFrame()
-    attempts = [
-        dict(encoding="utf-8-sig"),
-        dict(encoding="utf-8"),
-        dict(encoding="utf-8-sig", engine="python", on_bad_lines="skip"),
-        dict(encoding="utf-8", engine="python", on_bad_lines="skip"),
-        dict(encoding="latin-1", engine="python", on_bad_lines="skip"),
-    ]
-    for kw in attempts:
-        try:
-            df = pd.read_csv(path, **kw)
-            df.columns = [c.replace("\ufeff", "").strip() for c in df.columns]
-            return df
-        except Exception:
-            continue
-    return pd.DataFrame()
-
-def df_to_excel_bytes(df: pd.DataFrame, sheet: str = "Sheet1") -> bytes:
-    bio = BytesIO()
-    with pd.ExcelWriter(bio, engine="xlsxwriter") as w:
-        df.to_excel(w, sheet_name=sheet, index=False)
-        ws = w.sheets[sheet]
-        for i, col in enumerate(df.columns):
-            width = 12
-            if not df.empty:
-                width = min(60, max(12, int(df[col].astype(str).map(len).max()) + 4))
-            ws.set_column(i, i, width)
-    bio.seek(0)
-    return bio.read()
-
-def valid_email(v: str) -> bool:  return bool(re.match(r"^[^@]+@[^@]+\.[^@]+$", v.strip()))
-def valid_phone(v: str) -> bool:  return bool(re.match(r"^0\d{1,2}-?\d{6,7}$", v.strip()))
-def valid_id(v: str) -> bool:     return bool(re.match(r"^\d{8,9}$", v.strip()))
+def export_controls(chunks, partition: Partition, name: str, label: str, sheet: str, version) -> None:
+    """Generate an export only when asked; reuse it while the data version is unchanged.
+
+    ``chunks`` returns an iterator of frames and is only called when a new file is
+    built; the rows are streamed to a temporary file, read back only on download.
+    The file has ``partition``'s own column set (older form versions differ).
+    """
+    c1, c2 = st.columns([1, 2])
+    fmt = c1.selectbox("פורמט", available_formats(), key=f"export_fmt_{name}")
+    key = (partition.name, name, fmt, version)
+    if c2.button(f"⚙ הכנת קובץ להורדה – {label}", key=f"export_btn_{name}"):
+        export_cache.get_or_build(key, lambda: export_file(chunks(), partition.columns, fmt, sheet=sheet))
+        st.session_state[f"export_ready_{name}"] = key
+    path = export_cache.get(key) if st.session_state.get(f"export_ready_{name}") == key else None
+    if path is not None:
+        ext, mime = EXPORT_FORMATS[fmt]
+        st.download_button(
+            f"⬇ הורד {fmt} – {label}",
+            data=path.read_bytes,   # נקרא מהדיסק רק בלחיצה
+            file_name=f"שאלון_שיבוץ_{name}{ext}",
+            mime=mime,
+            key=f"export_dl_{name}"
+        )
+
+def paged_dataframe(df: pd.DataFrame, key: str) -> None:
+    """Show ``df`` one ``PAGE_SIZE`` page at a time — only the page is sent to the browser."""
+    pages = max(1, -(-len(df) // PAGE_SIZE))
+    page_no = 1
+    if pages > 1:
+        page_no = min(st.number_input("עמוד", min_value=1, value=1, step=1, key=key), pages)
+    st.caption(f"{len(df)} שורות · עמוד {page_no} מתוך {pages}")
+    st.dataframe(df.iloc[(page_no - 1) * PAGE_SIZE:page_no * PAGE_SIZE], use_container_width=True)
 
 def show_errors(errors: list[str]):
     if not errors: return
@@ -278,33 +318,280 @@ if is_admin_mode:
     if pwd == ADMIN_PASSWORD:
         st.success("התחברת בהצלחה ✅")
 
-        df_master = load_csv_safely(CSV_FILE)
-        df_log    = load_csv_safely(CSV_LOG_FILE)
+        # מחיצות קודמות (מחזורים / גרסאות טופס) נפתחות לקריאה רק כשנבחרות
+        view = ACTIVE.name
+        if len(get_partitions().partitions) > 1:
+            view = st.selectbox("מחזור / גרסת טופס", [p.name for p in reversed(get_partitions().partitions)],
+                                key="admin_partition",
+                                format_func=lambda n: f"{n} (פעילה)" if n == ACTIVE.name else f"{n} (ארכיון, קריאה בלבד)")
+        archived = view != ACTIVE.name
+        partition = get_partitions().get(view)
+        storage = get_archived_storage(view) if archived else get_storage()
+        with timings.span("admin.load_master"):
+            df_master = storage.load_master()
 
         st.subheader("📦 קובץ ראשי (מאסטר)")
+        if not archived and not df_master.empty and st.button("🧹 דחיסת קובץ ראשי (הסרת הגשות שהוחלפו וכתיבה מחדש)"):
+            n = get_submission_store().compact()
+            st.success(f"הקובץ הראשי נדחס ({n} שורות).")
+            df_master = storage.load_master()
         if not df_master.empty:
-            st.dataframe(df_master, use_container_width=True)
-            st.download_button(
-                "⬇ הורד Excel – קובץ ראשי",
-                data=df_to_excel_bytes(df_master, sheet="Master"),
-                file_name="שאלון_שיבוץ_master.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            # סינון ועימוד בצד השרת — לדפדפן נשלח רק העמוד המוצג
+            index = get_master_index(view).get(storage.master_version(), storage.load_master)
+            f1, f2, f3 = st.columns(3)
+            m_text = f1.text_input("שם / ת״ז (תחילית)", key="admin_m_text")
+            m_site = f2.selectbox("מוסד", ["הכל"] + SITES, key="admin_m_site")
+            m_rank = f3.selectbox("במקום", ["כל מקום"] + list(range(1, RANK_COUNT + 1)), key="admin_m_rank")
+            f4, f5, f6, f7 = st.columns(4)
+            m_domain = f4.selectbox("תחום", ["הכל"] + DOMAINS, key="admin_m_domain")
+            m_from = f5.date_input("מתאריך", value=None, key="admin_m_from", format="DD/MM/YYYY")
+            m_to = f6.date_input("עד תאריך", value=None, key="admin_m_to", format="DD/MM/YYYY")
+            m_page = f7.number_input("עמוד", min_value=1, value=1, step=1, key="admin_m_page")
+            positions = index.query(
+                m_text,
+                site=None if m_site == "הכל" else m_site,
+                rank=None if m_rank == "כל מקום" else m_rank,
+                domain=None if m_domain == "הכל" else m_domain,
+                start=datetime.combine(m_from, datetime.min.time()) if m_from else None,
+                end=datetime.combine(m_to, datetime.max.time()) if m_to else None,
             )
+            pages = max(1, -(-len(positions) // PAGE_SIZE))
+            m_page = min(m_page, pages)
+            st.caption(f"{len(positions)} מתוך {index.n} שורות · עמוד {m_page} מתוך {pages}")
+            st.dataframe(index.page(positions, m_page), use_container_width=True)
+            export_controls(storage.iter_master, partition, "master", "קובץ ראשי", "Master", storage.master_version())
         else:
             st.info("אין עדיין נתונים בקובץ הראשי.")
 
         st.subheader("🧾 קובץ יומן (Append-Only)")
-        if not df_log.empty:
-            st.dataframe(df_log, use_container_width=True)
-            st.download_button(
-                "⬇ הורד Excel – קובץ יומן",
-                data=df_to_excel_bytes(df_log, sheet="Log"),
-                file_name="שאלון_שיבוץ_log.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
+        log_total = storage.log_row_count()
+        if log_total:
+            # עימוד וסינון תאריכים בזרימה — רק המקטעים הרלוונטיים נקראים
+            c0, c1, c2, c3 = st.columns(4)
+            log_text = c0.text_input("שם / ת״ז (תחילית)", key="admin_log_text")
+            log_from = c1.date_input("מתאריך", value=None, key="admin_log_from", format="DD/MM/YYYY")
+            log_to = c2.date_input("עד תאריך", value=None, key="admin_log_to", format="DD/MM/YYYY")
+            log_page = c3.number_input("עמוד", min_value=1, value=1, step=1, key="admin_log_page")
+            start = datetime.combine(log_from, datetime.min.time()) if log_from else None
+            end = datetime.combine(log_to, datetime.max.time()) if log_to else None
+
+            def log_chunks():
+                for chunk in storage.iter_log(start, end):
+                    yield chunk[text_mask(chunk, log_text)] if log_text.strip() else chunk
+
+            with timings.span("admin.load_log"):
+                df_log = page(log_chunks(), (log_page - 1) * LOG_PAGE_SIZE, LOG_PAGE_SIZE + 1)
+            more = len(df_log) > LOG_PAGE_SIZE
+            st.caption(f"{log_total} שורות ביומן · עמוד {log_page} · {min(len(df_log), LOG_PAGE_SIZE)} שורות"
+                       + (" · יש עמודים נוספים" if more else ""))
+            if df_log.empty:
+                st.info("אין שורות בעמוד/טווח שנבחר.")
+            else:
+                st.dataframe(df_log.head(LOG_PAGE_SIZE), use_container_width=True)
+            export_controls(
+                log_chunks, partition, "log", "קובץ יומן (לפי הסינון שנבחר)", "Log", (storage.log_version(), start, end, log_text))
         else:
             st.info("אין עדיין נתונים ביומן.")
 
+        st.subheader("🔎 שאילתות מהירות")
+        q1, q2 = st.columns(2)
+        lookup_id = q1.text_input("חיפוש לפי תעודת זהות", key="admin_lookup_id")
+        if lookup_id.strip():
+            q1.write("✅ קיימת הגשה" if storage.has_id(lookup_id) else "— לא נמצאה הגשה")
+        choice_site = q2.selectbox("מי דירג/ה את המוסד", SITES, key="admin_choice_site")
+        choice_rank = q2.selectbox("במקום", list(range(1, RANK_COUNT + 1)), key="admin_choice_rank")
+        by_choice = storage.find_by_choice(choice_site, choice_rank)
+        st.caption(f"{len(by_choice)} סטודנטים/ות דירגו את {choice_site} במקום {choice_rank}")
+        if not by_choice.empty:
+            paged_dataframe(by_choice.reindex(columns=["שם פרטי", "שם משפחה", ID_COLUMN, "טלפון", "אימייל"]),
+                            "admin_choice_page")
+
+        st.subheader("🏫 רשימות לפי מוסד (למנחי שיטות)")
+        if df_master.empty:
+            st.info("אין עדיין נתונים.")
+        else:
+            # חוברת אחת: גיליון סיכום + גיליון לכל מוסד; נבנית פעם אחת לכל גרסת נתונים
+            roster_key = ("rosters", view, storage.master_version())
+            if st.button("⚙ הכנת חוברת רשימות לכל המוסדות", key="rosters_btn"):
+                with timings.span("export.rosters", rows=len(df_master)):
+                    export_cache.get_or_build(roster_key, lambda: rosters_excel_bytes(site_rosters(df_master)))
+                st.session_state["rosters_ready"] = roster_key
+            data = export_cache.get(roster_key) if st.session_state.get("rosters_ready") == roster_key else None
+            if data is not None:
+                st.download_button("⬇ הורד חוברת רשימות (Excel)", data=data,
+                                   file_name=f"רשימות_מוסדות_{view}.xlsx", mime=XLSX_MIME, key="rosters_dl")
+
+        st.subheader("✅ בדיקת תקינות הקובץ הראשי")
+        if df_master.empty:
+            st.info("אין עדיין נתונים לבדיקה.")
+        else:
+            # התוצאה נשמרת בסשן (לפי גרסת הנתונים) כדי שמעבר עמוד לא ימחק אותה
+            audit_key = (view, storage.master_version())
+            if st.button("🔍 בדיקת כל השורות מול כללי הטופס"):
+                started = datetime.now()
+                violations = validate_frame(df_master)
+                elapsed = (datetime.now() - started).total_seconds()
+                st.session_state["audit_result"] = (audit_key, elapsed, audit_summary(violations),
+                                                    invalid_rows(df_master, violations))
+            audit = st.session_state.get("audit_result")
+            if audit is not None and audit[0] == audit_key:
+                _, elapsed, summary, bad = audit
+                st.caption(f"נבדקו {len(df_master)} שורות ב-{elapsed:.2f} שניות · {len(bad)} שורות עם הפרות")
+                if bad.empty:
+                    st.success("כל השורות תקינות.")
+                else:
+                    st.dataframe(summary, use_container_width=True)
+                    paged_dataframe(bad, "admin_audit_page")
+
+        st.subheader("📥 ייבוא הגשות (CSV / Excel)")
+        st.caption("הגשות שנאספו בנייר או בטופס חיצוני: מיפוי עמודות, בדיקת תקינות, "
+                   f"סינון כפילויות לפי ת״ז וכתיבה אחת למאסטר, ליומן ול-Sheets של המחיצה הפעילה ({ACTIVE.name}).")
+        upload = st.file_uploader("קובץ לייבוא", type=accepted_types(), key="admin_import_file")
+        if upload is not None:
+            try:
+                src = read_upload(upload.name, upload.getvalue())
+            except ValueError as e:
+                st.error(str(e))
+                src = None
+            if src is not None:
+                unmapped = "— ללא —"
+                options = [unmapped] + list(src.columns)
+                suggested = suggest_mapping(list(src.columns))
+                mapping = {}
+                with st.expander(f"מיפוי עמודות ({sum(v is not None for v in suggested.values())}"
+                                 f"/{len(COLUMNS_ORDER)} זוהו אוטומטית)"):
+                    for c in COLUMNS_ORDER:
+                        chosen = st.selectbox(c, options, index=options.index(suggested[c] or unmapped),
+                                              key=f"admin_import_map_{c}")
+                        mapping[c] = None if chosen == unmapped else chosen
+                replace_existing = st.checkbox("להחליף הגשות קיימות עם אותה ת״ז", key="admin_import_replace")
+                with timings.span("import.plan", rows=len(src)):
+                    plan = plan_import(apply_mapping(src, mapping), get_storage().load_master().get(
+                        ID_COLUMN, pd.Series(dtype=str)), replace_existing)
+                st.caption(f"{len(src)} שורות בקובץ · {len(plan.accepted)} לייבוא · "
+                           f"{len(plan.rejected)} נדחו בבדיקה · {plan.duplicates} כפולות בקובץ · "
+                           f"{plan.existing} כבר קיימות" + (" (יוחלפו)" if replace_existing else " (ידלגו)"))
+                if not plan.rejected.empty:
+                    paged_dataframe(plan.rejected, "admin_import_rejected_page")
+                if not plan.accepted.empty and st.button(f"📥 ייבוא {len(plan.accepted)} שורות", key="admin_import_go"):
+                    started = datetime.now()
+                    get_submission_store().save_many(plan.records)
+                    elapsed = (datetime.now() - started).total_seconds()
+                    st.success(f"יובאו {len(plan.accepted)} שורות ב-{elapsed:.2f} שניות.")
+
+        st.subheader("📊 ביקוש ומגמות")
+        demand = get_archived_demand_stats(view) if archived else get_demand_stats()
+        st.caption(f"מחיצה {view} · סטודנטים במאסטר: {demand.data['students']}")
+        site_table = demand.site_table()
+        st.bar_chart(site_table.drop(columns=["סה״כ"]), stack=True)
+        st.dataframe(site_table, use_container_width=True)
+        d1, d2 = st.columns(2)
+        with d1:
+            st.markdown("**פופולריות תחומים**")
+            st.dataframe(demand.domain_table(), use_container_width=True)
+        with d2:
+            st.markdown("**לפי מסלול לימודים**")
+            st.dataframe(demand.track_table(), use_container_width=True)
+        per_day = demand.per_day_series()
+        if not per_day.empty:
+            st.markdown("**הגשות לפי יום**")
+            st.line_chart(per_day)
+
+        st.subheader("🧩 שיבוץ אוטומטי לפי דירוגים")
+        if df_master.empty:
+            st.info("אין הגשות לשיבוץ.")
+        else:
+            defaults = default_capacities(len(df_master))
+            with st.expander("קיבולת לכל מוסד"):
+                cap_cols = st.columns(2)
+                capacities = {
+                    s: cap_cols[i % 2].number_input(s, min_value=0, value=defaults[s], step=1, key=f"cap_{i}")
+                    for i, s in enumerate(SITES)
+                }
+            if st.button("▶ הרצת שיבוץ"):
+                st.session_state["match_result"] = match_students(df_master, capacities)
+            result = st.session_state.get("match_result")
+            if result is not None:
+                stats = result.stats
+                k1, k2, k3, k4 = st.columns(4)
+                k1.metric("שובצו", f"{stats['placed']}/{stats['students']}")
+                k2.metric("קיבלו עדיפות 1", stats["rank_1"])
+                k3.metric("עדיפות 2 / 3", f"{stats['rank_2']} / {stats['rank_3']}")
+                k4.metric("דירוג ממוצע", f"{stats['mean_rank']:.2f}" if stats["mean_rank"] else "—")
+                if stats["unplaced"] or stats["unranked_site"]:
+                    st.warning(f"{stats['unplaced']} לא שובצו · {stats['unranked_site']} שובצו למוסד שלא דירגו.")
+                site_tab = st.selectbox("רשימת מוסד", SITES, key="match_roster_site")
+                placed_n, cap_n = stats["fill"][site_tab]
+                st.caption(f"{placed_n} מתוך {cap_n} מקומות")
+                paged_dataframe(result.rosters[site_tab], "match_roster_page")
+                st.download_button(
+                    "⬇ הורד CSV – תוצאות שיבוץ",
+                    data=export_bytes(result.assignments, "CSV"),
+                    file_name="שיבוץ_סטודנטים.csv",
+                    mime="text/csv"
+                )
+
+        st.subheader("📤 סנכרון Google Sheets")
+        sync = get_sheets_writer().status()
+        connection = get_sheets_connection()
+        st.caption(f"שורות ממתינות בתור: {sync['depth']} · "
+                   f"חיבור: {'פעיל' if connection.connected else 'לא נפתח עדיין'}")
+        if st.button("🩺 בדיקת חיבור ל־Google Sheets"):
+            if connection.health_check():
+                st.success("החיבור ל־Google Sheets תקין.")
+            else:
+                st.error(f"⚠ לא ניתן להתחבר ל־Google Sheets: {connection.last_error}")
+        if sync["last_error"]:
+            st.warning(f"ניסיון אחרון נכשל ({sync['failures']} ברצף): {sync['last_error']} · "
+                       f"ניסיון הבא בעוד {sync['next_attempt_in']:.0f} שניות")
+        if st.button("🔄 השוואת הגיליון מול הקובץ הראשי והשלמת שורות חסרות"):
+            try:
+                res = get_sheets_writer().reconcile(get_storage().load_master().to_dict("records"),
+                                                    ID_COLUMN, DATE_COLUMN)
+                st.success(f"בגיליון {res['sheet_rows']} שורות · במאסטר {res['local_rows']} · "
+                           f"ממתינות בתור {res['pending']} · נוספו עכשיו {res['pushed']} שורות.")
+            except Exception as e:
+                st.error(f"❌ ההשוואה נכשלה: {e}")
+
+        st.subheader("⏱️ זמני ביצוע (אחרונים)")
+        stages = timings.summary()
+        api = timings.api_summary(int(st.secrets.get("SHEETS_QUOTA_PER_MINUTE", 60)))
+        a1, a2, a3, a4, a5 = st.columns(5)
+        a1.metric("קריאות Sheets API", api["calls"])
+        a2.metric("בדקה האחרונה", f"{api['last_minute']}/{api['quota_per_minute']}")
+        a3.metric("שגיאות API", api["errors"])
+        a4.metric("חריגות מכסה (429)", api["quota_errors"])
+        a5.metric("שליחות כפולות שנחסמו", get_submission_store().recent.suppressed)
+        if stages:
+            st.dataframe(pd.DataFrame(stages).set_index("stage"), use_container_width=True)
+        else:
+            st.info("עדיין לא נמדדו פעולות בתהליך הזה.")
+        if api["by_method"]:
+            st.caption(" · ".join(f"{m}: {n}" for m, n in sorted(api["by_method"].items())))
+        if st.button("📝 כתיבת סיכום ליומן השרת"):
+            timings.log_summary()
+            st.success("הסיכום נכתב ליומן (JSON).")
+
+        st.subheader("🗄️ גיבויים ושחזור")
+        backup_store = get_backup_store()
+        snaps = backup_store.describe()
+        st.caption(f"תמונות מצב שמורות: {len(snaps)} · שורות בדלתא הנוכחית: {backup_store.manifest['delta_rows']}")
+        c1, c2 = st.columns(2)
+        restore_date = c1.date_input("שחזור לתאריך", value=datetime.now().date())
+        restore_time = c2.time_input("שעה", value=datetime.now().time().replace(microsecond=0))
+        if st.button("♻️ שחזר קובץ ראשי לנקודת זמן"):
+            try:
+                df_restored = backup_store.restore(datetime.combine(restore_date, restore_time), key=ID_COLUMN)
+                st.success(f"שוחזרו {len(df_restored)} שורות.")
+                st.download_button(
+                    "⬇ הורד CSV משוחזר",
+                    data=df_restored.to_csv(index=False).encode("utf-8-sig"),
+                    file_name=f"שאלון_שיבוץ_restore_{restore_date:%Y%m%d}_{restore_time:%H%M}.csv",
+                    mime="text/csv"
+                )
+            except ValueError as e:
+                st.error(str(e))
+
     else:
         if pwd:
             st.error("סיסמה שגויה")
@@ -313,65 +600,150 @@ if is_admin_mode:
 # =========================
 # טופס — טאבים
 # =========================
-st.title("📋 שאלון שיבוץ סטודנטים – שנת הכשרה תשפ״ו")
+st.title(f"📋 שאלון שיבוץ סטודנטים – שנת הכשרה {COHORT_NAME}")
 st.caption("מלאו/מלאי את כל הסעיפים. השדות המסומנים ב-* הינם חובה.")
 
+# כל טאב הוא fragment: שינוי בשדה מריץ מחדש רק את הטאב שלו. הערכים נקראים
+# מ-session_state לפי key, ומעבר בין טאבים מריץ את כל הדף (כך התקציר תמיד עדכני).
+PLACEHOLDER = "— בחר/י —"
+ss = st.session_state
+
 tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
     "סעיף 1: פרטים אישיים", "סעיף 2: העדפת שיבוץ",
     "סעיף 3: נתונים אקדמיים", "סעיף 4: התאמות",
     "סעיף 5: מוטיבציה", "סעיף 6: סיכום ושליחה"
-])
+], on_change="rerun", key="form_tab")
+
+
+def field(key: str, default=""):
+    return ss.get(key, default)
+
+
+def joined_with_other(items_key: str, other_key: str) -> str:
+    items = field(items_key, [])
+    return "; ".join([x for x in items if x != "אחר..."] + ([field(other_key).strip()] if "אחר..." in items else []))
+
+
+def build_row() -> dict:
+    """The submission row from the current widget values ("אחר..." replaced by its detail)."""
+    site_to_rank = {s: None for s in SITES}
+    for i in range(1, RANK_COUNT + 1):
+        site = field(f"rank_{i}", PLACEHOLDER)
+        if site in site_to_rank:
+            site_to_rank[site] = i
+
+    tz = pytz.timezone("Asia/Jerusalem")
+    top_domain = field("top_domain", PLACEHOLDER)
+    row = {
+        "תאריך שליחה": datetime.now(tz).strftime("%d/%m/%Y %H:%M:%S"),
+        "שם פרטי": field("first_name").strip(),
+        "שם משפחה": field("last_name").strip(),
+        "תעודת זהות": field("nat_id").strip(),
+        "מין": field("gender", GENDERS[0]),
+        "שיוך חברתי": field("social_affil", SOCIAL_AFFILIATIONS[0]),
+        "שפת אם": (field("other_mt").strip() if field("mother_tongue") == "אחר..." else field("mother_tongue", MOTHER_TONGUES[0])),
+        "שפות נוספות": joined_with_other("extra_langs", "extra_langs_other"),
+        "טלפון": field("phone").strip(),
+        "כתובת": field("address").strip(),
+        "אימייל": field("email").strip(),
+        "שנת לימודים": (field("study_year_other").strip() if field("study_year") == "אחר" else field("study_year", STUDY_YEARS[0])),
+        "מסלול לימודים": field("track", TRACKS[0]).strip(),
+        "הכשרה קודמת": field("prev_training", PREV_TRAINING[0]),
+        "הכשרה קודמת מקום ותחום": field("prev_place").strip(),
+        "הכשרה קודמת מדריך ומיקום": field("prev_mentor").strip(),
+        "הכשרה קודמת בן זוג": field("prev_partner").strip(),
+        "תחומים מועדפים": joined_with_other("chosen_domains", "domains_other"),
+        "תחום מוביל": (top_domain if top_domain and top_domain != PLACEHOLDER else ""),
+        "בקשה מיוחדת": field("special_request").strip(),
+        "ממוצע": field("avg_grade", 0.0),
+        "התאמות": joined_with_other("adjustments", "adjustments_other"),
+        "התאמות פרטים": field("adjustments_details").strip(),
+        "מוטיבציה 1": field("m1", LIKERT[0]),
+        "מוטיבציה 2": field("m2", LIKERT[0]),
+        "מוטיבציה 3": field("m3", LIKERT[0]),
+        "אישור הגעה להכשרה": "כן" if field("arrival_confirm", False) else "לא",
+    }
+
+    # 1) שדות "מקום הכשרה i"
+    for i in range(1, RANK_COUNT + 1):
+        row[f"מקום הכשרה {i}"] = field(f"rank_{i}", PLACEHOLDER)
+    # 2) Site -> Rank (לשימוש נוח ב-Excel)
+    for s in SITES:
+        row[f"דירוג_{s}"] = site_to_rank[s]
+    return row
+
 
 # --- סעיף 1 ---
-with tab1:
+@st.fragment
+def personal_tab():
     st.subheader("פרטים אישיים של הסטודנט/ית")
-    first_name = st.text_input("שם פרטי *")
-    last_name  = st.text_input("שם משפחה *")
-    nat_id     = st.text_input("מספר תעודת זהות *")
-    gender = st.radio("מין *", ["זכר","נקבה"], horizontal=True)
-    social_affil = st.selectbox("שיוך חברתי *", ["יהודי/ה","מוסלמי/ת","נוצרי/ה","דרוזי/ת"])
-    mother_tongue = st.selectbox("שפת אם *", ["עברית","ערבית","רוסית","אחר..."])
-    other_mt = st.text_input("ציין/ני שפת אם אחרת *") if mother_tongue == "אחר..." else ""
+    st.text_input("שם פרטי *", key="first_name")
+    st.text_input("שם משפחה *", key="last_name")
+    st.text_input("מספר תעודת זהות *", key="nat_id")
+    st.radio("מין *", GENDERS, horizontal=True, key="gender")
+    st.selectbox("שיוך חברתי *", SOCIAL_AFFILIATIONS, key="social_affil")
+    mother_tongue = st.selectbox("שפת אם *", MOTHER_TONGUES + [OTHER], key="mother_tongue")
+    if mother_tongue == "אחר...":
+        st.text_input("ציין/ני שפת אם אחרת *", key="other_mt")
     extra_langs = st.multiselect(
         "ציין/י שפות נוספות (ברמת שיחה) *",
-        ["עברית","ערבית","רוסית","אמהרית","אנגלית","ספרדית","אחר..."],
-        placeholder="בחר/י שפות נוספות"
+        EXTRA_LANGUAGES + [OTHER],
+        placeholder="בחר/י שפות נוספות",
+        key="extra_langs"
     )
-    extra_langs_other = st.text_input("ציין/י שפה נוספת (אחר) *") if "אחר..." in extra_langs else ""
-    phone   = st.text_input("מספר טלפון נייד * (למשל 050-1234567)")
-    address = st.text_input("כתובת מלאה (כולל יישוב) *")
-    email   = st.text_input("כתובת דוא״ל *")
-    study_year = st.selectbox("שנת הלימודים *", [
-        "תואר ראשון - שנה א", "תואר ראשון - שנה ב", "תואר ראשון - שנה ג'",
-        "תואר שני - שנה א'", "תואר שני - שנה ב", "אחר"
-    ])
-    study_year_other = st.text_input("פרט/י שנת לימודים *") if study_year == "אחר" else ""
-    
-    track = st.selectbox("מסלול הלימודים / תואר *", [
-        "תואר ראשון – תוכנית רגילה",
-        "תואר ראשון – הסבה",
-        "תואר שני"
-    ])
+    if "אחר..." in extra_langs:
+        st.text_input("ציין/י שפה נוספת (אחר) *", key="extra_langs_other")
+    st.text_input("מספר טלפון נייד * (למשל 050-1234567)", key="phone")
+    st.text_input("כתובת מלאה (כולל יישוב) *", key="address")
+    st.text_input("כתובת דוא״ל *", key="email")
+    study_year = st.selectbox("שנת הלימודים *", STUDY_YEARS + ["אחר"], key="study_year")
+    if study_year == "אחר":
+        st.text_input("פרט/י שנת לימודים *", key="study_year_other")
+
+    st.selectbox("מסלול הלימודים / תואר *", TRACKS, key="track")
+
 
 # --- סעיף 2 ---
-with tab2:
+@st.fragment
+def rank_picker():
+    # הבחירה כובלת קדימה: כל מקום מציע רק מוסדות שלא נבחרו במקומות הקודמים
+    chosen = set()
+    cols = st.columns(2)
+    for i in range(1, RANK_COUNT + 1):
+        opts = [PLACEHOLDER] + [s for s in SITES if s not in chosen]
+        current = field(f"rank_{i}", PLACEHOLDER)
+        with cols[(i - 1) % 2]:
+            sel = st.selectbox(
+                f"מקום הכשרה {i} (בחר/י מוסד) *",
+                options=opts,
+                index=opts.index(current) if current in opts else 0,
+                key=f"rank_{i}_select"
+            )
+        ss[f"rank_{i}"] = sel
+        if sel != PLACEHOLDER:
+            chosen.add(sel)
+
+
+@st.fragment
+def placement_tab():
     st.subheader("העדפת שיבוץ")
 
-    prev_training = st.selectbox("האם עברת הכשרה מעשית בשנה קודמת? *", ["כן","לא","אחר..."])
-    prev_place = prev_mentor = prev_partner = ""
+    prev_training = st.selectbox("האם עברת הכשרה מעשית בשנה קודמת? *", PREV_TRAINING, key="prev_training")
     if prev_training in ["כן","אחר..."]:
-        prev_place  = st.text_input("אם כן, נא ציין שם מקום ותחום ההתמחות *")
-        prev_mentor = st.text_input("שם המדריך והמיקום הגיאוגרפי של ההכשרה *")
-        prev_partner= st.text_input("מי היה/תה בן/בת הזוג להתמחות בשנה הקודמת? *")
+        st.text_input("אם כן, נא ציין שם מקום ותחום ההתמחות *", key="prev_place")
+        st.text_input("שם המדריך והמיקום הגיאוגרפי של ההכשרה *", key="prev_mentor")
+        st.text_input("מי היה/תה בן/בת הזוג להתמחות בשנה הקודמת? *", key="prev_partner")
 
-    all_domains = ["רווחה","מוגבלות","זקנה","ילדים ונוער","בריאות הנפש",
-                   "שיקום","משפחה","נשים","בריאות","קהילה","אחר..."]
-    chosen_domains = st.multiselect("בחרו עד 3 תחומים *", all_domains, max_selections=3, placeholder="בחר/י עד שלושה תחומים")
+    all_domains = DOMAINS + [OTHER]
+    chosen_domains = st.multiselect("בחרו עד 3 תחומים *", all_domains, max_selections=3,
+                                    placeholder="בחר/י עד שלושה תחומים", key="chosen_domains")
 
-    domains_other = st.text_input("פרט/י תחום אחר *") if "אחר..." in chosen_domains else ""
-    top_domain = st.selectbox(
+    if "אחר..." in chosen_domains:
+        st.text_input("פרט/י תחום אחר *", key="domains_other")
+    st.selectbox(
         "מה התחום הכי מועדף עליך, מבין שלושתם? *",
-        ["— בחר/י —"] + chosen_domains if chosen_domains else ["— בחר/י —"]
+        [PLACEHOLDER] + chosen_domains if chosen_domains else [PLACEHOLDER],
+        key="top_domain"
     )
 
     # ניסוח דירוג — מדויק לפי המרצים
@@ -382,265 +754,145 @@ with tab2:
 
 
     st.markdown("**בחר/י מוסד לכל מקום הכשרה (1 = הכי רוצים, 3 = הכי פחות). הבחירה כובלת קדימה — מוסדות שנבחרו ייעלמו מהבחירות הבאות.**")
+    rank_picker()
 
-    # אתחול מצב הבחירות
-    for i in range(1, RANK_COUNT + 1):
-        st.session_state.setdefault(f"rank_{i}", "— בחר/י —")
-
-    def options_for_rank(rank_i: int) -> list:
-        current = st.session_state.get(f"rank_{rank_i}", "— בחר/י —")
-        chosen_before = {
-            st.session_state.get(f"rank_{j}")
-            for j in range(1, rank_i)
-        }
-        base = ["— בחר/י —"] + [s for s in SITES if (s not in chosen_before or s == current)]
-        ordered = ["— בחר/י —"] + [s for s in SITES if s in base]
-        return ordered
-
-
-    cols = st.columns(2)
-    for i in range(1, RANK_COUNT + 1):
-        with cols[(i - 1) % 2]:
-            opts = options_for_rank(i)
-            current = st.session_state.get(f"rank_{i}", "— בחר/י —")
-            st.session_state[f"rank_{i}"] = st.selectbox(
-                f"מקום הכשרה {i} (בחר/י מוסד) *",
-                options=opts,
-                index=opts.index(current) if current in opts else 0,
-                key=f"rank_{i}_select"
-            )
-            st.session_state[f"rank_{i}"] = st.session_state[f"rank_{i}_select"]
-
-    used = set()
-    for i in range(1, RANK_COUNT + 1):
-        sel = st.session_state.get(f"rank_{i}", "— בחר/י —")
-        if sel != "— בחר/י —":
-            if sel in used:
-                st.session_state[f"rank_{i}"] = "— בחר/י —"
-                st.session_state[f"rank_{i}_select"] = "— בחר/י —"
-            else:
-                used.add(sel)
-
-    special_request = st.text_area("האם קיימת בקשה מיוחדת הקשורה למיקום או תחום ההתמחות? *", height=100)
+    st.text_area("האם קיימת בקשה מיוחדת הקשורה למיקום או תחום ההתמחות? *", height=100, key="special_request")
 
 
 # --- סעיף 3 ---
-with tab3:
+@st.fragment
+def academic_tab():
     st.subheader("נתונים אקדמיים")
-    avg_grade = st.number_input("ממוצע ציונים *", min_value=0.0, max_value=100.0, step=0.1)
+    st.number_input("ממוצע ציונים *", min_value=0.0, max_value=100.0, step=0.1, key="avg_grade")
+
 
 # --- סעיף 4 ---
-with tab4:
+@st.fragment
+def adjustments_tab():
     st.subheader("התאמות רפואיות, אישיות וחברתיות")
     adjustments = st.multiselect(
         "סוגי התאמות (ניתן לבחור כמה) *",
-        ["אין","הריון","מגבלה רפואית (למשל: מחלה כרונית, אוטואימונית)",
-         "רגישות למרחב רפואי (למשל: לא לשיבוץ בבית חולים)",
-         "אלרגיה חמורה","נכות",
-         "רקע משפחתי רגיש (למשל: בן משפחה עם פגיעה נפשית)","אחר..."],
-        placeholder="בחר/י אפשרויות התאמה"
+        ADJUSTMENTS + [OTHER],
+        placeholder="בחר/י אפשרויות התאמה",
+        key="adjustments"
     )
 
-    adjustments_other = ""
-    adjustments_details = ""
-
       # אם נבחר "אחר..." – תיפתח תיבה מיוחדת
     if "אחר..." in adjustments:
-        adjustments_other = st.text_input("פרט/י התאמה אחרת *")
+        st.text_input("פרט/י התאמה אחרת *", key="adjustments_other")
 
     # רק אם המשתמש לא בחר "אין" – תוצג התיבה לפרטים
     if "אין" not in adjustments:
-        adjustments_details = st.text_area("פרט: *", height=100)
+        st.text_area("פרט: *", height=100, key="adjustments_details")
+
 
 # --- סעיף 5 ---
-with tab5:
+@st.fragment
+def motivation_tab():
     st.subheader("מוטיבציה")
-    likert = ["בכלל לא מסכים/ה","1","2","3","4","מסכים/ה מאוד"]
-    m1 = st.radio("1) מוכן/ה להשקיע מאמץ נוסף להגיע למקום המועדף *", likert, horizontal=True)
-    m2 = st.radio("2) ההכשרה המעשית חשובה לי כהזדמנות משמעותית להתפתחות *", likert, horizontal=True)
-    m3 = st.radio("3) אהיה מחויב/ת להגיע בזמן ולהתמיד גם בתנאים מאתגרים *", likert, horizontal=True)
+    st.radio("1) מוכן/ה להשקיע מאמץ נוסף להגיע למקום המועדף *", LIKERT, horizontal=True, key="m1")
+    st.radio("2) ההכשרה המעשית חשובה לי כהזדמנות משמעותית להתפתחות *", LIKERT, horizontal=True, key="m2")
+    st.radio("3) אהיה מחויב/ת להגיע בזמן ולהתמיד גם בתנאים מאתגרים *", LIKERT, horizontal=True, key="m3")
+
 
 # --- סעיף 6 (סיכום ושליחה) ---
-with tab6:
-    st.subheader("סיכום ושליחה")
-    st.markdown("בדקו את התקציר. אם יש טעות – חזרו לטאב המתאים, תקנו וחזרו לכאן. לאחר אישור ולחיצה על **שליחה** המידע יישמר.")
+SUMMARY_SECTIONS = [
+    ("### 🧑‍💻 פרטים אישיים", [
+        ("שם פרטי", "שם פרטי"), ("שם משפחה", "שם משפחה"), ("ת״ז", "תעודת זהות"), ("מין", "מין"),
+        ("שיוך חברתי", "שיוך חברתי"), ("שפת אם", "שפת אם"), ("שפות נוספות", "שפות נוספות"),
+        ("טלפון", "טלפון"), ("כתובת", "כתובת"), ("אימייל", "אימייל"),
+        ("שנת לימודים", "שנת לימודים"), ("מסלול לימודים", "מסלול לימודים"),
+    ]),
+    ("### 🎓 נתונים אקדמיים", [("ממוצע ציונים", "ממוצע")]),
+    ("### 🧪 התאמות", [("התאמות", "התאמות"), ("פירוט התאמות", "התאמות פרטים")]),
+    ("### 🔥 מוטיבציה", [("מוכנות להשקיע מאמץ", "מוטיבציה 1"), ("חשיבות ההכשרה", "מוטיבציה 2"),
+                         ("מחויבות והתמדה", "מוטיבציה 3")]),
+]
 
-    # היגד הצהרה מחייב לפי המרצים
-    arrival_confirm = st.checkbox("אני מצהיר/ה שאגיע בכל דרך להכשרה המעשית שתיקבע לי. *")
 
-    # מיפוי מקום הכשרה->מוסד + מוסד->דירוג
-    rank_to_site = {i: st.session_state.get(f"rank_{i}", "— בחר/י —") for i in range(1, RANK_COUNT + 1)}
-    site_to_rank = {s: None for s in SITES}
-    for i, s in rank_to_site.items():
-        if s and s != "— בחר/י —":
-            site_to_rank[s] = i
+def _md_cell(v) -> str:
+    return "" if v is None else str(v).replace("|", "\\|").replace("$", "\\$").replace("\n", " ")
+
+
+def md_table(header: str, pairs) -> str:
+    """A two-column markdown table (rendered by st.markdown; no DataFrame needed)."""
+    lines = [f"| | {header} |", "|---|---|"]
+    lines += [f"| {_md_cell(k)} | {_md_cell(v)} |" for k, v in pairs]
+    return "\n".join(lines)
+
 
+def render_summary(row: dict) -> None:
     st.markdown("### 📍 העדפות שיבוץ (1=הכי רוצים)")
-    summary_pairs = [f"{rank_to_site[i]} – {i}" if rank_to_site[i] != "— בחר/י —" else f"(לא נבחר) – {i}"
-                     for i in range(1, RANK_COUNT + 1)]
-    st.table(pd.DataFrame({"דירוג": summary_pairs}))
-
-    st.markdown("### 🧑‍💻 פרטים אישיים")
-    st.table(pd.DataFrame([{
-        "שם פרטי": first_name, "שם משפחה": last_name, "ת״ז": nat_id, "מין": gender,
-        "שיוך חברתי": social_affil,
-        "שפת אם": (other_mt if mother_tongue == "אחר..." else mother_tongue),
-        "שפות נוספות": "; ".join([x for x in extra_langs if x != "אחר..."] + ([extra_langs_other] if "אחר..." in extra_langs else [])),
-        "טלפון": phone, "כתובת": address, "אימייל": email,
-        "שנת לימודים": (study_year_other if study_year == "אחר" else study_year),
-        "מסלול לימודים": track,
-    }]).T.rename(columns={0: "ערך"}))
-
-    st.markdown("### 🎓 נתונים אקדמיים")
-    st.table(pd.DataFrame([{"ממוצע ציונים": avg_grade}]).T.rename(columns={0: "ערך"}))
-
-    st.markdown("### 🧪 התאמות")
-    st.table(pd.DataFrame([{
-        "התאמות": "; ".join([a for a in adjustments if a != "אחר..."] + ([adjustments_other] if "אחר..." in adjustments else [])),
-        "פירוט התאמות": adjustments_details,
-    }]).T.rename(columns={0: "ערך"}))
-
-    st.markdown("### 🔥 מוטיבציה")
-    st.table(pd.DataFrame([{"מוכנות להשקיע מאמץ": m1, "חשיבות ההכשרה": m2, "מחויבות והתמדה": m3}]).T.rename(columns={0: "ערך"}))
+    st.markdown(md_table("דירוג", [
+        (i - 1, f"{row[c]} – {i}" if row[c] != PLACEHOLDER else f"(לא נבחר) – {i}")
+        for i, c in enumerate(RANK_COLUMNS, start=1)
+    ]))
+    for title, fields in SUMMARY_SECTIONS:
+        st.markdown(title)
+        st.markdown(md_table("ערך", [(label, row[col]) for label, col in fields]))
 
-    st.markdown("---")
-    confirm = st.checkbox("אני מאשר/ת כי המידע שמסרתי נכון ומדויק, וידוע לי שאין התחייבות להתאמה מלאה לבחירותיי. *")
-    submitted = st.button("שליחה ✉️")
-
-if submitted:
-    errors = []
-
-    # סעיף 1 — פרטים אישיים
-    if not first_name.strip():
-        errors.append("סעיף 1: יש למלא שם פרטי.")
-    if not last_name.strip():
-        errors.append("סעיף 1: יש למלא שם משפחה.")
-    if not valid_id(nat_id):
-        errors.append("סעיף 1: ת״ז חייבת להיות 8–9 ספרות.")
-    if mother_tongue == "אחר..." and not other_mt.strip():
-        errors.append("סעיף 1: יש לציין שפת אם (אחר).")
-    if not extra_langs or ("אחר..." in extra_langs and not extra_langs_other.strip()):
-        errors.append("סעיף 1: יש לבחור שפות נוספות (ואם 'אחר' – לפרט).")
-    if not valid_phone(phone):
-        errors.append("סעיף 1: מספר טלפון אינו תקין.")
-    if not address.strip():
-        errors.append("סעיף 1: יש למלא כתובת מלאה.")
-    if not valid_email(email):
-        errors.append("סעיף 1: כתובת דוא״ל אינה תקינה.")
-    if study_year == "אחר" and not study_year_other.strip():
-        errors.append("סעיף 1: יש לפרט שנת לימודים (אחר).")
-    if not track.strip():
-        errors.append("סעיף 1: יש למלא מסלול לימודים/תואר.")
-
-    # סעיף 2 — העדפת שיבוץ
-    rank_to_site = {i: st.session_state.get(f"rank_{i}", "— בחר/י —") for i in range(1, RANK_COUNT + 1)}
-    missing = [i for i, s in rank_to_site.items() if s == "— בחר/י —"]
-    if missing:
-        errors.append(f"סעיף 2: יש לבחור מוסד לכל מקום הכשרה. חסר/ים: {', '.join(map(str, missing))}.")
-    chosen_sites = [s for s in rank_to_site.values() if s != "— בחר/י —"]
-    if len(set(chosen_sites)) != len(chosen_sites):
-        errors.append("סעיף 2: קיימת כפילות בבחירת מוסדות. כל מוסד יכול להופיע פעם אחת בלבד.")
-
-    if prev_training in ["כן","אחר..."] and not prev_place.strip():
-        errors.append("סעיף 2: יש למלא מקום/תחום אם הייתה הכשרה קודמת.")
-    if prev_training in ["כן","אחר..."] and not prev_mentor.strip():
-        errors.append("סעיף 2: יש למלא שם מדריך ומיקום.")
-    if prev_training in ["כן","אחר..."] and not prev_partner.strip():
-        errors.append("סעיף 2: יש למלא בן/בת זוג להתמחות.")
-
-    if not chosen_domains:
-        errors.append("סעיף 2: יש לבחור עד 3 תחומים (לפחות אחד).")
-    if "אחר..." in chosen_domains and not domains_other.strip():
-        errors.append("סעיף 2: נבחר 'אחר' – יש לפרט תחום.")
-    if chosen_domains and (top_domain not in chosen_domains):
-        errors.append("סעיף 2: יש לבחור תחום מוביל מתוך השלושה.")
-    if any("רווחה" in d for d in chosen_domains) and "שנה ג'" not in study_year:
-        errors.append("סעיף 2: תחום רווחה פתוח לשיבוץ רק לסטודנטים שנה ג׳ ומעלה.")
-
-    if not special_request.strip():
-        errors.append("סעיף 2: יש לציין בקשה מיוחדת (אפשר 'אין').")
-
-    # סעיף 3 — נתונים אקדמיים
-    if avg_grade is None or avg_grade <= 0:
-        errors.append("סעיף 3: יש להזין ממוצע ציונים גדול מ-0.")
-
-    # סעיף 4 — התאמות
-    adj_list = [a.strip() for a in adjustments]
-    has_none = ("אין" in adj_list) and (len([a for a in adj_list if a != "אין"]) == 0)
-
-    if not adj_list:
-        errors.append("סעיף 4: יש לבחור לפחות סוג התאמה אחד (או לציין 'אין').")
-    if "אחר..." in adj_list and not adjustments_other.strip():
-        errors.append("סעיף 4: נבחר 'אחר' – יש לפרט התאמה.")
-    if not has_none and not adjustments_details.strip():
-        errors.append("סעיף 4: יש לפרט התייחסות להתאמות.")
-
-    # סעיף 5 — מוטיבציה
-    if not (m1 and m2 and m3):
-        errors.append("סעיף 5: יש לענות על שלוש שאלות המוטיבציה.")
-
-    # סעיף 6 — הצהרות
-    if not arrival_confirm:
-        errors.append("סעיף 6: יש לסמן את ההצהרה על הגעה להכשרה.")
-    if not confirm:
+
+def handle_submit() -> None:
+    with timings.span("submit.total"):
+        submit_form()
+
+
+def submit_form() -> None:
+    row = build_row()
+
+    # בדיקות לפי הסכמה (validation.RULES) + אישור הדיוק, שאינו נשמר בשורה
+    with timings.span("submit.validate"):
+        errors = validate_row(row)
+    if not field("confirm", False):
         errors.append("סעיף 6: יש לאשר את הצהרת הדיוק וההתאמה.")
 
     # הצגת השגיאות או שמירה
     if errors:
         show_errors(errors)
-    else:
-        # מפות בחירה לשמירה
-        site_to_rank = {s: None for s in SITES}
-        for i in range(1, RANK_COUNT + 1):
-            site = st.session_state.get(f"rank_{i}")
-            site_to_rank[site] = i
+        return
+    try:
+        # שמירה במאסטר + Google Sheets + יומן Append-Only — פעם אחת לכל אסימון טופס ותוכן
+        # (לחיצה כפולה או הרצה חוזרת אחרי ניתוק מחזירות את התוצאה הקודמת בלי לכתוב שוב;
+        # האסימון מתחלף בכל שינוי בטופס, כך ש-A→B→A נשמר שוב)
+        previous, repeated = save_submission(row, form_token(ss, row))
+
+        st.success("✅ הטופס נשלח ונשמר בהצלחה! תודה רבה.")
+        if repeated:
+            st.caption("הטופס הזה כבר נשמר — השליחה החוזרת לא נרשמה שוב.")
+        if previous:
+            st.info(f"ℹ️ הגשה זו החליפה הגשה קודמת עם אותה תעודת זהות "
+                    f"(מתאריך {previous.get('תאריך שליחה', '')}).")
+    except Exception as e:
+        st.error(f"❌ שמירה נכשלה: {e}")
+
+
+@st.fragment
+def summary_tab(show_summary: bool):
+    st.subheader("סיכום ושליחה")
+    st.markdown("בדקו את התקציר. אם יש טעות – חזרו לטאב המתאים, תקנו וחזרו לכאן. לאחר אישור ולחיצה על **שליחה** המידע יישמר.")
 
-        # בניית שורה לשמירה
-        tz = pytz.timezone("Asia/Jerusalem")
-        row = {
-            "תאריך שליחה": datetime.now(tz).strftime("%d/%m/%Y %H:%M:%S"),
-            "שם פרטי": first_name.strip(),
-            "שם משפחה": last_name.strip(),
-            "תעודת זהות": nat_id.strip(),
-            "מין": gender,
-            "שיוך חברתי": social_affil,
-            "שפת אם": (other_mt.strip() if mother_tongue == "אחר..." else mother_tongue),
-            "שפות נוספות": "; ".join([x for x in extra_langs if x != "אחר..."] + ([extra_langs_other.strip()] if "אחר..." in extra_langs else [])),
-            "טלפון": phone.strip(),
-            "כתובת": address.strip(),
-            "אימייל": email.strip(),
-            "שנת לימודים": (study_year_other.strip() if study_year == "אחר" else study_year),
-            "מסלול לימודים": track.strip(),
-            "הכשרה קודמת": prev_training,
-            "הכשרה קודמת מקום ותחום": prev_place.strip(),
-            "הכשרה קודמת מדריך ומיקום": prev_mentor.strip(),
-            "הכשרה קודמת בן זוג": prev_partner.strip(),
-            "תחומים מועדפים": "; ".join([d for d in chosen_domains if d != "אחר..."] + ([domains_other.strip()] if "אחר..." in chosen_domains else [])),
-            "תחום מוביל": (top_domain if top_domain and top_domain != "— בחר/י —" else ""),
-            "בקשה מיוחדת": special_request.strip(),
-            "ממוצע": avg_grade,
-            "התאמות": "; ".join([a for a in adjustments if a != "אחר..."] + ([adjustments_other.strip()] if "אחר..." in adjustments else [])),
-            "התאמות פרטים": adjustments_details.strip(),
-            "מוטיבציה 1": m1,
-            "מוטיבציה 2": m2,
-            "מוטיבציה 3": m3,
-            "אישור הגעה להכשרה": "כן" if arrival_confirm else "לא",
-        }
-
-        # 1) שדות "מקום הכשרה i"
-        for i in range(1, RANK_COUNT + 1):
-            row[f"מקום הכשרה {i}"] = st.session_state.get(f"rank_{i}")
-        # 2) Site -> Rank (לשימוש נוח ב-Excel)
-        for s in SITES:
-            row[f"דירוג_{s}"] = site_to_rank[s]
+    # היגד הצהרה מחייב לפי המרצים
+    st.checkbox("אני מצהיר/ה שאגיע בכל דרך להכשרה המעשית שתיקבע לי. *", key="arrival_confirm")
 
-        try:
-            # שמירה במאסטר + Google Sheets
-            save_master_dataframe(row)
+    # התקציר נבנה רק כשהטאב פתוח
+    if show_summary:
+        render_summary(build_row())
 
-            # יומן Append-Only
-            append_to_log(pd.DataFrame([row]))
+    st.markdown("---")
+    st.checkbox("אני מאשר/ת כי המידע שמסרתי נכון ומדויק, וידוע לי שאין התחייבות להתאמה מלאה לבחירותיי. *", key="confirm")
+    if st.button("שליחה ✉️"):
+        handle_submit()
 
-            st.success("✅ הטופס נשלח ונשמר בהצלחה! תודה רבה.")
-        except Exception as e:
-            st.error(f"❌ שמירה נכשלה: {e}")
+
+with tab1:
+    personal_tab()
+with tab2:
+    placement_tab()
+with tab3:
+    academic_tab()
+with tab4:
+    adjustments_tab()
+with tab5:
+    motivation_tab()
+with tab6:
+    summary_tab(tab6.open is not False)
@@ -0,0 +1,51 @@
+# tests/test_partitions.py
+# -*- coding: utf-8 -*-
+"""A new cohort or form version gets its own worksheet; a sheet with data is never cleared."""
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from partitions import MASTER_NAME, PartitionManifest  # noqa: E402
+from sheets_sync import FakeWorksheet, Outbox, SheetsWriter  # noqa: E402
+
+
+def test_every_new_partition_has_its_own_worksheet(tmp_path):
+    manifest = PartitionManifest(tmp_path)
+    first = manifest.ensure_active("תשפו", ["id", "a"], "id")
+    changed = manifest.ensure_active("תשפו", ["id", "a", "b"], "id")
+    next_cohort = manifest.ensure_active("תשפז", ["id", "a", "b"], "id")
+    sheets = [first.worksheet, changed.worksheet, next_cohort.worksheet]
+    assert None not in sheets and len(set(sheets)) == 3
+
+
+def test_legacy_data_keeps_the_first_worksheet(tmp_path):
+    (tmp_path / MASTER_NAME).write_text("\ufeffid,a\n1,x\n", encoding="utf-8")
+    legacy = PartitionManifest(tmp_path).ensure_active("תשפו", ["id", "a"], "id")
+    assert legacy.dir == "." and legacy.worksheet is None
+
+
+def _writer(tmp_path, ws: FakeWorksheet, columns: list[str]) -> SheetsWriter:
+    writer = SheetsWriter(Outbox(tmp_path / "outbox.jsonl"), lambda: ws, columns)
+    writer.enqueue([{c: "v" for c in columns}])
+    return writer
+
+
+def test_header_mismatch_on_a_sheet_with_rows_is_not_cleared(tmp_path):
+    ws = FakeWorksheet()
+    ws.rows = [["id", "a"], ["1", "x"]]
+    writer = _writer(tmp_path, ws, ["id", "a", "b"])
+    with pytest.raises(ValueError):
+        writer.drain_once()
+    assert ws.rows == [["id", "a"], ["1", "x"]]
+    assert writer.depth() == 1
+
+
+def test_header_only_sheet_is_rewritten(tmp_path):
+    ws = FakeWorksheet()
+    ws.rows = [["id", "a"]]
+    assert _writer(tmp_path, ws, ["id", "a", "b"]).drain_once() == 1
+    assert ws.rows == [["id", "a", "b"], ["v", "v", "v"]]
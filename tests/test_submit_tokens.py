@@ -0,0 +1,65 @@
+# tests/test_submit_tokens.py
+# -*- coding: utf-8 -*-
+"""Idempotent submits: a repeat of the same form content is suppressed, an edit is not."""
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from schema import DATE_COLUMN, ID_COLUMN  # noqa: E402
+from writer import RecentSubmits, form_token, submission_key  # noqa: E402
+
+
+def _row(first_name: str, sent: str = "01/09/2025 10:00") -> dict:
+    return {ID_COLUMN: "123456782", "שם פרטי": first_name, DATE_COLUMN: sent}
+
+
+class _Form:
+    """One browser session: its session state and the submits it sends."""
+
+    def __init__(self, recent: RecentSubmits):
+        self.recent = recent
+        self.state: dict = {}
+        self.saved: list[str] = []
+
+    def submit(self, row: dict) -> bool:
+        key = submission_key(form_token(self.state, row), row)
+        _, repeated = self.recent.run(key, lambda: self.saved.append(row["שם פרטי"]))
+        return repeated
+
+
+def test_double_click_is_suppressed():
+    form = _Form(RecentSubmits())
+    assert form.submit(_row("A")) is False
+    assert form.submit(_row("A", sent="01/09/2025 10:00:01")) is True
+    assert form.saved == ["A"]
+
+
+def test_edit_and_revert_saves_again():
+    form = _Form(RecentSubmits())
+    assert [form.submit(_row(v)) for v in ("A", "B", "A")] == [False, False, False]
+    assert form.saved == ["A", "B", "A"]
+
+
+def test_sessions_do_not_share_tokens():
+    recent = RecentSubmits()
+    one, two = _Form(recent), _Form(recent)
+    one.submit(_row("A"))
+    two.submit(_row("A"))
+    assert one.saved == ["A"] and two.saved == ["A"]
+
+
+def test_failed_save_can_be_retried():
+    recent = RecentSubmits()
+    state: dict = {}
+    key = submission_key(form_token(state, _row("A")), _row("A"))
+
+    def fail():
+        raise OSError("disk full")
+
+    try:
+        recent.run(key, fail)
+    except OSError:
+        pass
+    assert recent.run(key, lambda: "saved") == ("saved", False)
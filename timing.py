@@ -0,0 +1,156 @@
+# timing.py
+# -*- coding: utf-8 -*-
+"""Lightweight timing spans, a ring buffer of recent timings and Sheets API counters.
+
+Usage::
+
+    from timing import timings
+
+    with timings.span("csv.read"):
+        ...
+
+Every span is kept in a bounded in-process ring buffer (``RING_SIZE`` recent
+samples) and logged at DEBUG as one JSON line. Per-stage percentile summaries
+(p50/p95/p99) and the API counters are logged at INFO every
+``SUMMARY_EVERY`` seconds and shown on the admin page.
+"""
+import json
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+RING_SIZE = 5000
+SUMMARY_EVERY = 60.0
+SHEETS_QUOTA_PER_MINUTE = 60      # מכסת כתיבה ברירת מחדל של Sheets API למשתמש לדקה
+QUOTA_MARKERS = ("429", "RESOURCE_EXHAUSTED", "Quota exceeded")
+
+logger = logging.getLogger("students.timing")
+if not logger.handlers:
+    _handler = logging.StreamHandler(sys.stderr)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(os.environ.get("STUDENTS_TIMING_LOG", "INFO").upper())
+    logger.propagate = False
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list (``q`` in 0..100)."""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, math.ceil(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+def is_quota_error(exc: BaseException) -> bool:
+    text = f"{type(exc).__name__}: {exc}"
+    return any(m in text for m in QUOTA_MARKERS)
+
+
+class Timings:
+    def __init__(self, size: int = RING_SIZE, summary_every: float = SUMMARY_EVERY):
+        self._samples: deque = deque(maxlen=size)     # (time, stage, seconds, ok)
+        self._api_times: deque = deque(maxlen=10_000)  # זמני קריאות API (לחישוב מכסה לדקה)
+        self._lock = threading.Lock()
+        self.api_calls: Counter = Counter()
+        self.api_errors: Counter = Counter()
+        self.quota_errors = 0
+        self.summary_every = summary_every
+        self._last_summary = time.time()
+
+    # --- מדידה ---
+    @contextmanager
+    def span(self, stage: str, **fields):
+        t0 = time.perf_counter()
+        ok = True
+        try:
+            yield
+        except BaseException:
+            ok = False
+            raise
+        finally:
+            self.record(stage, time.perf_counter() - t0, ok, **fields)
+
+    def record(self, stage: str, seconds: float, ok: bool = True, **fields) -> None:
+        now = time.time()
+        with self._lock:
+            self._samples.append((now, stage, seconds, ok))
+            due = now - self._last_summary >= self.summary_every
+            if due:
+                self._last_summary = now
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(json.dumps({"event": "span", "stage": stage, "ms": round(seconds * 1000, 3),
+                                     "ok": ok, **fields}, ensure_ascii=False, default=str))
+        if due:
+            self.log_summary()
+
+    def count_api(self, method: str, error: BaseException | None = None) -> None:
+        """Count one Google Sheets API request (and whether it failed / hit the quota)."""
+        with self._lock:
+            self.api_calls[method] += 1
+            self._api_times.append(time.time())
+            if error is not None:
+                self.api_errors[method] += 1
+                if is_quota_error(error):
+                    self.quota_errors += 1
+
+    # --- סיכומים ---
+    def summary(self, since: float | None = None) -> list[dict]:
+        """Per-stage count, p50/p95/p99/max in ms and failures, over the ring buffer."""
+        with self._lock:
+            samples = list(self._samples)
+        by_stage: dict[str, list] = {}
+        failed: Counter = Counter()
+        for ts, stage, seconds, ok in samples:
+            if since is not None and ts < since:
+                continue
+            by_stage.setdefault(stage, []).append(seconds)
+            if not ok:
+                failed[stage] += 1
+        out = []
+        for stage in sorted(by_stage):
+            s = sorted(by_stage[stage])
+            out.append({
+                "stage": stage,
+                "count": len(s),
+                "p50_ms": round(percentile(s, 50) * 1000, 2),
+                "p95_ms": round(percentile(s, 95) * 1000, 2),
+                "p99_ms": round(percentile(s, 99) * 1000, 2),
+                "max_ms": round(s[-1] * 1000, 2),
+                "failed": failed[stage],
+            })
+        return out
+
+    def api_summary(self, quota_per_minute: int = SHEETS_QUOTA_PER_MINUTE) -> dict:
+        now = time.time()
+        with self._lock:
+            last_minute = sum(1 for t in self._api_times if now - t <= 60)
+            return {
+                "calls": sum(self.api_calls.values()),
+                "by_method": dict(self.api_calls),
+                "errors": sum(self.api_errors.values()),
+                "quota_errors": self.quota_errors,
+                "last_minute": last_minute,
+                "quota_per_minute": quota_per_minute,
+                "quota_used": round(last_minute / quota_per_minute, 3) if quota_per_minute else None,
+            }
+
+    def log_summary(self) -> None:
+        logger.info(json.dumps({"event": "timing_summary", "stages": self.summary(),
+                                "sheets_api": self.api_summary()}, ensure_ascii=False))
+
+    def reset(self) -> None:
+        with self._lock:
+            self._samples.clear()
+            self._api_times.clear()
+            self.api_calls.clear()
+            self.api_errors.clear()
+            self.quota_errors = 0
+
+
+# מופע יחיד לתהליך (משותף לכל הסשנים והתהליכונים)
+timings = Timings()
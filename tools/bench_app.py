@@ -0,0 +1,221 @@
+# tools/bench_app.py
+# -*- coding: utf-8 -*-
+"""Headless latency benchmark of streamlit_app.py (Streamlit AppTest).
+
+    python tools/bench_app.py [--sizes 0,1000,10000,100000] [--repeats 5]
+                              [--out bench.json] [--baseline previous.json]
+
+For each master size, a temporary data directory (``STUDENTS_DATA_DIR``) is
+seeded with that many synthetic rows and the app runs with fake secrets and an
+in-memory Sheets worksheet (``SHEETS_BACKEND = "fake"``). Measured: cold start,
+rerun latency per widget interaction, submit latency and admin-page load.
+Results are JSON; with ``--baseline`` each median is also compared with an
+earlier run.
+
+AppTest reruns the whole script on every interaction (it does not run
+fragments on their own), so widget timings are an upper bound of what a
+browser session costs.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import streamlit as st  # noqa: E402
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+from schema import RANK_COUNT  # noqa: E402
+from tools.fakes import make_row, write_master_csv  # noqa: E402
+
+APP = ROOT / "streamlit_app.py"
+MASTER_NAME = "שאלון_שיבוץ.csv"       # כמו CSV_FILE / CSV_LOG_FILE באפליקציה
+LOG_NAME = "שאלון_שיבוץ_log.csv"
+ADMIN_PASSWORD = "bench"
+SUMMARY_TAB = "סעיף 6: סיכום ושליחה"
+FIRST_TAB = "סעיף 1: פרטים אישיים"
+DEFAULT_SIZES = "0,1000,10000,100000"
+TIMEOUT = 600
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 2)
+
+
+def _summary(samples: list[float]) -> dict:
+    s = sorted(samples)
+    return {
+        "n": len(s),
+        "min_ms": _ms(s[0]),
+        "median_ms": _ms(statistics.median(s)),
+        "p95_ms": _ms(s[min(len(s) - 1, int(round(0.95 * (len(s) - 1))))]),
+        "max_ms": _ms(s[-1]),
+    }
+
+
+def _timed_run(at: AppTest) -> float:
+    t0 = time.perf_counter()
+    at.run()
+    elapsed = time.perf_counter() - t0
+    if at.exception:
+        raise RuntimeError(f"app raised: {at.exception[0].value}")
+    return elapsed
+
+
+def new_app(admin: bool = False) -> AppTest:
+    at = AppTest.from_file(str(APP), default_timeout=TIMEOUT)
+    at.secrets["SHEETS_BACKEND"] = "fake"
+    at.secrets["ADMIN_PASSWORD"] = ADMIN_PASSWORD
+    if admin:
+        at.query_params["admin"] = "1"
+    return at
+
+
+def seed(data_dir: Path, rows: int) -> None:
+    if rows:
+        write_master_csv(data_dir / MASTER_NAME, rows)
+        shutil.copyfile(data_dir / MASTER_NAME, data_dir / LOG_NAME)
+
+
+def fill_form(at: AppTest, i: int) -> None:
+    """Put a valid submission (the synthetic row ``i``) into the form widgets."""
+    row = make_row(10_000_000 + i)
+    for key, col in [("first_name", "שם פרטי"), ("last_name", "שם משפחה"), ("nat_id", "תעודת זהות"),
+                     ("phone", "טלפון"), ("address", "כתובת"), ("email", "אימייל")]:
+        at.text_input(key=key).set_value(row[col])
+    at.selectbox(key="study_year").set_value(row["שנת לימודים"])
+    at.selectbox(key="prev_training").set_value("לא")
+    at.multiselect(key="extra_langs").set_value([row["שפות נוספות"]])
+    domains = [d.strip() for d in row["תחומים מועדפים"].split(";")]
+    at.multiselect(key="chosen_domains").set_value(domains)
+    at.run()
+    at.selectbox(key="top_domain").set_value(row["תחום מוביל"])
+    for r in range(1, RANK_COUNT + 1):
+        at.selectbox(key=f"rank_{r}_select").set_value(row[f"מקום הכשרה {r}"])
+        at.run()
+    at.text_area(key="special_request").set_value(row["בקשה מיוחדת"])
+    at.number_input(key="avg_grade").set_value(float(row["ממוצע"]))
+    at.multiselect(key="adjustments").set_value(["אין"])
+    at.checkbox(key="arrival_confirm").check()
+    at.checkbox(key="confirm").check()
+
+
+def widget_cases(at: AppTest, k: int) -> dict:
+    """One interaction per widget kind; ``k`` varies the value so every run changes state."""
+    from schema import DOMAINS, SITES
+    return {
+        "text_input": lambda: at.text_input(key="first_name").set_value(f"בדיקה {k}"),
+        "multiselect": lambda: at.multiselect(key="chosen_domains").set_value(DOMAINS[k % 3:k % 3 + 2]),
+        "rank_select": lambda: at.selectbox(key="rank_1_select").set_value(SITES[k % len(SITES)]),
+        "tab_to_summary": lambda: at.session_state.__setitem__("form_tab", SUMMARY_TAB),
+        "tab_to_first": lambda: at.session_state.__setitem__("form_tab", FIRST_TAB),
+    }
+
+
+def bench_size(rows: int, repeats: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = Path(tmp)
+        seed(data_dir, rows)
+        os.environ["STUDENTS_DATA_DIR"] = str(data_dir)
+        st.cache_resource.clear()
+        st.cache_data.clear()
+        result = {"rows": rows}
+
+        # --- טעינה ראשונה של הטופס ---
+        at = new_app()
+        result["cold_start_ms"] = _ms(_timed_run(at))
+        result["warm_start_ms"] = _ms(_timed_run(new_app()))
+
+        # --- ריצה חוזרת לכל סוג אינטראקציה ---
+        samples: dict[str, list[float]] = {}
+        for k in range(repeats):
+            for name, act in widget_cases(at, k).items():
+                act()
+                samples.setdefault(name, []).append(_timed_run(at))
+        result["rerun"] = {name: _summary(s) for name, s in samples.items()}
+
+        # --- שליחה (הראשונה כוללת אתחול מסלול הכתיבה: גיבוי ראשון, מונים) ---
+        fill_form(at, 0)
+        submits = []
+        for k in range(repeats + 1):
+            at.text_input(key="nat_id").set_value(f"{200000000 + k:09d}")
+            at.button[0].click()
+            submits.append(_timed_run(at))
+            if not at.success:
+                errors = [m.value for m in at.markdown if ":red[" in m.value]
+                raise RuntimeError(f"submit failed: {errors or [e.value for e in at.error]}")
+        result["submit_first_ms"] = _ms(submits[0])
+        result["submit"] = _summary(submits[1:])
+
+        # --- עמוד מנהל ---
+        admin = new_app(admin=True)
+        admin.run()
+        admin.text_input(key="admin_pwd_input").set_value(ADMIN_PASSWORD)
+        result["admin_first_ms"] = _ms(_timed_run(admin))
+        result["admin"] = _summary([_timed_run(admin) for _ in range(repeats)])
+        return result
+
+
+def compare(current: dict, baseline: dict) -> list[str]:
+    """Lines with current/baseline ratios of every median (and single) timing."""
+    base = {r["rows"]: r for r in baseline.get("results", [])}
+    lines = []
+    for r in current["results"]:
+        b = base.get(r["rows"])
+        if not b:
+            continue
+        pairs = [(k, r[k], b.get(k)) for k in r if k.endswith("_ms")]
+        pairs += [(f"{k}.median_ms", r[k]["median_ms"], (b.get(k) or {}).get("median_ms"))
+                  for k in ("submit", "admin")]
+        pairs += [(f"rerun.{k}.median_ms", v["median_ms"], b.get("rerun", {}).get(k, {}).get("median_ms"))
+                  for k, v in r["rerun"].items()]
+        for name, cur, old in pairs:
+            if old:
+                lines.append(f"{r['rows']:>7} {name:<32} {old:>10.1f} -> {cur:>10.1f} ms  x{cur / old:.2f}")
+    return lines
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated master sizes")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--out", type=Path, help="write the JSON here (default: stdout)")
+    parser.add_argument("--baseline", type=Path, help="earlier JSON output to compare with")
+    args = parser.parse_args(argv)
+
+    report = {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "streamlit": st.__version__,
+            "platform": platform.platform(),
+            "repeats": args.repeats,
+        },
+        "results": [],
+    }
+    for n in [int(x) for x in args.sizes.split(",") if x.strip()]:
+        print(f"rows={n} ...", file=sys.stderr)
+        report["results"].append(bench_size(n, args.repeats))
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        args.out.write_text(text, encoding="utf-8")
+    else:
+        print(text)
+    if args.baseline:
+        for line in compare(report, json.loads(args.baseline.read_text(encoding="utf-8"))):
+            print(line, file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
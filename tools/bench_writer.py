@@ -0,0 +1,112 @@
+# tools/bench_writer.py
+# -*- coding: utf-8 -*-
+"""Benchmark the serialised submit path against WRITE_TARGET_PER_SEC.
+
+    python tools/bench_writer.py [--submissions 2000] [--threads 16] [--backend csv|sqlite]
+
+Runs the real SubmissionStore (master upsert, counters, backup delta, Sheets
+outbox, log) in a temporary data directory, with every submitting thread
+going through the single writer. Exits non-zero if throughput is below target
+or any row is missing.
+"""
+import argparse
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pandas as pd  # noqa: E402
+
+from analytics import DemandStats  # noqa: E402
+from backups import BackupStore  # noqa: E402
+from logstore import SegmentedLog  # noqa: E402
+from schema import COLUMNS_ORDER, DATE_COLUMN, DATE_FORMAT, ID_COLUMN, MASTER_DTYPES, RANK_COLUMNS  # noqa: E402
+from sheets_sync import Outbox, SheetsWriter  # noqa: E402
+from storage import CsvBackend  # noqa: E402
+from tools.fakes import make_row  # noqa: E402
+from writer import WRITE_TARGET_PER_SEC, SubmissionStore, lock_for  # noqa: E402
+
+
+def build_store(data_dir: Path, backend: str = "csv", worksheet=None, **sheets_kw) -> SubmissionStore:
+    """The app's submit path over ``data_dir``; Sheets rows go to ``worksheet`` (worker not started)."""
+    lock = lock_for(data_dir)
+    if backend == "sqlite":
+        from sqlite_store import SqliteBackend
+        storage = SqliteBackend(data_dir / "master.sqlite3")
+    else:
+        storage = CsvBackend(data_dir / "master.csv", data_dir / "log.csv",
+                             COLUMNS_ORDER, ID_COLUMN, RANK_COLUMNS, log_store=SegmentedLog(data_dir / "log"),
+                             date_column=DATE_COLUMN, date_format=DATE_FORMAT, dtypes=MASTER_DTYPES)
+    backups = BackupStore(data_dir / "backups")
+    backups.ensure_initialized(storage.write_master_csv)
+    stats = DemandStats(data_dir / "stats.json")
+    if not stats.ready:
+        stats.rebuild(pd.DataFrame(), pd.DataFrame())
+    sheets = SheetsWriter(Outbox(data_dir / "outbox.jsonl", lock=lock), lambda: worksheet, COLUMNS_ORDER, **sheets_kw)
+    return SubmissionStore(storage, backups, stats, sheets, COLUMNS_ORDER, lock)
+
+
+def run(submissions: int, threads: int, backend: str) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        store = build_store(Path(tmp), backend)
+        latencies: list[float] = []
+        lat_lock = threading.Lock()
+
+        def worker(start: int) -> None:
+            for i in range(start, submissions, threads):
+                row = make_row(i)
+                t0 = time.perf_counter()
+                store.save_master_dataframe(row)
+                store.append_to_log(pd.DataFrame([row]))
+                with lat_lock:
+                    latencies.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        pool = [threading.Thread(target=worker, args=(k,)) for k in range(threads)]
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join()
+        elapsed = time.perf_counter() - t0
+
+        master = store.storage.load_master()
+        log = store.storage.load_log()
+        latencies.sort()
+        q = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        return {
+            "backend": backend,
+            "submissions": submissions,
+            "threads": threads,
+            "seconds": round(elapsed, 3),
+            "per_sec": round(submissions / elapsed, 1),
+            "target_per_sec": WRITE_TARGET_PER_SEC,
+            "p50_ms": round(q[49] * 1000, 2),
+            "p95_ms": round(q[94] * 1000, 2),
+            "p99_ms": round(q[98] * 1000, 2),
+            "master_rows": len(master),
+            "log_rows": len(log),
+        }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--submissions", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--backend", choices=["csv", "sqlite"], default="csv")
+    args = parser.parse_args(argv)
+
+    res = run(args.submissions, args.threads, args.backend)
+    for k, v in res.items():
+        print(f"{k:>15}: {v}")
+    ok = (res["per_sec"] >= WRITE_TARGET_PER_SEC
+          and res["master_rows"] == args.submissions and res["log_rows"] == args.submissions)
+    print("PASS" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+# tools/fakes.py
+# -*- coding: utf-8 -*-
+"""Synthetic submissions and a flaky Sheets worksheet shared by the benchmark and stress tools."""
+import random
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from schema import (COLUMNS_ORDER, DATE_FORMAT, DOMAINS, GENDERS, LIKERT,  # noqa: E402
+                    MOTHER_TONGUES, RANK_COUNT, SITES, SOCIAL_AFFILIATIONS, STUDY_YEARS, TRACKS)
+from sheets_sync import FakeWorksheet  # noqa: E402
+
+FIRST_NAMES = ["נועה", "מוחמד", "יוסף", "מאיה", "אחמד", "תמר", "לינא", "דניאל", "רים", "אורי"]
+LAST_NAMES = ["כהן", "חורי", "לוי", "עבאס", "מזרחי", "נסאר", "פרץ", "חסן", "אברהם", "סעדי"]
+
+
+def make_row(i: int, rng: random.Random | None = None, start: datetime | None = None) -> dict:
+    """A valid submission; ``i`` determines the national ID (so equal ``i`` = resubmission)."""
+    rng = rng or random.Random(i)
+    start = start or datetime(2025, 9, 1, 8, 0, 0)
+    year = rng.choice(STUDY_YEARS)
+    sites = rng.sample(SITES, RANK_COUNT)
+    domains = rng.sample([d for d in DOMAINS if d != "רווחה" or "שנה ג'" in year], 3)
+    row = {
+        "תאריך שליחה": (start + timedelta(seconds=i * 7)).strftime(DATE_FORMAT),
+        "שם פרטי": rng.choice(FIRST_NAMES),
+        "שם משפחה": rng.choice(LAST_NAMES),
+        "תעודת זהות": f"{100000000 + i:09d}",
+        "מין": rng.choice(GENDERS),
+        "שיוך חברתי": rng.choice(SOCIAL_AFFILIATIONS),
+        "שפת אם": rng.choice(MOTHER_TONGUES),
+        "שפות נוספות": "אנגלית",
+        "טלפון": f"05{rng.randint(0, 9)}-{rng.randint(1000000, 9999999)}",
+        "כתובת": "רחוב הדוגמה 1, צפת",
+        "אימייל": f"student{i}@example.com",
+        "שנת לימודים": year,
+        "מסלול לימודים": rng.choice(TRACKS),
+        "הכשרה קודמת": "לא",
+        "הכשרה קודמת מקום ותחום": "",
+        "הכשרה קודמת מדריך ומיקום": "",
+        "הכשרה קודמת בן זוג": "",
+        "תחומים מועדפים": "; ".join(domains),
+        "תחום מוביל": domains[0],
+        "בקשה מיוחדת": "אין",
+        "ממוצע": round(rng.uniform(60, 100), 1),
+        "התאמות": "אין",
+        "התאמות פרטים": "",
+        "מוטיבציה 1": rng.choice(LIKERT),
+        "מוטיבציה 2": rng.choice(LIKERT),
+        "מוטיבציה 3": rng.choice(LIKERT),
+        "אישור הגעה להכשרה": "כן",
+    }
+    for r, s in enumerate(sites, start=1):
+        row[f"מקום הכשרה {r}"] = s
+    for s in SITES:
+        row[f"דירוג_{s}"] = sites.index(s) + 1 if s in sites else None
+    return {c: row.get(c, "") for c in COLUMNS_ORDER}
+
+
+def write_master_csv(path: Path, n: int, seed: int = 0) -> None:
+    """Write a master CSV with ``n`` synthetic rows (for benchmarks)."""
+    import pandas as pd
+
+    rng = random.Random(seed)
+    pd.DataFrame([make_row(i, rng) for i in range(n)], columns=COLUMNS_ORDER).to_csv(
+        path, index=False, encoding="utf-8-sig", lineterminator="\n"
+    )
+
+
+class FlakyWorksheet(FakeWorksheet):
+    """``FakeWorksheet`` that behaves like Sheets under load.
+
+    Every request takes ``latency`` ± ``jitter`` (fraction) seconds and is
+    counted against ``quota_per_minute`` (rejected requests count too, as in
+    Google's quota); over the quota, or at random with ``error_rate``, it
+    fails with a 429 before writing. With ``timeout_rate`` an append is
+    written but then reported as a timeout, as when the response is lost.
+    """
+
+    def __init__(self, latency: float = 0.3, jitter: float = 0.5, error_rate: float = 0.02,
+                 quota_per_minute: int = 60, timeout_rate: float = 0.0, seed: int | None = None):
+        super().__init__(latency)
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.quota_per_minute = quota_per_minute
+        self.timeout_rate = timeout_rate
+        self.quota_errors = 0
+        self.timeouts = 0
+        self._rng = random.Random(seed)
+        self._window: deque[float] = deque()
+        self._lock = threading.Lock()
+
+    def _call(self) -> None:
+        with self._lock:
+            self.calls += 1
+            now = time.monotonic()
+            while self._window and now - self._window[0] >= 60:
+                self._window.popleft()
+            over = bool(self.quota_per_minute) and len(self._window) >= self.quota_per_minute
+            self._window.append(now)
+            fail = over or self._rng.random() < self.error_rate
+            delay = self.latency * self._rng.uniform(1 - self.jitter, 1 + self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        if fail:
+            with self._lock:
+                self.quota_errors += 1
+            raise RuntimeError("APIError: [429] Quota exceeded for quota metric 'Write requests'")
+
+    def append_rows(self, values: list[list], value_input_option: str = "RAW") -> None:
+        super().append_rows(values, value_input_option)
+        with self._lock:
+            lost = self._rng.random() < self.timeout_rate
+            self.timeouts += lost
+        if lost:
+            raise TimeoutError("Read timed out (the rows were written)")
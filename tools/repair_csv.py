@@ -0,0 +1,129 @@
+# tools/repair_csv.py
+# -*- coding: utf-8 -*-
+"""Offline repair of a damaged data CSV (master, legacy log, backup snapshot).
+
+    python tools/repair_csv.py data/שאלון_שיבוץ.csv [--out fixed.csv] [--in-place]
+
+Streams the file once with the encoding / delimiter detected by
+``storage.sniff_csv``. Records are split on newlines outside quoted fields,
+so multi-line answers survive. Records that do not decode, have an unclosed
+quote or a field count different from the header are written, with their
+line number and the reason, to ``<file>.quarantine.csv``. Every other
+record is rewritten as UTF-8 with BOM, comma-separated, ``\\n`` line ends.
+
+With ``--in-place`` the original is kept as ``<file>.bak`` and replaced
+atomically; stop the app (or make sure nothing writes) before using it.
+"""
+import argparse
+import csv
+import os
+import shutil
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterator
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from storage import BOM, BOM_BYTES, sniff_csv_file  # noqa: E402
+
+QUARANTINE_COLUMNS = ["line", "reason", "raw"]
+
+
+@dataclass
+class RepairReport:
+    records: int = 0
+    kept: int = 0
+    quarantined: int = 0
+    reasons: dict = field(default_factory=dict)
+
+    def add(self, reason: str) -> None:
+        self.quarantined += 1
+        self.reasons[reason] = self.reasons.get(reason, 0) + 1
+
+
+def records(path: Path, quotechar: bytes = b'"') -> Iterator[tuple[int, bytes, bool]]:
+    """Yield (first line number, raw bytes, quotes balanced) per CSV record."""
+    with open(path, "rb") as f:
+        record, start, quotes = b"", 1, 0
+        for n, line in enumerate(f, start=1):
+            if n == 1 and line.startswith(BOM_BYTES):
+                line = line[len(BOM_BYTES):]
+            if not record:
+                start = n
+            record += line
+            quotes += line.count(quotechar)
+            if quotes % 2 == 0:
+                yield start, record, True
+                record, quotes = b"", 0
+        if record:
+            yield start, record, False
+
+
+def repair(path: Path, out: Path, quarantine: Path) -> RepairReport:
+    kw = sniff_csv_file(path)
+    encoding = kw["encoding"].replace("-sig", "")
+    report = RepairReport()
+    header: list[str] | None = None
+    with open(out, "w", encoding="utf-8", newline="") as fo, \
+            open(quarantine, "w", encoding="utf-8", newline="") as fq:
+        fo.write(BOM)
+        writer = csv.writer(fo, lineterminator="\n")
+        bad = csv.writer(fq, lineterminator="\n")
+        bad.writerow(QUARANTINE_COLUMNS)
+        for line_no, raw, balanced in records(path):
+            raw_text = raw.decode(encoding, errors="replace")
+            if header is None:
+                header = [c.strip() for c in next(csv.reader([raw_text.rstrip("\r\n")], delimiter=kw["sep"]))]
+                writer.writerow(header)
+                continue
+            if not raw.strip():
+                continue
+            report.records += 1
+            reason = None
+            try:
+                text = raw.decode(encoding)
+            except UnicodeDecodeError:
+                reason = f"not valid {encoding}"
+            if reason is None and not balanced:
+                reason = "unclosed quote"
+            if reason is None:
+                values = next(csv.reader([text.rstrip("\r\n")], delimiter=kw["sep"]), [])
+                if len(values) != len(header):
+                    reason = f"expected {len(header)} fields, saw {len(values)}"
+            if reason:
+                bad.writerow([line_no, reason, raw_text])
+                report.add(reason.split(",")[0])
+                continue
+            writer.writerow(values)
+            report.kept += 1
+        fo.flush()
+        os.fsync(fo.fileno())
+    return report
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", type=Path)
+    parser.add_argument("--out", type=Path, help="repaired copy (default: <file>.repaired.csv)")
+    parser.add_argument("--in-place", action="store_true", help="replace the file (original kept as .bak)")
+    args = parser.parse_args(argv)
+
+    path = args.path
+    quarantine = path.with_name(path.name + ".quarantine.csv")
+    out = args.out or path.with_name(f".{path.name}.repair.tmp" if args.in_place else path.name + ".repaired.csv")
+    report = repair(path, out, quarantine)
+    if args.in_place:
+        shutil.copy2(path, path.with_name(path.name + ".bak"))
+        os.replace(out, path)
+        out = path
+
+    print(f"{report.records} records · {report.kept} kept -> {out} · "
+          f"{report.quarantined} quarantined -> {quarantine}")
+    for reason, n in sorted(report.reasons.items(), key=lambda kv: -kv[1]):
+        print(f"  {n:>6}  {reason}")
+    return 1 if report.quarantined else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
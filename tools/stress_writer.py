@@ -0,0 +1,280 @@
+# tools/stress_writer.py
+# -*- coding: utf-8 -*-
+"""Deadline-day stress test of the submit path: M processes x N threads on one data directory.
+
+    python tools/stress_writer.py [--processes 4] [--threads 8] [--submissions 4000] [--rate 100]
+                                  [--backend csv|sqlite] [--resubmit 0.1] [--double-click 0.05]
+                                  [--sheets-latency 0.3] [--sheets-errors 0.02] [--sheets-quota 60]
+                                  [--sheets-timeouts 0] [--data DIR]
+
+Each process stands in for one Streamlit server process: it builds the real
+SubmissionStore over the shared data directory (same file lock, outbox and
+backups) and runs a Sheets worker against an in-process ``FlakyWorksheet``
+(latency, 429s, a per-minute quota and optionally lost responses). Its
+threads submit through ``save_submission`` (master + log as one writer
+job), paced to ``--rate`` submissions per second overall
+(0 = as fast as possible). Latency is measured from each submission's
+scheduled time, so a stalled writer shows up as latency, not as a lower
+offered rate.
+
+``--resubmit`` re-sends an ID the same thread sent before (the master must
+end with its latest submission); ``--double-click`` sends a submission twice
+with the same form token (the second must be suppressed).
+
+Afterwards the log, the master, the demand counters and the rows that reached
+the fake Sheets are checked against what was sent, and the growth of each
+data file is reported. Exits non-zero if a row was lost, duplicated or stale,
+or a submission raised.
+"""
+import argparse
+import json
+import multiprocessing as mp
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from analytics import DemandStats  # noqa: E402
+from schema import COLUMNS_ORDER, DATE_COLUMN, DATE_FORMAT, ID_COLUMN  # noqa: E402
+from sheets_sync import row_key  # noqa: E402
+from tools.bench_writer import build_store  # noqa: E402
+from tools.fakes import FlakyWorksheet, make_row  # noqa: E402
+
+START = datetime(2025, 9, 1, 8, 0, 0)
+DRAIN_TIMEOUT = 120.0
+SIZE_GROUPS = {"master": ("master.csv", "master.sqlite3", "master.sqlite3-wal"), "log": ("log", "log.csv"),
+               "backups": ("backups",), "outbox": ("outbox.jsonl",), "stats": ("stats.json",)}
+
+
+def _size(path: Path) -> int:
+    if path.is_dir():
+        return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+    return path.stat().st_size if path.exists() else 0
+
+
+def file_sizes(data_dir: Path) -> dict:
+    sizes = {group: sum(_size(data_dir / name) for name in names) for group, names in SIZE_GROUPS.items()}
+    sizes["total"] = _size(data_dir)
+    return sizes
+
+
+def _quantiles(values: list[float]) -> dict:
+    if not values:
+        return {}
+    q = statistics.quantiles(values, n=100) if len(values) > 1 else values * 99
+    return {"p50_ms": round(q[49] * 1000, 2), "p95_ms": round(q[94] * 1000, 2),
+            "p99_ms": round(q[98] * 1000, 2), "max_ms": round(max(values) * 1000, 2)}
+
+
+# =========================
+# תהליך עומס (אחד לכל "שרת")
+# =========================
+def run_process(proc: int, opts: dict, data_dir: str, barrier) -> dict:
+    sheet = FlakyWorksheet(latency=opts["sheets_latency"], error_rate=opts["sheets_errors"],
+                           quota_per_minute=opts["sheets_quota"], timeout_rate=opts["sheets_timeouts"],
+                           seed=proc)
+    store = build_store(Path(data_dir), opts["backend"], worksheet=sheet,
+                        interval=opts["sheets_interval"], base_backoff=1.0, max_backoff=30.0)
+    store.sheets.start()
+
+    workers = opts["processes"] * opts["threads"]
+    period = workers / opts["rate"] if opts["rate"] else 0.0
+    lock = threading.Lock()
+    latencies: list[float] = []
+    sent: list[tuple[str, str, int]] = []          # (ת"ז, זמן שליחה, מספר רץ)
+    errors: list[str] = []
+    suppressed = 0
+
+    def worker(w: int, t0: float) -> None:
+        nonlocal suppressed
+        rng = random.Random(w)
+        own: list[int] = []
+        for j, seq in enumerate(range(w, opts["submissions"], workers)):
+            due = t0 + (w + j * workers) / opts["rate"] if period else time.perf_counter()
+            time.sleep(max(0.0, due - time.perf_counter()))
+            i = rng.choice(own) if own and rng.random() < opts["resubmit"] else seq
+            own.append(i)
+            row = make_row(i)
+            row[DATE_COLUMN] = (START + timedelta(seconds=seq)).strftime(DATE_FORMAT)
+            token = f"stress-{w}-{j}"
+            try:
+                store.save_submission(row, token)
+                repeats = [store.save_submission(row, token)[1]] if rng.random() < opts["double_click"] else []
+            except Exception as e:
+                with lock:
+                    errors.append(f"{type(e).__name__}: {e}")
+                continue
+            done = time.perf_counter()
+            with lock:
+                latencies.append(done - due)
+                sent.append((row[ID_COLUMN], row[DATE_COLUMN], seq))
+                suppressed += sum(repeats)
+
+    base = proc * opts["threads"]
+    barrier.wait()
+    t0 = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(base + t, t0)) for t in range(opts["threads"])]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    submit_seconds = time.perf_counter() - t0
+
+    # --- ריקון תור ה-Sheets (תור משותף — כל תהליך מרוקן עד שהוא ריק) ---
+    deadline = time.time() + opts["drain_timeout"]
+    while store.sheets.outbox.peek(1)[0] and time.time() < deadline:
+        time.sleep(0.25)
+    store.sheets.stop()
+
+    id_at, date_at = COLUMNS_ORDER.index(ID_COLUMN), COLUMNS_ORDER.index(DATE_COLUMN)
+    return {
+        "proc": proc,
+        "submit_seconds": submit_seconds,
+        "latencies": latencies,
+        "sent": sent,
+        "errors": errors,
+        "suppressed": suppressed,
+        "sheet_keys": [row_key(r[id_at], r[date_at]) for r in sheet.rows[1:]],
+        "sheet_calls": sheet.calls,
+        "sheet_quota_errors": sheet.quota_errors,
+        "sheet_timeouts": sheet.timeouts,
+        "sheet_failures": store.sheets.failures,
+        "writer_jobs": store.queue.processed,
+    }
+
+
+def _child(proc: int, opts: dict, data_dir: str, barrier, out) -> None:
+    try:
+        out.put(run_process(proc, opts, data_dir, barrier))
+    except BaseException as e:
+        barrier.abort()
+        out.put({"failed": f"{type(e).__name__}: {e}"})
+
+
+# =========================
+# בדיקת התוצאה מול מה שנשלח
+# =========================
+def verify(data_dir: Path, backend: str, results: list[dict]) -> dict:
+    sent = [s for r in results for s in r["sent"]]
+    expected = {row_key(i, ts) for i, ts, _ in sent}
+    latest: dict[str, tuple[int, str]] = {}
+    for i, ts, seq in sent:
+        if seq > latest.get(i, (-1, ""))[0]:
+            latest[i] = (seq, ts)
+
+    store = build_store(data_dir, backend)
+    log = store.storage.load_log()
+    log_keys = Counter(row_key(i, ts) for i, ts in zip(log.get(ID_COLUMN, []), log.get(DATE_COLUMN, [])))
+    master = store.storage.load_master()
+    master_ids = master[ID_COLUMN].astype(str).str.strip() if not master.empty else master
+    in_master = dict(zip(master_ids, master[DATE_COLUMN])) if not master.empty else {}
+    sheet_keys = Counter(k for r in results for k in r["sheet_keys"])
+    pending = len(store.sheets.outbox.peek(sys.maxsize)[0])
+    stats = DemandStats(data_dir / "stats.json")
+
+    return {
+        "log_rows": int(sum(log_keys.values())),
+        "log_lost": len(expected - set(log_keys)),
+        "log_duplicated": sum(n - 1 for n in log_keys.values() if n > 1),
+        "master_rows": len(in_master),
+        "master_lost": len(set(latest) - set(in_master)),
+        "master_duplicated": int(master_ids.duplicated().sum()) if len(in_master) else 0,
+        "master_stale": sum(1 for i, (_, ts) in latest.items() if i in in_master and in_master[i] != ts),
+        "stats_students": stats.data["students"] if stats.ready else None,
+        "sheets_rows": int(sum(sheet_keys.values())),
+        "sheets_pending": pending,
+        "sheets_lost": max(0, len(expected - set(sheet_keys)) - pending),
+        "sheets_duplicated": sum(n - 1 for n in sheet_keys.values() if n > 1),
+    }
+
+
+def run(opts: dict, data_dir: Path) -> dict:
+    build_store(data_dir, opts["backend"])          # גיבוי ראשון ומונים — לפני שהתהליכים עולים
+    before = file_sizes(data_dir)
+    ctx = mp.get_context("spawn")
+    barrier = ctx.Barrier(opts["processes"] + 1)
+    out = ctx.Queue()
+    procs = [ctx.Process(target=_child, args=(p, opts, str(data_dir), barrier, out), daemon=True)
+             for p in range(opts["processes"])]
+    for p in procs:
+        p.start()
+    barrier.wait()
+    t0 = time.perf_counter()
+    results = [out.get() for _ in procs]
+    elapsed = time.perf_counter() - t0
+    for p in procs:
+        p.join()
+    failed = [r["failed"] for r in results if "failed" in r]
+    if failed:
+        raise RuntimeError(f"stress process failed: {failed[0]}")
+    after = file_sizes(data_dir)
+
+    latencies = sorted(x for r in results for x in r["latencies"])
+    submitted = len(latencies)
+    submit_seconds = max(r["submit_seconds"] for r in results)
+    return {
+        "backend": opts["backend"],
+        "processes": opts["processes"],
+        "threads": opts["threads"],
+        "offered_per_sec": opts["rate"] or "max",
+        "submitted": submitted,
+        "errors": sum(len(r["errors"]) for r in results),
+        "first_errors": [e for r in results for e in r["errors"]][:3],
+        "submit_seconds": round(submit_seconds, 3),
+        "per_sec": round(submitted / submit_seconds, 1) if submit_seconds else 0.0,
+        "total_seconds": round(elapsed, 3),
+        **_quantiles(latencies),
+        "double_clicks_suppressed": sum(r["suppressed"] for r in results),
+        "sheets_calls": sum(r["sheet_calls"] for r in results),
+        "sheets_quota_errors": sum(r["sheet_quota_errors"] for r in results),
+        "sheets_timeouts": sum(r["sheet_timeouts"] for r in results),
+        **verify(data_dir, opts["backend"], results),
+        "bytes_growth": {k: after[k] - before[k] for k in after},
+        "bytes_per_submission": round((after["total"] - before["total"]) / max(1, submitted)),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--submissions", type=int, default=4000)
+    parser.add_argument("--rate", type=float, default=100.0, help="offered submissions/sec overall (0 = max)")
+    parser.add_argument("--backend", choices=["csv", "sqlite"], default="csv")
+    parser.add_argument("--resubmit", type=float, default=0.1)
+    parser.add_argument("--double-click", type=float, default=0.05)
+    parser.add_argument("--sheets-latency", type=float, default=0.3)
+    parser.add_argument("--sheets-errors", type=float, default=0.02)
+    parser.add_argument("--sheets-quota", type=int, default=60, help="requests per minute per process")
+    parser.add_argument("--sheets-timeouts", type=float, default=0.0)
+    parser.add_argument("--sheets-interval", type=float, default=0.5)
+    parser.add_argument("--drain-timeout", type=float, default=DRAIN_TIMEOUT)
+    parser.add_argument("--data", type=Path, help="data directory to keep (default: a temporary one)")
+    args = parser.parse_args(argv)
+    opts = {k: v for k, v in vars(args).items() if k != "data"}
+
+    if args.data:
+        args.data.mkdir(parents=True, exist_ok=True)
+        res = run(opts, args.data)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            res = run(opts, Path(tmp))
+    print(json.dumps(res, ensure_ascii=False, indent=2))
+
+    bad = [k for k in ("errors", "log_lost", "log_duplicated", "master_lost", "master_duplicated",
+                       "master_stale", "sheets_lost", "sheets_duplicated") if res[k]]
+    if res["stats_students"] != res["master_rows"]:
+        bad.append("stats_students")
+    print("PASS" if not bad else f"FAIL: {', '.join(bad)}")
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
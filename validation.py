@@ -0,0 +1,339 @@
+# validation.py
+# -*- coding: utf-8 -*-
+"""Declarative validation of questionnaire rows, keyed on the master columns.
+
+``RULES`` lists every check in the order its message is shown on the form.
+Each rule validates a single row (``validate_row``, used at submit time) and
+a whole frame at once (``validate_frame``, boolean masks over pandas string
+ops), so the admin audit of the master never loops over rows in Python.
+"""
+import abc
+import re
+from dataclasses import dataclass
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from schema import (DOMAINS, ID_COLUMN, LIKERT, MOTIVATION_COLUMNS, OTHER, RANK_COLUMNS,
+                    SITES)
+
+ID_RE = re.compile(r"^\d{8,9}$")
+PHONE_RE = re.compile(r"^0\d{1,2}-?\d{6,7}$")
+EMAIL_RE = re.compile(r"^[^@]+@[^@]+\.[^@]+$")
+BLANK_ITEM_RE = re.compile(r"(?:^|;)\s*(?:;|$)")
+
+LIST_SEP = ";"
+PREV_TRAINING_DETAIL = ("כן", OTHER)
+WELFARE_MARK = "רווחה"
+THIRD_YEAR_MARK = "שנה ג'"
+NO_ADJUSTMENT = "אין"
+
+
+def valid_email(v: str) -> bool:  return bool(EMAIL_RE.match(v.strip()))
+def valid_phone(v: str) -> bool:  return bool(PHONE_RE.match(v.strip()))
+def valid_id(v: str) -> bool:     return bool(ID_RE.match(v.strip()))
+
+
+# =========================
+# עזרים: שורה בודדת / עמודה שלמה
+# =========================
+def _text(row: dict, col: str) -> str:
+    v = row.get(col)
+    if v is None or (isinstance(v, float) and v != v):
+        return ""
+    return str(v).strip()
+
+
+def _items(row: dict, col: str) -> list[str]:
+    """Elements of a "; "-joined list cell ([] for an empty cell)."""
+    s = _text(row, col)
+    return [x.strip() for x in s.split(LIST_SEP)] if s else []
+
+
+def _col(df: pd.DataFrame, col: str) -> pd.Series:
+    if col not in df.columns:
+        return pd.Series("", index=df.index, dtype=object)
+    return df[col].fillna("").astype(str).str.strip()
+
+
+def _exploded(df: pd.DataFrame, col: str) -> pd.Series:
+    """One entry per list element, indexed by the row it came from (empty cells dropped)."""
+    s = _col(df, col)
+    s = s[s != ""]
+    return s.str.split(LIST_SEP).explode().str.strip()
+
+
+def _per_row(df: pd.DataFrame, mask: pd.Series) -> pd.Series:
+    """Collapse an element-level mask back to rows (True if any element matched)."""
+    return mask.groupby(level=0).any().reindex(df.index, fill_value=False)
+
+
+def _number(v) -> float | None:
+    try:
+        x = float(v)
+    except (TypeError, ValueError):
+        return None
+    return x if x == x else None
+
+
+# =========================
+# כללים
+# =========================
+@dataclass(frozen=True)
+class Rule(abc.ABC):
+    name: str
+    message: str
+
+    @abc.abstractmethod
+    def row_ok(self, row: dict) -> bool: ...
+
+    @abc.abstractmethod
+    def frame_ok(self, df: pd.DataFrame) -> pd.Series: ...
+
+    def row_errors(self, row: dict) -> list[str]:
+        return [] if self.row_ok(row) else [self.message]
+
+
+@dataclass(frozen=True)
+class FieldRule(Rule):
+    """Single-column rule: required, pattern, closed vocabulary or positive number."""
+    column: str = ""
+    required: bool = True
+    pattern: re.Pattern | None = None
+    choices: tuple | None = None
+    positive: bool = False
+
+    def row_ok(self, row: dict) -> bool:
+        v = _text(row, self.column)
+        if not v:
+            return not self.required
+        if self.pattern is not None and not self.pattern.match(v):
+            return False
+        if self.choices is not None and v not in self.choices:
+            return False
+        if self.positive:
+            x = _number(v)
+            return x is not None and x > 0
+        return True
+
+    def frame_ok(self, df: pd.DataFrame) -> pd.Series:
+        s = _col(df, self.column)
+        ok = pd.Series(True, index=df.index)
+        if self.pattern is not None:
+            ok &= s.str.match(self.pattern)
+        if self.choices is not None:
+            ok &= s.isin(self.choices)
+        if self.positive:
+            ok &= pd.to_numeric(s, errors="coerce").gt(0)
+        empty = s == ""
+        return ok & ~empty if self.required else ok | empty
+
+
+@dataclass(frozen=True)
+class CrossRule(Rule):
+    """Rule over several columns, given as a row predicate and its vectorised twin."""
+    row_check: Callable[[dict], bool]
+    frame_check: Callable[[pd.DataFrame], pd.Series]
+
+    def row_ok(self, row: dict) -> bool:
+        return bool(self.row_check(row))
+
+    def frame_ok(self, df: pd.DataFrame) -> pd.Series:
+        return self.frame_check(df).astype(bool)
+
+
+@dataclass(frozen=True)
+class RanksChosenRule(Rule):
+    """Every rank slot holds a site; the row message names the missing slots."""
+
+    def _missing(self, row: dict) -> list[int]:
+        return [i for i, c in enumerate(RANK_COLUMNS, start=1) if _text(row, c) not in SITES]
+
+    def row_ok(self, row: dict) -> bool:
+        return not self._missing(row)
+
+    def row_errors(self, row: dict) -> list[str]:
+        missing = self._missing(row)
+        return [f"{self.message} חסר/ים: {', '.join(map(str, missing))}."] if missing else []
+
+    def frame_ok(self, df: pd.DataFrame) -> pd.Series:
+        ok = pd.Series(True, index=df.index)
+        for c in RANK_COLUMNS:
+            ok &= _col(df, c).isin(SITES)
+        return ok
+
+
+# --- פרדיקטים לכללים חוצי-שדות ---
+def _ranks_distinct_row(row: dict) -> bool:
+    chosen = [_text(row, c) for c in RANK_COLUMNS if _text(row, c) in SITES]
+    return len(set(chosen)) == len(chosen)
+
+
+def _ranks_distinct_frame(df: pd.DataFrame) -> pd.Series:
+    # השוואה זוגית בין עמודות הדירוג (מעט עמודות — מהיר בהרבה מ-nunique לפי שורה)
+    ranks = [_col(df, c) for c in RANK_COLUMNS]
+    ok = pd.Series(True, index=df.index)
+    for i, a in enumerate(ranks):
+        for b in ranks[i + 1:]:
+            ok &= ~((a == b) & a.isin(SITES))
+    return ok
+
+
+def _prev_detail(column: str) -> tuple[Callable, Callable]:
+    def row_check(row: dict) -> bool:
+        return _text(row, "הכשרה קודמת") not in PREV_TRAINING_DETAIL or bool(_text(row, column))
+
+    def frame_check(df: pd.DataFrame) -> pd.Series:
+        return ~_col(df, "הכשרה קודמת").isin(PREV_TRAINING_DETAIL) | (_col(df, column) != "")
+    return row_check, frame_check
+
+
+def _other_detail(column: str) -> tuple[Callable, Callable]:
+    # "אחר..." נשמר כטקסט הפירוט; פירוט ריק משאיר איבר ריק ברשימה
+    def row_check(row: dict) -> bool:
+        return "" not in _items(row, column)
+
+    def frame_check(df: pd.DataFrame) -> pd.Series:
+        s = _col(df, column)
+        return (s == "") | ~s.str.contains(BLANK_ITEM_RE)
+    return row_check, frame_check
+
+
+def _top_domain_row(row: dict) -> bool:
+    chosen = [d for d in _items(row, "תחומים מועדפים") if d]
+    if not chosen:
+        return True
+    top = _text(row, "תחום מוביל")
+    return top in chosen or (top == OTHER and any(d not in DOMAINS for d in chosen))
+
+
+def _top_domain_frame(df: pd.DataFrame) -> pd.Series:
+    domains = _exploded(df, "תחומים מועדפים")
+    domains = domains[domains != ""]
+    top = _col(df, "תחום מוביל")
+    is_top = _per_row(df, domains == top.reindex(domains.index))
+    has_other = _per_row(df, ~domains.isin(DOMAINS))
+    has_any = _per_row(df, pd.Series(True, index=domains.index))
+    return ~has_any | is_top | ((top == OTHER) & has_other)
+
+
+def _welfare_row(row: dict) -> bool:
+    return WELFARE_MARK not in _text(row, "תחומים מועדפים") or THIRD_YEAR_MARK in _text(row, "שנת לימודים")
+
+
+def _welfare_frame(df: pd.DataFrame) -> pd.Series:
+    welfare = _col(df, "תחומים מועדפים").str.contains(WELFARE_MARK, regex=False)
+    third = _col(df, "שנת לימודים").str.contains(THIRD_YEAR_MARK, regex=False)
+    return ~welfare | third
+
+
+def _adjust_details_row(row: dict) -> bool:
+    adj = _items(row, "התאמות")
+    has_none = NO_ADJUSTMENT in adj and all(a == NO_ADJUSTMENT for a in adj)
+    return has_none or bool(_text(row, "התאמות פרטים"))
+
+
+def _adjust_details_frame(df: pd.DataFrame) -> pd.Series:
+    adj = _exploded(df, "התאמות")
+    is_none = adj == NO_ADJUSTMENT
+    has_none = _per_row(df, is_none) & ~_per_row(df, ~is_none)
+    return has_none | (_col(df, "התאמות פרטים") != "")
+
+
+def _motivation_row(row: dict) -> bool:
+    return all(_text(row, c) in LIKERT for c in MOTIVATION_COLUMNS)
+
+
+def _motivation_frame(df: pd.DataFrame) -> pd.Series:
+    ok = pd.Series(True, index=df.index)
+    for c in MOTIVATION_COLUMNS:
+        ok &= _col(df, c).isin(LIKERT)
+    return ok
+
+
+# =========================
+# הסכמה (לפי סדר ההודעות בטופס)
+# =========================
+RULES: list[Rule] = [
+    # סעיף 1 — פרטים אישיים
+    FieldRule("first_name", "סעיף 1: יש למלא שם פרטי.", "שם פרטי"),
+    FieldRule("last_name", "סעיף 1: יש למלא שם משפחה.", "שם משפחה"),
+    FieldRule("national_id", "סעיף 1: ת״ז חייבת להיות 8–9 ספרות.", ID_COLUMN, pattern=ID_RE),
+    FieldRule("mother_tongue", "סעיף 1: יש לציין שפת אם (אחר).", "שפת אם"),
+    CrossRule("extra_languages", "סעיף 1: יש לבחור שפות נוספות (ואם 'אחר' – לפרט).",
+              lambda r: bool(_items(r, "שפות נוספות")) and _other_detail("שפות נוספות")[0](r),
+              lambda df: (_col(df, "שפות נוספות") != "") & _other_detail("שפות נוספות")[1](df)),
+    FieldRule("phone", "סעיף 1: מספר טלפון אינו תקין.", "טלפון", pattern=PHONE_RE),
+    FieldRule("address", "סעיף 1: יש למלא כתובת מלאה.", "כתובת"),
+    FieldRule("email", "סעיף 1: כתובת דוא״ל אינה תקינה.", "אימייל", pattern=EMAIL_RE),
+    FieldRule("study_year", "סעיף 1: יש לפרט שנת לימודים (אחר).", "שנת לימודים"),
+    FieldRule("track", "סעיף 1: יש למלא מסלול לימודים/תואר.", "מסלול לימודים"),
+
+    # סעיף 2 — העדפת שיבוץ
+    RanksChosenRule("ranks_chosen", "סעיף 2: יש לבחור מוסד לכל מקום הכשרה."),
+    CrossRule("ranks_distinct", "סעיף 2: קיימת כפילות בבחירת מוסדות. כל מוסד יכול להופיע פעם אחת בלבד.",
+              _ranks_distinct_row, _ranks_distinct_frame),
+    CrossRule("prev_place", "סעיף 2: יש למלא מקום/תחום אם הייתה הכשרה קודמת.",
+              *_prev_detail("הכשרה קודמת מקום ותחום")),
+    CrossRule("prev_mentor", "סעיף 2: יש למלא שם מדריך ומיקום.",
+              *_prev_detail("הכשרה קודמת מדריך ומיקום")),
+    CrossRule("prev_partner", "סעיף 2: יש למלא בן/בת זוג להתמחות.",
+              *_prev_detail("הכשרה קודמת בן זוג")),
+    FieldRule("domains", "סעיף 2: יש לבחור עד 3 תחומים (לפחות אחד).", "תחומים מועדפים"),
+    CrossRule("domains_other", "סעיף 2: נבחר 'אחר' – יש לפרט תחום.", *_other_detail("תחומים מועדפים")),
+    CrossRule("top_domain", "סעיף 2: יש לבחור תחום מוביל מתוך השלושה.", _top_domain_row, _top_domain_frame),
+    CrossRule("welfare_third_year", "סעיף 2: תחום רווחה פתוח לשיבוץ רק לסטודנטים שנה ג׳ ומעלה.",
+              _welfare_row, _welfare_frame),
+    FieldRule("special_request", "סעיף 2: יש לציין בקשה מיוחדת (אפשר 'אין').", "בקשה מיוחדת"),
+
+    # סעיף 3 — נתונים אקדמיים
+    FieldRule("grade", "סעיף 3: יש להזין ממוצע ציונים גדול מ-0.", "ממוצע", positive=True),
+
+    # סעיף 4 — התאמות
+    FieldRule("adjustments", "סעיף 4: יש לבחור לפחות סוג התאמה אחד (או לציין 'אין').", "התאמות"),
+    CrossRule("adjustments_other", "סעיף 4: נבחר 'אחר' – יש לפרט התאמה.", *_other_detail("התאמות")),
+    CrossRule("adjustments_details", "סעיף 4: יש לפרט התייחסות להתאמות.",
+              _adjust_details_row, _adjust_details_frame),
+
+    # סעיף 5 — מוטיבציה
+    CrossRule("motivation", "סעיף 5: יש לענות על שלוש שאלות המוטיבציה.", _motivation_row, _motivation_frame),
+
+    # סעיף 6 — הצהרות
+    FieldRule("arrival", "סעיף 6: יש לסמן את ההצהרה על הגעה להכשרה.", "אישור הגעה להכשרה", choices=("כן",)),
+]
+
+
+# =========================
+# הפעלה
+# =========================
+def validate_row(row: dict, rules: list[Rule] = RULES) -> list[str]:
+    """Error messages for one row, in form order (empty list if valid)."""
+    errors = []
+    for rule in rules:
+        errors.extend(rule.row_errors(row))
+    return errors
+
+
+def validate_frame(df: pd.DataFrame, rules: list[Rule] = RULES) -> pd.DataFrame:
+    """Boolean violation matrix: one column per rule, True where the row breaks it."""
+    return pd.DataFrame({rule.name: ~rule.frame_ok(df).to_numpy(dtype=bool) for rule in rules},
+                        index=df.index)
+
+
+def audit_summary(violations: pd.DataFrame, rules: list[Rule] = RULES) -> pd.DataFrame:
+    """Violation count per rule (rules with no violations are left out)."""
+    counts = violations.sum()
+    messages = {r.name: r.message for r in rules}
+    out = pd.DataFrame({"כלל": [messages[n] for n in counts.index], "שורות": counts.to_numpy()},
+                       index=counts.index)
+    return out[out["שורות"] > 0].sort_values("שורות", ascending=False)
+
+
+def invalid_rows(df: pd.DataFrame, violations: pd.DataFrame) -> pd.DataFrame:
+    """Rows breaking at least one rule, with the broken rule names in a leading column."""
+    bad = violations.any(axis=1)
+    v = violations[bad]
+    names = np.array(v.columns, dtype=object)
+    broken = [", ".join(names[m]) for m in v.to_numpy()]
+    return df[bad].assign(**{"הפרות": broken})[["הפרות"] + list(df.columns)]
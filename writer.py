@@ -0,0 +1,243 @@
+# writer.py
+# -*- coding: utf-8 -*-
+"""Single serialised writer for every local write of the submit path.
+
+All sessions of a server process hand their writes to one ``WriteQueue``
+thread. The thread holds an OS file lock while it writes, so several server
+processes sharing ``data/`` also take turns. Pending jobs are drained in
+batches under one lock acquisition. Full-file rewrites (compaction, manifest,
+counters) always go through a temp file + ``os.replace``.
+
+A repeated submit of the same form content (double click, rerun after a
+dropped websocket) is recognised by its idempotency key in ``RecentSubmits``
+and answered with the earlier result without writing anything again.
+
+Throughput target: ``WRITE_TARGET_PER_SEC`` submissions per second
+(master upsert + log + backup delta + counters + Sheets outbox), checked
+by ``python tools/bench_writer.py``.
+"""
+import hashlib
+import json
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Callable, MutableMapping
+
+import pandas as pd
+
+from analytics import DemandStats
+from backups import BackupStore
+from sheets_sync import SheetsWriter
+from schema import DATE_COLUMN
+from storage import FileLock, StorageBackend
+from timing import timings
+
+WRITE_TARGET_PER_SEC = 50
+MAX_BATCH = 64
+SUBMIT_TOKEN_TTL = 15 * 60
+SUBMIT_TOKEN_MAX = 10_000
+
+
+class WriteQueue:
+    def __init__(self, lock: FileLock, max_batch: int = MAX_BATCH):
+        self.lock = lock
+        self.max_batch = max_batch
+        self.processed = 0
+        self._jobs: queue.Queue = queue.Queue()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> "WriteQueue":
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="write-queue", daemon=True)
+            self._thread.start()
+        return self
+
+    def submit(self, fn: Callable, *args) -> Future:
+        fut: Future = Future()
+        self._jobs.put((fn, args, fut))
+        return fut
+
+    def call(self, fn: Callable, *args, timeout: float | None = 60.0):
+        """Run ``fn(*args)`` on the writer thread and wait for its result."""
+        return self.submit(fn, *args).result(timeout)
+
+    def depth(self) -> int:
+        return self._jobs.qsize()
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._jobs.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._jobs.get_nowait())
+                except queue.Empty:
+                    break
+            with self.lock:
+                for fn, args, fut in batch:
+                    if not fut.set_running_or_notify_cancel():
+                        continue
+                    try:
+                        fut.set_result(fn(*args))
+                    except BaseException as e:
+                        fut.set_exception(e)
+            self.processed += len(batch)
+
+
+# =========================
+# מניעת כתיבה כפולה (idempotency)
+# =========================
+def _content_digest(row: dict) -> str:
+    content = json.dumps({k: v for k, v in row.items() if k != DATE_COLUMN},
+                         ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.blake2b(content.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def submission_key(token: str, row: dict) -> str:
+    """Idempotency key: the form session's token + a digest of the row content (send time excluded)."""
+    return f"{token}:{_content_digest(row)}"
+
+
+def form_token(state: MutableMapping, row: dict) -> str:
+    """The submit token of a form session (``st.session_state``) for this content.
+
+    It is kept while the content is unchanged, so a double click or a rerun
+    repeats the same key, and rotated whenever the content changed since the
+    last submit — editing A to B and back to A saves A again.
+    """
+    digest = _content_digest(row)
+    if state.get("submit_digest") != digest or "submit_token" not in state:
+        state["submit_token"] = uuid.uuid4().hex
+        state["submit_digest"] = digest
+    return state["submit_token"]
+
+
+class RecentSubmits:
+    """Results of recent submits by idempotency key, evicted after ``ttl`` seconds.
+
+    The first call for a key runs the save; a repeat within the TTL (also one
+    arriving while the first is still running) gets the same result. A failed
+    save is forgotten so the user can retry.
+    """
+
+    def __init__(self, ttl: float = SUBMIT_TOKEN_TTL, max_entries: int = SUBMIT_TOKEN_MAX):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.suppressed = 0
+        self._items: OrderedDict[str, tuple[float, Future]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, now: float) -> None:
+        while self._items:
+            stamp, _ = next(iter(self._items.values()))
+            if now - stamp < self.ttl and len(self._items) <= self.max_entries:
+                break
+            self._items.popitem(last=False)
+
+    def run(self, key: str, save: Callable[[], object]) -> tuple[object, bool]:
+        """``(result, repeated)``: ``save()``'s result, or the earlier one if ``key`` was seen."""
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            entry = self._items.get(key)
+            if entry is None:
+                fut: Future = Future()
+                self._items[key] = (now, fut)
+            else:
+                self.suppressed += 1
+        if entry is not None:
+            timings.record("submit.duplicate", 0.0)
+            return entry[1].result(), True
+        try:
+            fut.set_result(save())
+        except BaseException as e:
+            with self._lock:
+                self._items.pop(key, None)
+            fut.set_exception(e)
+            raise
+        return fut.result(), False
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._items)
+
+
+# =========================
+# מסלול השמירה המלא
+# =========================
+class SubmissionStore:
+    """The submit path: master upsert, counters, backup delta, Sheets outbox and log."""
+
+    def __init__(self, storage: StorageBackend, backups: BackupStore, stats: DemandStats,
+                 sheets: SheetsWriter | None, columns: list[str], lock: FileLock,
+                 submit_ttl: float = SUBMIT_TOKEN_TTL):
+        self.storage = storage
+        self.backups = backups
+        self.stats = stats
+        self.sheets = sheets
+        self.columns = columns
+        self.queue = WriteQueue(lock).start()
+        self.recent = RecentSubmits(submit_ttl)
+
+    def _save_master(self, rows: list[dict]) -> list[dict | None]:
+        # --- שמירה מקומית (upsert לפי ת"ז — במאסטר נשמרת רק ההגשה האחרונה) ---
+        with timings.span("master.upsert", rows=len(rows)):
+            previous = self.storage.upsert_master(rows)
+
+        # --- מוני ביקוש לדשבורד (עדכון מצטבר) ---
+        with timings.span("stats.apply"):
+            self.stats.apply(rows, previous)
+
+        # --- גיבוי מצטבר (דלתא + תמונת מצב מלאה כל N שורות) ---
+        with timings.span("backup.record"):
+            self.backups.record(rows, self.columns, self.storage.write_master_csv)
+
+        # --- שמירה ל־ Google Sheets (דרך תור מקומי ו-worker ברקע) ---
+        if self.sheets is not None:
+            with timings.span("sheets.enqueue"):
+                self.sheets.enqueue(rows)
+        return previous
+
+    def save_master_dataframe(self, new_row: dict) -> dict | None:
+        """Save one submission; returns the earlier submission with the same ID it replaced."""
+        # כולל המתנה בתור הכותב
+        with timings.span("submit.master"):
+            return self.queue.call(self._save_master, [new_row])[0]
+
+    def save_submission(self, row: dict, token: str) -> tuple[dict | None, bool]:
+        """Master + log for one form submit, at most once per idempotency key.
+
+        Returns ``(previous, repeated)``; ``repeated`` means nothing was written.
+        """
+        def save() -> dict | None:
+            # מאסטר ויומן בעבודה אחת של הכותב — אין מצב שבו המאסטר נכתב והיומן לא,
+            # ושליחה חוזרת אחרי כשל לא מעדכנת שוב מונים, גיבוי ו-Sheets (כולל המתנה בתור)
+            with timings.span("submit.master"):
+                return self.queue.call(self._save_many, [row])[0]
+
+        return self.recent.run(submission_key(token, row), save)
+
+    def _save_many(self, rows: list[dict]) -> list[dict | None]:
+        previous = self._save_master(rows)
+        with timings.span("submit.log", rows=len(rows)):
+            self.storage.append_log(rows)
+        return previous
+
+    def save_many(self, rows: list[dict]) -> list[dict | None]:
+        """Save a whole batch (bulk import) as one writer job: master, counters, backup, Sheets and log."""
+        with timings.span("import.save", rows=len(rows)):
+            return self.queue.call(self._save_many, rows, timeout=None)
+
+    def append_to_log(self, row_df: pd.DataFrame) -> None:
+        with timings.span("submit.log"):
+            self.queue.call(self.storage.append_log, row_df.to_dict("records"))
+
+    def compact(self) -> int:
+        return self.queue.call(self.storage.compact)
+
+
+def lock_for(data_dir: Path) -> FileLock:
+    return FileLock(Path(data_dir) / ".write.lock")